@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import cv2
+import numpy as np
+from engine import GuandanEngine
+from instrumentation import AllocationTracker
+from synthetic import SyntheticFrameGenerator
+
+
+# 各匹配配置：在引擎上设置的属性；fast 为低分辨率、少比例的快速匹配
+MATCHER_CONFIGS = {
+    "spatial": {"match_engine": "spatial"},
+    "spatial-noprefilter": {"match_engine": "spatial", "prefilter_enabled": False},
+    "fft": {"match_engine": "fft"},
+    "pyramid": {"match_engine": "pyramid"},
+    "slots": {"match_engine": "slots"},
+    "fast": {"match_engine": "spatial", "fast": True}
+}
+
+BASE_CASE = {"size": (232, 1008), "cards": 6, "templates": 15}
+
+
+def benchmark_cases(quick=False):
+    """以手牌区大小、6张牌、全部模板为基准，分别改变区域大小、牌数和模板数"""
+    sizes = [(116, 504), (232, 1008)] if quick else [(116, 504), (232, 1008), (348, 1512)]
+    cards = [1, 6] if quick else [1, 3, 6, 12]
+    templates = [5, 15] if quick else [5, 10, 15]
+
+    cases = [dict(BASE_CASE, size=size) for size in sizes]
+    cases += [dict(BASE_CASE, cards=count) for count in cards]
+    cases += [dict(BASE_CASE, templates=count) for count in templates]
+
+    unique = []
+    for case in cases:
+        if case not in unique:
+            unique.append(case)
+    return unique
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def match_detections(detections, labels, iou_threshold=0.5):
+    """按牌名和重叠度把检测结果与标注一一对应，返回 (正确数, 误检数, 漏检数)"""
+    unmatched = list(labels)
+    true_positives = 0
+    for d in sorted(detections, key=lambda d: -d["score"]):
+        box = d["position"] + d["size"]
+        best = None
+        for label in unmatched:
+            if label["name"] != d["name"]:
+                continue
+            iou = box_iou(box, tuple(label["position"]) + tuple(label["size"]))
+            if iou >= iou_threshold and (best is None or iou > best[0]):
+                best = (iou, label)
+        if best is not None:
+            unmatched.remove(best[1])
+            true_positives += 1
+    return true_positives, len(detections) - true_positives, len(unmatched)
+
+
+def make_engine(config, template_names):
+    engine = GuandanEngine()
+    engine.recognition_workers = 1
+    engine.card_templates = {name: engine.card_templates[name] for name in template_names}
+    settings = dict(config)
+    if settings.pop("fast", False):
+        engine.configure_fast_matching()
+    for key, value in settings.items():
+        setattr(engine, key, value)
+    return engine
+
+
+def run_case(engine, generator, case, samples, repeats, scale, noise):
+    """在 samples 张合成图上各识别 repeats 次，返回耗时、吞吐和准确率"""
+    names = list(engine.card_templates)
+    images = []
+    for _ in range(samples):
+        image, labels = generator.render_region(generator.random_cards(case["cards"], names),
+                                                tuple(case["size"]), scale, noise)
+        if engine.match_downscale != 1.0:
+            # 快速匹配在缩小的区域上识别，标注同样缩小
+            image = engine.downscale(image)
+            labels = [dict(label, position=tuple(int(v * engine.match_downscale) for v in label["position"]),
+                           size=tuple(max(1, int(v * engine.match_downscale)) for v in label["size"]))
+                      for label in labels]
+        images.append((image, labels))
+
+    # 与实际记牌一致：先在第一张图上校准尺度，再只在锁定的比例上匹配
+    engine.reset_scale_calibration()
+    engine.calibrate_scale(images[0][0], "benchmark")
+
+    latencies = []
+    true_positives = false_positives = false_negatives = 0
+    for image, labels in images:
+        for repeat in range(repeats):
+            start = time.perf_counter()
+            detections = engine.recognize_cards_template(image, "benchmark")
+            latencies.append(time.perf_counter() - start)
+        tp, fp, fn = match_detections(detections, labels)
+        true_positives += tp
+        false_positives += fp
+        false_negatives += fn
+
+    # 单独再跑一遍统计内存分配（tracemalloc 会拖慢速度，不与计时混在一起）
+    allocations = AllocationTracker()
+    allocations.start()
+    for image, _ in images:
+        with allocations.measure():
+            engine.recognize_cards_template(image, "benchmark")
+    allocations.stop()
+
+    values = np.asarray(latencies) * 1000
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "throughput_fps": float(1000 / values.mean()),
+        "precision": true_positives / (true_positives + false_positives) if true_positives + false_positives else 1.0,
+        "recall": true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 1.0,
+        "true_positives": true_positives,
+        "false_positives": false_positives,
+        "false_negatives": false_negatives,
+        "alloc_kb": allocations.stats()["mean_kb"]
+    }
+
+
+def environment():
+    """记录本次运行的代码版本和环境，便于跨提交比较"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def run_benchmarks(configs, cases, samples=5, repeats=3, scale=1.0, noise=4.0, seed=0):
+    results = []
+    all_templates = list(GuandanEngine().card_templates)
+    for config_name in configs:
+        for case in cases:
+            template_names = all_templates[:case["templates"]]
+            engine = make_engine(MATCHER_CONFIGS[config_name], template_names)
+            generator = SyntheticFrameGenerator(seed=seed)
+            stats = run_case(engine, generator, case, samples, repeats, scale, noise)
+            engine.close()
+
+            result = {"config": config_name, "size": list(case["size"]), "cards": case["cards"],
+                      "templates": len(template_names), **stats}
+            results.append(result)
+            print(f"{config_name:<20} {case['size'][0]}x{case['size'][1]:<5} {case['cards']:>2}张 "
+                  f"{len(template_names):>2}模板  平均 {stats['mean_ms']:7.2f}ms  p95 {stats['p95_ms']:7.2f}ms  "
+                  f"{stats['throughput_fps']:7.1f}次/秒  精确率 {stats['precision']:.3f}  召回率 {stats['recall']:.3f}  "
+                  f"分配 {stats['alloc_kb']:.0f}KB")
+    return results
+
+
+def case_key(result):
+    return result["config"], tuple(result["size"]), result["cards"], result["templates"]
+
+
+def compare(baseline_path, current_path):
+    """逐项比较两次运行的耗时和准确率"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    print(f"基准 {baseline['environment']['commit']} → 当前 {current['environment']['commit']}")
+    previous = {case_key(r): r for r in baseline["results"]}
+    for result in current["results"]:
+        old = previous.get(case_key(result))
+        if old is None:
+            continue
+        config, size, cards, templates = case_key(result)
+        print(f"{config:<20} {size[0]}x{size[1]:<5} {cards:>2}张 {templates:>2}模板  "
+              f"{old['mean_ms']:7.2f}ms → {result['mean_ms']:7.2f}ms ({result['mean_ms'] / old['mean_ms']:.2f}x)  "
+              f"召回率 {old['recall']:.3f} → {result['recall']:.3f}  "
+              f"分配 {old.get('alloc_kb', 0):.0f}KB → {result.get('alloc_kb', 0):.0f}KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="recognize_cards_template 基准测试（合成画面）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="运行基准测试并保存为JSON")
+    run_parser.add_argument("--output", default="benchmark_results.json", help="结果文件")
+    run_parser.add_argument("--configs", nargs="+", choices=list(MATCHER_CONFIGS), default=list(MATCHER_CONFIGS),
+                            help="匹配配置")
+    run_parser.add_argument("--samples", type=int, default=5, help="每项的合成图数")
+    run_parser.add_argument("--repeats", type=int, default=3, help="每张图重复识别次数")
+    run_parser.add_argument("--scale", type=float, default=1.0, help="合成时的牌面比例")
+    run_parser.add_argument("--noise", type=float, default=4.0, help="高斯噪声标准差")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--quick", action="store_true", help="只跑少量规模")
+
+    compare_parser = subparsers.add_parser("compare", help="比较两次运行的结果")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.baseline, args.current)
+        return
+
+    cases = benchmark_cases(args.quick)
+    results = run_benchmarks(args.configs, cases, args.samples, args.repeats, args.scale, args.noise, args.seed)
+    report = {
+        "environment": environment(),
+        "settings": {"samples": args.samples, "repeats": args.repeats, "scale": args.scale,
+                     "noise": args.noise, "seed": args.seed, "argv": sys.argv[1:]},
+        "results": results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存至: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import os
+import time
+import threading
+import cv2
+import numpy as np
+
+
+class CaptureBackend:
+    """截屏后端基类，子类实现 _grab 即可，延迟统计由基类负责"""
+
+    name = "base"
+
+    def __init__(self):
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+        self.frame_count = 0
+
+    def grab(self, bbox=None):
+        """截取 bbox=((x1, y1), (x2, y2)) 范围内的屏幕，返回BGR图像；bbox为None时截取整个屏幕"""
+        start = time.perf_counter()
+        frame = self._grab(bbox)
+        self.record_latency(start, frame)
+        return frame
+
+    def grab_into(self, bbox, out):
+        """截屏并写入预先分配的 out（如共享内存槽位），返回 out 中与画面同尺寸的视图"""
+        start = time.perf_counter()
+        frame = self._grab_into(bbox, out)
+        self.record_latency(start, frame)
+        return frame
+
+    def record_latency(self, start, frame):
+        self.last_latency = time.perf_counter() - start
+        if frame is not None:
+            self.total_latency += self.last_latency
+            self.frame_count += 1
+
+    def _grab(self, bbox):
+        raise NotImplementedError
+
+    def _grab_into(self, bbox, out):
+        """默认实现：截屏后复制一次到 out；能直接写入 out 的后端可以覆盖此方法"""
+        frame = self._grab(bbox)
+        if frame is None:
+            return None
+        if frame.size > out.size:
+            raise ValueError(f"画面尺寸 {frame.shape} 超出缓冲区 {out.shape}")
+        target = out.reshape(-1)[:frame.size].reshape(frame.shape)
+        np.copyto(target, frame)
+        return target
+
+    def latency_stats(self):
+        """返回截屏延迟统计（毫秒）"""
+        average = self.total_latency / self.frame_count if self.frame_count else 0.0
+        return {
+            "backend": self.name,
+            "frames": self.frame_count,
+            "last_ms": self.last_latency * 1000,
+            "average_ms": average * 1000
+        }
+
+    def close(self):
+        """释放截屏资源"""
+        pass
+
+
+class MssCapture(CaptureBackend):
+    """基于mss的截屏后端（Linux下走X11），只截取指定区域"""
+
+    name = "mss"
+
+    def __init__(self):
+        super().__init__()
+        import mss
+        self.mss = mss
+        # mss实例不能跨线程使用，每个线程持有一个常驻实例
+        self.local = threading.local()
+
+    def get_grabber(self):
+        grabber = getattr(self.local, "grabber", None)
+        if grabber is None:
+            grabber = self.mss.mss()
+            self.local.grabber = grabber
+        return grabber
+
+    def grab_raw(self, bbox):
+        grabber = self.get_grabber()
+        if bbox is None:
+            monitor = grabber.monitors[1]  # 主显示器，与pyautogui一致
+        else:
+            (x1, y1), (x2, y2) = bbox
+            monitor = {"left": x1, "top": y1, "width": x2 - x1, "height": y2 - y1}
+        return np.asarray(grabber.grab(monitor))
+
+    def _grab(self, bbox):
+        # mss返回BGRA，直接去掉alpha通道即可
+        return cv2.cvtColor(self.grab_raw(bbox), cv2.COLOR_BGRA2BGR)
+
+    def _grab_into(self, bbox, out):
+        # 颜色转换直接写入 out，不产生中间的BGR数组
+        shot = self.grab_raw(bbox)
+        if out.shape != shot.shape[:2] + (3,):
+            return super()._grab_into(bbox, out)
+        cv2.cvtColor(shot, cv2.COLOR_BGRA2BGR, dst=out)
+        return out
+
+    def close(self):
+        grabber = getattr(self.local, "grabber", None)
+        if grabber is not None:
+            grabber.close()
+            self.local.grabber = None
+
+
+class PyAutoGUICapture(CaptureBackend):
+    """基于pyautogui的截屏后端，作为没有mss时的备选"""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        super().__init__()
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def screenshot(self, bbox):
+        if bbox is None:
+            screenshot = self.pyautogui.screenshot()
+        else:
+            (x1, y1), (x2, y2) = bbox
+            screenshot = self.pyautogui.screenshot(region=(x1, y1, x2 - x1, y2 - y1))
+        return screenshot
+
+    def _grab(self, bbox):
+        return cv2.cvtColor(np.asarray(self.screenshot(bbox)), cv2.COLOR_RGB2BGR)
+
+    def _grab_into(self, bbox, out):
+        # 颜色转换直接写入 out，不产生中间的BGR数组
+        rgb = np.asarray(self.screenshot(bbox))
+        if out.shape != rgb.shape:
+            return super()._grab_into(bbox, out)
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=out)
+        return out
+
+
+class ReplayCapture(CaptureBackend):
+    """从图片文件、图片目录、视频文件或录制目录回放画面，用于离线调试"""
+
+    name = "replay"
+    image_extensions = (".png", ".jpg", ".jpeg", ".bmp")
+
+    def __init__(self, source, loop=True):
+        super().__init__()
+        if not source or not os.path.exists(source):
+            raise FileNotFoundError(f"回放源不存在: {source}")
+
+        self.source = source
+        self.loop = loop
+        self.video = None
+        self.recording = None
+        self.files = []
+        self.position = 0
+
+        if os.path.isdir(source) and os.path.exists(os.path.join(source, "meta.json")):
+            # replay.py 录制的画面
+            from replay import iter_recording
+            self.recording = iter_recording(source)
+        elif os.path.isdir(source):
+            self.files = sorted(
+                os.path.join(source, f) for f in os.listdir(source)
+                if f.lower().endswith(self.image_extensions)
+            )
+            if not self.files:
+                raise FileNotFoundError(f"回放目录中没有图片: {source}")
+        elif source.lower().endswith(self.image_extensions):
+            self.files = [source]
+        else:
+            self.video = cv2.VideoCapture(source)
+            if not self.video.isOpened():
+                raise IOError(f"无法打开回放视频: {source}")
+
+    def next_frame(self):
+        """读取下一帧，回放结束时返回None"""
+        if self.recording is not None:
+            frame = next(self.recording, (None, None))[1]
+            if frame is None and self.loop:
+                from replay import iter_recording
+                self.recording = iter_recording(self.source)
+                frame = next(self.recording, (None, None))[1]
+            return frame
+
+        if self.video is not None:
+            ok, frame = self.video.read()
+            if not ok and self.loop:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self.video.read()
+            return frame if ok else None
+
+        if self.position >= len(self.files):
+            if not self.loop:
+                return None
+            self.position = 0
+        frame = cv2.imread(self.files[self.position])
+        self.position += 1
+        return frame
+
+    def _grab(self, bbox):
+        frame = self.next_frame()
+        if frame is None or bbox is None:
+            return frame
+
+        # 全屏录像按bbox裁剪；只录了游戏区域的画面原样返回
+        (x1, y1), (x2, y2) = bbox
+        if frame.shape[0] >= y2 and frame.shape[1] >= x2:
+            return frame[y1:y2, x1:x2]
+        return frame
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+
+
+CAPTURE_BACKENDS = {
+    "mss": MssCapture,
+    "pyautogui": PyAutoGUICapture,
+    "replay": ReplayCapture
+}
+
+
+def create_capture_backend(name="auto", source=None):
+    """按名称创建截屏后端；auto 依次尝试 mss 和 pyautogui"""
+    if name == "auto":
+        for candidate in ("mss", "pyautogui"):
+            try:
+                return CAPTURE_BACKENDS[candidate]()
+            except ImportError as e:
+                print(f"截屏后端 {candidate} 不可用: {e}")
+        raise RuntimeError("没有可用的截屏后端，请安装 mss 或 pyautogui")
+
+    if name not in CAPTURE_BACKENDS:
+        raise ValueError(f"未知的截屏后端: {name}")
+    if name == "replay":
+        return ReplayCapture(source)
+    return CAPTURE_BACKENDS[name]()
+
+
+class FrameBuffers:
+    """预先分配、轮流复用的画面缓冲区：截屏直接写入BGR缓冲区，每帧只做一次灰度转换写入配套的灰度缓冲区，
+    各区域再以视图的形式取用，热路径上不再分配整帧大小的数组。只有尺寸变化时才重新分配"""
+
+    def __init__(self, count=2):
+        # 轮流使用 count 组缓冲区，上一帧的画面（录制、投票引用的检测结果）在下一帧截屏时仍然有效
+        self.frames = [None] * count
+        self.grays = [None] * count
+        self.index = 0
+        self.allocated_bytes = 0  # 累计分配的字节数，稳定运行时不再增长
+        self.allocations = 0
+
+    def allocate(self, buffers, shape):
+        buffer = buffers[self.index]
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, np.uint8)
+            buffers[self.index] = buffer
+            self.allocated_bytes += buffer.nbytes
+            self.allocations += 1
+        return buffer
+
+    def next_frame(self, shape):
+        """切换到下一组缓冲区，返回其中尺寸为 shape 的BGR缓冲区"""
+        self.index = (self.index + 1) % len(self.frames)
+        return self.allocate(self.frames, tuple(shape))
+
+    def gray(self, frame):
+        """把本帧画面转换为灰度，写入当前这组的灰度缓冲区"""
+        gray = self.allocate(self.grays, frame.shape[:2])
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+        return gray
+
+    def stats(self):
+        return {"allocated_bytes": self.allocated_bytes, "allocations": self.allocations}
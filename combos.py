@@ -0,0 +1,133 @@
+from collections import OrderedDict
+import numpy as np
+
+
+CARD_NAMES = ["3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A", "2", "BJoker", "RJoker"]
+RANKS = 13  # 前13项是普通点数
+BITS = 4  # 每个点数最多8张，4位即可；15个点数打包成一个60位整数
+BLACK, RED = RANKS, RANKS + 1
+
+# 顺子：A2345 到 10JQKA，A 可以当1也可以当14，2 只在 A2345、23456 中按本身的点数
+STRAIGHT_ORDER = [11, 12] + list(range(11)) + [11]
+STRAIGHTS = [STRAIGHT_ORDER[i:i + 5] for i in range(len(STRAIGHT_ORDER) - 4)]
+STRAIGHT_NAMES = [f"{CARD_NAMES[straight[0]]}~{CARD_NAMES[straight[-1]]}" for straight in STRAIGHTS]
+STRAIGHT_MASKS = [sum(1 << r for r in set(straight)) for straight in STRAIGHTS]
+
+
+def build_straight_table():
+    """预先算好：13个点数的每种“有/无”组合（8192种）下还能组成哪些顺子，结果为顺子编号的位图"""
+    masks = np.arange(1 << RANKS)
+    table = np.zeros(1 << RANKS, np.int32)
+    for index, straight_mask in enumerate(STRAIGHT_MASKS):
+        table |= ((masks & straight_mask) == straight_mask).astype(np.int32) << index
+    return table
+
+
+STRAIGHT_TABLE = build_straight_table()
+
+
+def popcount(value):
+    return bin(value).count("1")
+
+
+class CombinationTable:
+    """剩余牌还能组成哪些牌型：各点数的炸弹（4~8张）、四王炸、三带二和顺子。
+
+    剩余牌数打包成整数作为缓存键，相同的剩余牌直接取缓存的结果；张数按点数维护
+    “至少1/2/3/4张”四个位图，某个点数变化时只改这个点数对应的位，顺子查预先算好的位图表，
+    三带二的组合数由三张和对子的位图直接算出，不再逐一枚举"""
+
+    def __init__(self, cache_size=4096):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # 打包后的剩余牌数 -> 结果
+        self.hits = 0
+        self.misses = 0
+        self.incremental = 0  # 只有一个点数变化、只改了该点数的位的次数
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * len(CARD_NAMES)
+        self.key = 0
+        self.at_least = [0] * 5  # at_least[n]：张数不少于 n 的点数位图（n=1~4）
+        self.result = None
+
+    def set_rank(self, rank, count):
+        """更新一个点数的张数和它在各位图中的位"""
+        self.key = (self.key & ~(0xF << (BITS * rank))) | (count << (BITS * rank))
+        self.counts[rank] = count
+        bit = 1 << rank
+        for n in range(1, 5):
+            if count >= n:
+                self.at_least[n] |= bit
+            else:
+                self.at_least[n] &= ~bit
+
+    def update(self, card_count):
+        """按当前剩余牌数更新，返回组合结果；只有一个点数变化时只更新该点数"""
+        counts = [min(15, max(0, int(card_count.get(name, 0)))) for name in CARD_NAMES]
+        changed = [i for i, (old, new) in enumerate(zip(self.counts, counts)) if old != new]
+        if not changed and self.result is not None:
+            return self.result
+        if len(changed) == 1:
+            self.incremental += 1
+        for rank in changed:
+            self.set_rank(rank, counts[rank])
+
+        result = self.cache.get(self.key)
+        if result is not None:
+            self.cache.move_to_end(self.key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            result = self.evaluate()
+            self.cache[self.key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        self.result = result
+        return result
+
+    def evaluate(self):
+        """由位图计算组合结果"""
+        counts = self.counts
+        ranks_mask = (1 << RANKS) - 1
+
+        # 各点数能组成的最大炸弹（4张起，双副牌最多8张）
+        bombs = {CARD_NAMES[r]: counts[r] for r in range(RANKS) if counts[r] >= 4}
+        bomb_sizes = {size: [name for name, count in bombs.items() if count >= size] for size in range(4, 9)}
+
+        # 三带二：三张的点数 × 另一个点数的对子（同一种王两张也算对子）
+        triples = self.at_least[3] & ranks_mask
+        pairs = self.at_least[2]
+        full_houses = popcount(triples) * popcount(pairs) - popcount(triples & pairs)
+
+        straight_bits = int(STRAIGHT_TABLE[self.at_least[1] & ranks_mask])
+        straights = [name for i, name in enumerate(STRAIGHT_NAMES) if straight_bits >> i & 1]
+
+        return {
+            "bombs": bombs,
+            "bomb_sizes": {size: names for size, names in bomb_sizes.items() if names},
+            "four_jokers": counts[BLACK] >= 2 and counts[RED] >= 2,
+            "full_houses": full_houses,
+            "straights": straights
+        }
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "incremental": self.incremental,
+                "cached": len(self.cache)}
+
+
+def format_combinations(result):
+    """组合结果的一行摘要"""
+    if result is None:
+        return ""
+    straights = "、".join(result["straights"]) if result["straights"] else "无"
+    return (f"四王炸: {'可能' if result['four_jokers'] else '不可能'}  三带二: {result['full_houses']}种  "
+            f"顺子: {straights}")
+
+
+def bomb_note(result, card):
+    """某点数后面显示的炸弹提示"""
+    if result is None or card not in result["bombs"]:
+        return ""
+    size = result["bombs"][card]
+    return "  可成4张炸弹" if size == 4 else f"  可成4~{size}张炸弹"
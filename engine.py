@@ -0,0 +1,1500 @@
+import cv2
+import numpy as np
+import time
+import os
+import sys
+import json
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from capture import create_capture_backend, FrameBuffers
+from matchers import FFTMatcher, CoarseToFineMatcher, SlotRecognizer, TemplatePrefilter
+from replay import FrameRecorder
+from scheduler import PollingScheduler, RegionScheduler, play_order
+from instrumentation import StageTimer, AllocationTracker
+from locator import WindowLocator
+from voting import TemporalVoter
+from estimator import HandEstimator, format_estimates
+from combos import CombinationTable, format_combinations
+from templatepack import pack_profile, pack_path, source_digests, write_pack, load_pack
+
+
+# 识别相关的配置项（多进程流水线把它们原样传给识别进程）
+MATCH_SETTINGS = ["match_engine", "match_threshold", "nms_iou_threshold", "match_downscale", "coarse_factors",
+                  "coarse_min_size", "calibration_region", "calibration_band", "inherit_band", "card_presence_score",
+                  "recalibrate_ratio", "prefilter_enabled", "change_downsample", "change_threshold"]
+# 各匹配器的参数
+MATCHER_SETTINGS = {
+    "fft_matcher": ["batch_size", "cache_bytes", "max_pixels"],
+    "coarse_matcher": ["factor", "coarse_threshold", "max_candidates"],
+    "slot_recognizer": ["classifier", "min_similarity", "ink_threshold", "card_threshold", "dnn_model",
+                        "dnn_labels", "dnn_input_size"],
+    "prefilter": ["ink_threshold", "card_threshold", "red_threshold", "red_margin", "min_ratio"]
+}
+
+
+class GuandanEngine:
+    """记牌引擎：模板、识别、计数和区域计算，不依赖任何界面，可在服务器或批处理中直接使用"""
+
+    def __init__(self, config_file="guandan_regions.json", shared=None):
+        # 多桌模式下 shared 为提供模板的引擎：共用模板、缩放比例、多尺度缓存和匹配器缓存，计数和区域状态各自独立
+        self.shared = shared
+
+        # 初始化游戏状态
+        self.is_running = False
+        self.game_area = None  # 游戏界面区域
+        self.hand_area = None  # 自己手牌区域
+        self.player_areas = [None, None, None]  # 其他三家出牌区域（依次为左侧、上方、右侧，出牌顺序见 seat_order）
+        self.turn_areas = None  # 可选：自己和三家旁边的出牌指示/倒计时区域，用于判断轮到谁
+
+        # 区域配置文件
+        self.config_file = config_file
+
+        # 截屏后端（可在配置文件的 capture 项中选择 auto/mss/pyautogui/replay）
+        self.capture_settings = {"backend": "auto", "source": None}
+        self.capture_backend = None
+        # 截屏写入预先分配的缓冲区，每帧只做一次灰度转换，各区域以视图取用
+        self.frame_buffers = FrameBuffers()
+        self.gray_views = {}  # 区域名 -> (区域图像, 对应的灰度视图)，只在本帧有效
+
+        # 游戏窗口定位（设置区域时自动选取锚点，记牌时每帧确认窗口没有移动）
+        self.locator = WindowLocator()
+        self.auto_locate = True
+
+        # 录制（设置 recording_dir 后，记牌时保存截取的画面）
+        self.recording_dir = None
+        self.recorder = None
+
+        # 卡牌识别相关
+        self.template_dir = "card_templates/"
+        self.use_template_pack = True  # 从按模板内容和缩放比例编译的模板包内存映射加载模板和多尺度缓存
+        self.loaded_templates = None  # 从模板目录加载的原始模板（只有这一组模板会写入模板包）
+        self.template_scales = np.linspace(0.5, 1.5, 20)  # 模板匹配的缩放比例
+        self.template_pyramid = None  # 多尺度模板缓存
+        self.coarse_factors = (2, 4)  # 多尺度缓存中为两级匹配预先缩小的倍数
+        self.coarse_min_size = 5  # 缩小后的模板边长不小于此值
+
+        # 尺度校准相关（一局内窗口大小不变，只在锁定的比例上匹配）
+        self.calibration_region = "手牌"  # 开局时用于校准的区域
+        self.calibration_band = 0  # 锁定比例两侧额外保留的相邻比例数
+        self.inherit_band = 1  # 沿用校准区域比例的区域（还没有单独校准）两侧额外保留的比例数
+        self.card_presence_score = 0.6  # 低于此得分视为区域内没有牌
+        self.recalibrate_ratio = 0.85  # 得分低于校准得分的此比例时重新校准
+        self.region_scales = {}  # 每个区域锁定的比例
+        self.region_peak_scores = {}  # 每个区域最近一次匹配的最高得分
+        self.region_peak_levels = {}  # 每个区域最近一次得分最高的 (模板, 比例下标)
+        self.calibration_size = None  # 校准时游戏区域的尺寸
+
+        # 匹配引擎：spatial 逐个调用 cv2.matchTemplate，fft 在频域批量匹配（大区域退回逐个匹配），
+        # pyramid 先粗后精两级匹配，slots 先分割牌位再对每个字形分类
+        self.match_engine = "spatial"
+        self.fft_matcher = FFTMatcher()
+        self.coarse_matcher = CoarseToFineMatcher()
+        self.slot_recognizer = SlotRecognizer()
+
+        # 匹配前的墨迹/红色像素预筛（空区域、没有红色时跳过对应模板）
+        self.prefilter_enabled = True
+        self.prefilter = TemplatePrefilter()
+
+        # 多帧投票（开启后一次出牌要在多帧中稳定出现才计入，可以配合低分辨率、少比例的快速匹配）
+        self.temporal_voting = False
+        self.voter = TemporalVoter()
+        self.match_downscale = 1.0  # 识别前把各区域缩小的比例，1为原尺寸
+
+        # 其他三家手牌分布的蒙特卡洛估计（开启后每帧在时间预算内更新，出牌后按条件保留样本）
+        self.estimator = None
+        self.hand_estimates = None
+
+        # 剩余牌还能组成的炸弹、四王炸、三带二和顺子（按剩余牌数查表，计数变化时增量更新）
+        self.combinations = CombinationTable()
+        self.combination_result = None
+
+        # 匹配阈值与去重
+        self.match_threshold = 0.9  # TM_CCOEFF_NORMED 得分阈值
+        self.nms_iou_threshold = 0.3  # 重叠度高于此值的检测框视为同一张牌
+
+        # 区域变化检测（画面不变的区域复用上次的识别结果）
+        self.change_downsample = 8  # 缩略图的缩小倍数
+        self.change_threshold = 12  # 缩略图像素差的最大值超过此值视为有变化
+        self.region_thumbnails = {}  # 每个区域上次重新识别时的缩略图
+        self.region_results = {}  # 每个区域上一次的识别结果
+        self.change_stats = {}  # 每个区域的识别/跳过次数
+        self.region_updated = {}  # 每个区域最近一次是否重新识别
+
+        # 自适应轮询
+        self.scheduler = PollingScheduler()
+
+        # 按出牌顺序安排每帧识别的区域（只识别当前玩家和刚出牌的玩家，其余定期复查）
+        self.turn_scheduling = True
+        self.region_scheduler = RegionScheduler()
+
+        # 热路径耗时统计与性能分析
+        self.timer = StageTimer()
+        self.track_allocations = False  # 统计每帧的内存分配（tracemalloc，会变慢）
+        self.allocations = AllocationTracker()
+        self.timings_jsonl = None  # 设置后把每帧各阶段耗时以JSON行写入该文件
+        self.profile_ticks = 0  # 大于0时用cProfile分析记牌循环的前N帧
+        self.profile_output = "tracking_profile.prof"
+
+        # 并行识别（cv2.matchTemplate 会释放GIL），工作线程数不大于1时为单线程模式，便于调试
+        self.recognition_workers = min(4, os.cpu_count() or 1)
+        self.parallel_templates = False  # 是否把区域内的模板×比例匹配也分发到线程池
+        self.region_executor = None
+        self.match_executor = None
+
+        # 多进程流水线（pipeline_workers 大于0时截屏和识别分别在独立进程中运行，见 pipeline.py）
+        self.pipeline_workers = 0
+        self.pipeline_slots = 8  # 共享内存环形缓冲区的槽位数，即最多积压的画面数
+        self.pipeline_drop_policy = "drop_oldest"  # 识别跟不上时的丢帧策略
+
+        # 先加载区域配置
+        self.regions_loaded = self.load_regions()
+
+        if shared is not None:
+            self.card_templates = shared.card_templates
+            self.fft_matcher = shared.fft_matcher
+            self.coarse_matcher = shared.coarse_matcher
+            self.slot_recognizer = shared.slot_recognizer
+            self.prefilter = shared.prefilter
+        else:
+            self.card_templates = self.load_card_templates()
+        self.card_count = self.initialize_card_count()
+
+    @property
+    def template_scales(self):
+        """模板匹配的缩放比例；共用模板时读提供模板的引擎的比例，与共用的多尺度缓存下标一致"""
+        return self.shared.template_scales if self.shared is not None else self.own_template_scales
+
+    @template_scales.setter
+    def template_scales(self, scales):
+        self.own_template_scales = scales
+
+    def load_card_templates(self):
+        """加载卡牌模板图像，用于模板匹配：优先内存映射与当前模板和缩放比例对应的模板包，
+        没有或已过期时解码PNG并重新生成模板包"""
+        pack = self.load_template_pack()
+        if pack is not None:
+            templates, _ = pack
+            self.loaded_templates = templates
+            print(f"已从模板包加载 {len(templates)} 个卡牌模板")
+            return templates
+
+        templates = {}
+
+        # 加载模板图像的路径（假设已有标准模板）
+        template_dir = self.template_dir
+
+        # 检查模板目录是否存在
+        if not os.path.exists(template_dir):
+            os.makedirs(template_dir)
+            print(f"模板目录不存在，已创建: {template_dir}")
+            print("请将卡牌模板图像放入此目录")
+            return templates
+
+        # 卡牌值
+        values = ["3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A", "2"]
+        jokers = ["BJoker", "RJoker"]
+
+        # 加载普通牌（不区分花色，每种点数只需一个模板）
+        for value in values:
+            template_path = f"{template_dir}{value}.png"
+            if os.path.exists(template_path):
+                templates[value] = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+
+        # 加载王牌
+        for joker in jokers:
+            template_path = f"{template_dir}{joker}.png"
+            if os.path.exists(template_path):
+                templates[joker] = cv2.imread(template_path)
+
+        print(f"已加载 {len(templates)} 个卡牌模板")
+
+        # 模板更新后重建多尺度缓存
+        self.loaded_templates = templates
+        self.build_template_pyramid(templates)
+        self.save_template_pack()
+        return templates
+
+    def template_profile(self):
+        """当前的模板包生成参数，不使用模板包时为None"""
+        if not self.use_template_pack:
+            return None
+        return pack_profile(self.template_scales, self.coarse_factors, self.coarse_min_size)
+
+    def template_sources(self):
+        return source_digests(self.template_dir, ["3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A", "2",
+                                                  "BJoker", "RJoker"])
+
+    def load_template_pack(self):
+        """内存映射与当前模板和生成参数匹配的模板包并设为多尺度缓存，返回 (模板, 多尺度缓存)；不可用时返回None"""
+        profile = self.template_profile()
+        if profile is None:
+            return None
+        sources = self.template_sources()
+        path = pack_path(self.template_dir, profile, sources)
+        pack, reason = load_pack(path, profile, sources)
+        if pack is None:
+            if os.path.exists(path):
+                print(f"模板包不可用（{reason}），改为从PNG加载: {path}")
+            return None
+
+        templates, pyramid = pack
+        self.template_pyramid = pyramid
+        self.template_pyramid_source = self.card_templates if self.loaded_templates is not None else templates
+        self.template_pyramid_scales = tuple(float(s) for s in self.template_scales)
+        return pack
+
+    def save_template_pack(self):
+        """把从模板目录加载的模板和当前的多尺度缓存写入模板包，返回路径；失败不影响记牌"""
+        profile = self.template_profile()
+        if profile is None or not self.loaded_templates or self.template_pyramid is None:
+            return None
+        sources = self.template_sources()
+        path = pack_path(self.template_dir, profile, sources)
+        try:
+            size = write_pack(path, profile, sources, self.loaded_templates, self.template_pyramid)
+        except OSError as e:
+            print(f"写入模板包失败: {e}")
+            return None
+        print(f"已生成模板包 ({size / 1024:.0f}KB): {path}")
+        return path
+
+    def compile_templates(self):
+        """从PNG重新编译当前缩放比例的模板包，返回路径"""
+        self.loaded_templates = None
+        self.use_template_pack, enabled = False, self.use_template_pack
+        try:
+            self.card_templates = self.load_card_templates()
+        finally:
+            self.use_template_pack = enabled
+        return self.save_template_pack()
+
+    def build_template_pyramid(self, templates):
+        """预先计算每个模板在所有缩放比例下的图像、均值和范数"""
+        pyramid = {}
+        for card_name, template in templates.items():
+            template_height, template_width = template.shape[:2]
+            levels = []
+            for index, scale in enumerate(self.template_scales):
+                width, height = int(template_width * scale), int(template_height * scale)
+                if width < 1 or height < 1:
+                    continue
+
+                resized_template = cv2.resize(template, (width, height))
+                pixels = resized_template.reshape(height * width, -1).astype(np.float64)
+                mean = pixels.mean(axis=0)
+                # 两级匹配用的缩小模板，太小的不生成（该比例退回全分辨率匹配）
+                coarse = {}
+                for factor in self.coarse_factors:
+                    coarse_size = (width // factor, height // factor)
+                    if min(coarse_size) >= self.coarse_min_size:
+                        coarse[factor] = cv2.resize(resized_template, coarse_size, interpolation=cv2.INTER_AREA)
+
+                levels.append({
+                    "name": card_name,
+                    "index": index,
+                    "scale": float(scale),
+                    "template": resized_template,
+                    "width": width,
+                    "height": height,
+                    "mean": mean,
+                    "norm": float(np.sqrt(((pixels - mean) ** 2).sum())),
+                    "coarse": coarse
+                })
+            pyramid[card_name] = levels
+
+        self.template_pyramid = pyramid
+        self.template_pyramid_source = templates
+        self.template_pyramid_scales = tuple(float(s) for s in self.template_scales)
+        return pyramid
+
+    def invalidate_template_pyramid(self):
+        """模板或缩放比例变化后使缓存失效"""
+        self.template_pyramid = None
+
+    def set_template_scales(self, scales):
+        """设置模板匹配的缩放比例并重建缓存"""
+        self.template_scales = np.asarray(scales, dtype=np.float64)
+        self.invalidate_template_pyramid()
+        self.prepare_template_pyramid()
+        self.reset_scale_calibration()
+
+    def prepare_template_pyramid(self):
+        """在设置比例时（记牌循环之外）准备多尺度缓存：先找对应的模板包，没有时生成并写入模板包"""
+        if self.shared is not None:
+            return
+        if self.card_templates is self.loaded_templates and self.load_template_pack() is not None:
+            return
+        self.build_template_pyramid(self.card_templates)
+        if self.card_templates is self.loaded_templates:
+            self.save_template_pack()
+
+    def get_template_pyramid(self):
+        """获取多尺度模板缓存，模板或缩放比例变化时自动重建"""
+        if self.shared is not None:
+            return self.shared.get_template_pyramid()
+        if (self.template_pyramid is None
+                or self.template_pyramid_source is not self.card_templates
+                or self.template_pyramid_scales != tuple(float(s) for s in self.template_scales)):
+            # 识别中只读不写：模板仍是模板目录中的原始模板时先找对应的模板包，没有时只在内存中重建
+            if self.card_templates is self.loaded_templates and self.load_template_pack() is not None:
+                return self.template_pyramid
+            self.build_template_pyramid(self.card_templates)
+        return self.template_pyramid
+
+    def initialize_card_count(self):
+        """初始化卡牌计数器（掼蛋是双副牌）"""
+        card_count = {}
+
+        # 普通牌 (不区分花色，每种点数有8张)
+        values = ["3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A", "2"]
+        for value in values:
+            card_count[value] = 8
+
+        # 王牌
+        card_count["BJoker"] = 2
+        card_count["RJoker"] = 2
+
+        return card_count
+
+    def calculate_regions(self):
+        """根据游戏区域和比例计算其他区域"""
+        if not self.game_area:
+            return
+
+        # 提取游戏区域坐标
+        x1, y1 = self.game_area[0]
+        x2, y2 = self.game_area[1]
+        width = x2 - x1
+        height = y2 - y1
+
+        # 计算手牌区域（已存在）
+        self.hand_area = (
+            (int(x1 + 0.0097 * width), int(y1 + 0.5286 * height)),
+            (int(x1 + 0.9893 * width), int(y1 + 0.9337 * height))
+        )
+
+        # 计算三个玩家区域（新增）
+        self.player_areas = [
+            # Player 1（左下玩家）
+            (
+                (int(x1 + 0.0754 * width), int(y1 + 0.3001 * height)),  # 左上角
+                (int(x1 + 0.3757 * width), int(y1 + 0.4883 * height))  # 右下角
+            ),
+            # Player 2（上方玩家）
+            (
+                (int(x1 + 0.2668 * width), int(y1 + 0.1239 * height)),  # 左上角
+                (int(x1 + 0.6880 * width), int(y1 + 0.2932 * height))  # 右下角
+            ),
+            # Player 3（右下玩家）
+            (
+                (int(x1 + 0.6030 * width), int(y1 + 0.2773 * height)),  # 左上角
+                (int(x1 + 0.9329 * width), int(y1 + 0.4642 * height))  # 右下角
+            )
+        ]
+
+        # 验证坐标有效性（可选）
+        for area in [self.hand_area] + self.player_areas:
+            assert area[0][0] < area[1][0], "水平坐标无效"
+            assert area[0][1] < area[1][1], "垂直坐标无效"
+
+    def has_regions(self):
+        """是否已设置全部区域"""
+        return all([self.game_area, self.hand_area] + self.player_areas)
+
+    def apply_regions_data(self, regions_data, config_file=None):
+        """应用配置文件中的区域数据、截屏设置和窗口锚点"""
+        self.game_area = tuple(tuple(p) for p in regions_data["game_area"])
+        self.hand_area = tuple(tuple(p) for p in regions_data["hand_area"])
+        self.player_areas = [tuple(tuple(p) for p in area) for area in regions_data["player_areas"]]
+        turn_areas = regions_data.get("turn_areas")
+        self.turn_areas = [tuple(tuple(p) for p in area) for area in turn_areas] if turn_areas else None
+        self.set_capture_settings(regions_data.get("capture"))
+        config_dir = os.path.dirname(os.path.abspath(config_file or self.config_file))
+        self.locator.load(regions_data.get("anchor"), config_dir)
+
+    def load_regions(self):
+        """从默认配置文件加载区域数据"""
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    regions_data = json.load(f)
+
+                self.apply_regions_data(regions_data, self.config_file)
+                return True
+            except Exception as e:
+                print(f"加载区域数据失败: {e}")
+                return False
+        return False
+
+    def region_profile(self):
+        """当前的区域配置，与配置文件格式一致"""
+        profile = {
+            "game_area": self.game_area,
+            "hand_area": self.hand_area,
+            "player_areas": self.player_areas
+        }
+        if self.turn_areas:
+            profile["turn_areas"] = self.turn_areas
+        return profile
+
+    def seat_order(self):
+        """按区域位置推出的出牌顺序（座位 0 为自己，座位 i 为 player_areas[i - 1]）"""
+        return play_order(self.hand_area, self.player_areas)
+
+    def match_settings(self):
+        """当前的全部识别配置：引擎上的匹配参数、模板比例和各匹配器的参数"""
+        settings = {key: getattr(self, key) for key in MATCH_SETTINGS}
+        settings["template_scales"] = [float(s) for s in self.template_scales]
+        for matcher, keys in MATCHER_SETTINGS.items():
+            settings[matcher] = {key: getattr(getattr(self, matcher), key) for key in keys}
+        return settings
+
+    def apply_match_settings(self, settings):
+        """应用 match_settings() 导出的识别配置"""
+        coarse = (tuple(self.coarse_factors), self.coarse_min_size)
+        for key in MATCH_SETTINGS:
+            setattr(self, key, settings[key])
+        if not np.array_equal(self.template_scales, settings["template_scales"]):
+            self.set_template_scales(settings["template_scales"])
+        elif coarse != (tuple(self.coarse_factors), self.coarse_min_size):
+            self.invalidate_template_pyramid()
+            self.prepare_template_pyramid()
+        for matcher, keys in MATCHER_SETTINGS.items():
+            for key in keys:
+                setattr(getattr(self, matcher), key, settings[matcher][key])
+        self.slot_recognizer.check_classifier()
+
+    def shift_regions(self, dx, dy):
+        """游戏窗口移动后平移所有区域和锚点"""
+        def shift(area):
+            return (area[0][0] + dx, area[0][1] + dy), (area[1][0] + dx, area[1][1] + dy)
+
+        self.game_area = shift(self.game_area)
+        self.hand_area = shift(self.hand_area)
+        self.player_areas = [shift(area) for area in self.player_areas]
+        if self.turn_areas:
+            self.turn_areas = [shift(area) for area in self.turn_areas]
+        self.locator.move_anchor(dx, dy)
+
+    def choose_anchor(self, screen, origin=(0, 0), min_std=None):
+        """区域设置完成后在游戏区域内选取窗口锚点"""
+        game = self.crop_area(screen, self.game_area, origin)
+        exclude = [self.hand_area] + self.player_areas
+        if not self.locator.choose_anchor(game, self.game_area[0], exclude, min_std):
+            print("游戏区域内没有合适的锚点，窗口移动后需要重新设置区域")
+            return False
+        return True
+
+    def acquire_anchor(self):
+        """还没有锚点时（配置文件里没有保存锚点）按当前区域在全屏截图上自动选取并写入配置文件"""
+        # 回放时截屏会消耗一帧录制画面，录制的画面也不会移动
+        if self.capture_settings["backend"] == "replay":
+            return False
+        screen = self.capture_screen()
+        # 区域里可能不是游戏窗口（窗口已移动或被遮挡），对比度不够时不锁定
+        if screen is None or not self.choose_anchor(screen, min_std=self.locator.auto_min_std):
+            return False
+        print(f"已自动选取窗口锚点: {self.locator.anchor_area}")
+        self.save_anchor()
+        return True
+
+    def save_anchor(self):
+        """把锚点写入当前的区域配置文件，下次启动直接加载"""
+        if not os.path.exists(self.config_file):
+            return False
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                regions_data = json.load(f)
+            regions_data["anchor"] = self.anchor_settings(self.config_file)
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                json.dump(regions_data, f)
+        except Exception as e:
+            print(f"保存锚点失败: {e}")
+            return False
+        return True
+
+    def anchor_settings(self, config_path):
+        """把锚点图像保存在配置文件旁边，返回写入配置文件的锚点设置（没有锚点时为None）"""
+        if not self.locator.has_anchor():
+            return None
+        return self.locator.save(os.path.splitext(config_path)[0] + "_anchor.png")
+
+    def check_window(self, frame, origin):
+        """每帧确认游戏窗口没有移动：小幅偏移直接平移区域，确认失败时重新定位，返回本帧画面是否可用"""
+        found, (dx, dy) = self.locator.verify(frame, origin)
+        if found:
+            if (dx, dy) != (0, 0):
+                self.shift_regions(dx, dy)
+                self.reset_change_detection()
+                return False
+            return True
+        self.relocate_window()
+        return False
+
+    def relocate_window(self):
+        """在全屏截图中重新寻找锚点并平移所有区域，返回是否找到"""
+        start = time.perf_counter()
+        screen = self.capture_screen()
+        position = self.locator.locate(screen) if screen is not None else None
+        elapsed = time.perf_counter() - start
+        self.locator.record_reacquisition(elapsed, position is not None)
+        if position is None:
+            print(f"未找到游戏窗口（用时 {elapsed * 1000:.1f}ms）")
+            return False
+
+        dx = position[0] - self.locator.anchor_area[0][0]
+        dy = position[1] - self.locator.anchor_area[0][1]
+        if (dx, dy) != (0, 0):
+            self.shift_regions(dx, dy)
+            self.reset_change_detection()
+        print(f"重新定位游戏窗口：偏移 ({dx}, {dy})，用时 {elapsed * 1000:.1f}ms")
+        return True
+
+    def scale_region(self, region, factor):
+        """按比例缩放区域坐标"""
+        return (
+            (int(region[0][0] * factor), int(region[0][1] * factor)),
+            (int(region[1][0] * factor), int(region[1][1] * factor))
+        )
+
+    def start_tracking(self):
+        """开始新的一局：重置计数、校准、变化检测和统计"""
+        self.is_running = True
+
+        # 重置卡牌计数
+        self.card_count = self.initialize_card_count()
+
+        # 重置耗时统计，按需写入JSON行文件
+        self.timer.reset()
+        if self.timings_jsonl:
+            self.timer.open_jsonl(self.timings_jsonl)
+        self.allocations.reset()
+        if self.track_allocations:
+            self.allocations.start()
+
+        # 新的一局重新校准尺度，清空变化检测缓存
+        self.reset_scale_calibration()
+        self.reset_change_detection()
+        if self.shared is None:  # 共用的预筛统计只由提供模板的引擎清空，多桌开局时不会清掉先开始的桌
+            self.prefilter.reset_stats()
+        self.region_scheduler.reset(order=self.seat_order())
+        self.voter.reset()
+        if self.estimator is not None:
+            self.estimator.reset()
+        self.hand_estimates = None
+        self.combinations.reset()
+        self.combination_result = self.combinations.update(self.card_count)
+
+        # 开局时确认游戏窗口位置（窗口可能在两次记牌之间移动过）；还没有锚点时按当前区域自动选取
+        self.locator.reset_stats()
+        if self.auto_locate and self.locator.has_anchor():
+            self.relocate_window()
+        elif self.auto_locate and self.has_regions():
+            self.acquire_anchor()
+
+        # 录制模式
+        if self.recording_dir:
+            self.recorder = FrameRecorder(self.recording_dir, self.capture_bbox(), self.region_profile())
+            print(f"开始录制画面: {self.recording_dir}")
+
+    def stop_tracking(self):
+        """结束记牌，保存录制内容并打印统计"""
+        self.is_running = False
+
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"录制完成，共 {self.recorder.frame_count} 帧")
+            self.recorder = None
+
+        self.timer.close()
+        for stage, s in self.timer.percentiles().items():
+            print(f"{stage}: p50 {s['p50_ms']:.2f}ms，p95 {s['p95_ms']:.2f}ms，p99 {s['p99_ms']:.2f}ms")
+        if self.track_allocations:
+            self.allocations.stop()
+            stats = self.allocations.stats()
+            print(f"每帧内存分配峰值: 平均 {stats['mean_kb']:.1f}KB，p95 {stats['p95_kb']:.1f}KB，"
+                  f"最大 {stats['max_kb']:.1f}KB；画面缓冲区共分配 {self.frame_buffers.allocated_bytes / 1024:.0f}KB")
+
+        stats = self.scheduler.stats()
+        print(f"共 {stats['ticks']} 帧，实际 {stats['effective_fps']:.2f} 帧/秒，超时 {stats['deadline_misses']} 次")
+        for region_name, stats in self.change_detection_stats().items():
+            print(f"{region_name} 识别 {stats['changed']} 次，跳过 {stats['skipped']} 次 "
+                  f"(跳过率 {stats['skip_rate']:.0%})")
+        if self.temporal_voting:
+            stats = self.voter.stats()
+            print(f"多帧投票 ({stats['min_frames']}/{stats['window']} 帧)：提交 {stats['commits']} 次，"
+                  f"平均延迟 {stats['mean_latency_frames']:.1f} 帧 ({stats['mean_latency_ms']:.0f}ms)，"
+                  f"过滤闪烁 {stats['suppressed']} 次")
+        if self.turn_scheduling:
+            for region_name, stats in self.region_schedule_stats().items():
+                print(f"{region_name} 按出牌顺序推迟识别 {stats['deferred']} 次 (推迟率 {stats['deferred_rate']:.0%})")
+        if self.locator.has_anchor():
+            stats = self.locator.stats()
+            print(f"窗口确认 {stats['checks']} 次，失败 {stats['failures']} 次，小幅修正 {stats['nudges']} 次，"
+                  f"重新定位 {stats['reacquisitions']} 次 (平均 {stats['reacquire_mean_ms']:.1f}ms，"
+                  f"最长 {stats['reacquire_max_ms']:.1f}ms)，未找到 {stats['lost']} 次")
+        if self.combination_result is not None:
+            print(format_combinations(self.combination_result))
+        if self.estimator is not None:
+            stats = self.estimator.stats()
+            print(f"手牌估计 {stats['samples']} 个样本，更新 {stats['updates']} 次 (平均 {stats['mean_ms']:.1f}ms，"
+                  f"p95 {stats['p95_ms']:.1f}ms)，出牌后保留样本 {stats['conditioned']} 次，重新采样 {stats['resets']} 次")
+            for line in format_estimates(self.hand_estimates):
+                print(line)
+        for category, stats in self.prefilter.stats().items():
+            print(f"预筛({category}) 排除 {stats['rejected']}/{stats['checked']} 次匹配 "
+                  f"(排除率 {stats['rejection_rate']:.0%}，省下约 {stats['saved_ratio']:.0%} 的匹配计算量)")
+
+    def close(self):
+        """释放截屏后端和线程池"""
+        if self.capture_backend is not None:
+            self.capture_backend.close()
+        self.shutdown_executors()
+        if self.estimator is not None:
+            self.estimator.close()
+
+    def set_capture_settings(self, settings):
+        """更新截屏后端配置，下次截屏时按新配置创建后端"""
+        if not settings:
+            return
+
+        self.capture_settings = {
+            "backend": settings.get("backend", "auto"),
+            "source": settings.get("source")
+        }
+        if self.capture_backend is not None:
+            self.capture_backend.close()
+            self.capture_backend = None
+
+    def get_capture_backend(self):
+        """获取常驻的截屏后端，首次使用时创建"""
+        if self.capture_backend is None:
+            self.capture_backend = create_capture_backend(
+                self.capture_settings["backend"], self.capture_settings["source"])
+            print(f"使用截屏后端: {self.capture_backend.name}")
+        return self.capture_backend
+
+    def capture_screen(self, bbox=None):
+        """捕获屏幕，bbox为None时截取整个屏幕，否则只截取该范围"""
+        try:
+            return self.get_capture_backend().grab(bbox)
+        except Exception as e:
+            print(f"截屏错误: {e}")
+            return None
+
+    def capture_frame(self, bbox):
+        """截取 bbox 范围的屏幕，直接写入预先分配的画面缓冲区（不再每帧分配新数组）"""
+        (x1, y1), (x2, y2) = bbox
+        try:
+            return self.get_capture_backend().grab_into(bbox, self.frame_buffers.next_frame((y2 - y1, x2 - x1, 3)))
+        except Exception as e:
+            print(f"截屏错误: {e}")
+            return None
+
+    def frame_gray(self, frame):
+        """整帧只做一次灰度转换，写入常驻的灰度缓冲区；缩小后识别时各区域另行转换，返回None"""
+        if self.match_downscale != 1.0:
+            return None
+        with self.timer.stage("gray"):
+            return self.frame_buffers.gray(frame)
+
+    def capture_bbox(self):
+        """记牌时需要截取的范围：包含所有识别区域的外接矩形（通常就是游戏区域）"""
+        areas = [self.game_area, self.hand_area] + self.player_areas
+        return (
+            (min(area[0][0] for area in areas), min(area[0][1] for area in areas)),
+            (max(area[1][0] for area in areas), max(area[1][1] for area in areas))
+        )
+
+    def crop_area(self, frame, area, origin):
+        """从以origin为左上角的截图中裁剪出屏幕坐标area对应的图像"""
+        return frame[
+               area[0][1] - origin[1]:area[1][1] - origin[1],
+               area[0][0] - origin[0]:area[1][0] - origin[0]
+               ]
+
+    def reset_scale_calibration(self, game_size=None):
+        """清除所有区域锁定的比例"""
+        self.region_scales = {}
+        self.region_peak_scores = {}
+        self.region_peak_levels = {}
+        self.calibration_size = game_size
+
+    def calibrate_scale(self, image, region_name, card_names=None):
+        """在全部比例上搜索得分最高的比例，并锁定到该区域；card_names 不为None时只用这些模板搜索"""
+        region = self.prepare_region(image, region_name)
+        scale_scores = np.zeros(len(self.template_scales))
+
+        for card_name, levels in self.get_template_pyramid().items():
+            if card_names is not None and card_name not in card_names:
+                continue
+            img = region[self.template_channel(card_name)]
+            for level in levels:
+                if level["height"] > img.shape[0] or level["width"] > img.shape[1]:
+                    continue
+
+                result = cv2.matchTemplate(img, level["template"], cv2.TM_CCOEFF_NORMED)
+                scale_scores[level["index"]] = max(scale_scores[level["index"]], float(result.max()))
+
+        best = int(np.argmax(scale_scores))
+        best_score = float(scale_scores[best])
+        if best_score < self.card_presence_score:
+            # 区域内没有可用于校准的牌，下一帧再试
+            return False
+
+        low = max(0, best - self.calibration_band)
+        high = min(len(self.template_scales), best + self.calibration_band + 1)
+        self.region_scales[region_name] = {
+            "indices": set(range(low, high)),
+            "score": best_score
+        }
+        print(f"{region_name} 尺度校准完成: {self.template_scales[best]:.3f} (得分 {best_score:.3f})")
+        return True
+
+    def get_scale_lock(self, region_name):
+        """获取区域锁定的比例；未单独校准的区域沿用校准区域的比例，两侧各多保留 inherit_band 个比例
+        （出牌区的牌往往与手牌大小略有不同），直到该区域第一次出现牌时单独校准"""
+        lock = self.region_scales.get(region_name)
+        if lock is not None:
+            return lock
+        lock = self.region_scales.get(self.calibration_region)
+        if lock is None or not self.inherit_band:
+            return lock
+        band = range(-self.inherit_band, self.inherit_band + 1)
+        indices = {i + d for i in lock["indices"] for d in band if 0 <= i + d < len(self.template_scales)}
+        return {"indices": indices, "score": lock["score"]}
+
+    def needs_own_calibration(self, region_name):
+        """沿用校准区域比例的区域第一次出现牌时需要单独校准"""
+        return (region_name not in self.region_scales and self.calibration_region in self.region_scales
+                and self.region_peak_scores.get(region_name, 0.0) >= self.card_presence_score)
+
+    def lock_peak_scale(self, region_name):
+        """把区域锁定到本次匹配得分最高的比例；该比例在沿用的比例范围边缘（更优的比例可能在范围外）时返回False"""
+        indices = self.get_scale_lock(region_name)["indices"]
+        _, best = self.region_peak_levels[region_name]
+        if best in (min(indices), max(indices)):
+            return False
+        score = self.region_peak_scores[region_name]
+        low = max(0, best - self.calibration_band)
+        high = min(len(self.template_scales), best + self.calibration_band + 1)
+        self.region_scales[region_name] = {"indices": set(range(low, high)), "score": score}
+        print(f"{region_name} 尺度校准完成: {self.template_scales[best]:.3f} (得分 {score:.3f})")
+        return True
+
+    def needs_recalibration(self, region_name):
+        """区域内有牌但匹配得分明显下降时需要重新校准"""
+        lock = self.get_scale_lock(region_name)
+        if lock is None:
+            return False
+
+        peak_score = self.region_peak_scores.get(region_name, 0.0)
+        return self.card_presence_score <= peak_score < lock["score"] * self.recalibrate_ratio
+
+    def reset_change_detection(self):
+        """清空所有区域的缩略图、缓存结果和统计"""
+        self.region_thumbnails = {}
+        self.region_results = {}
+        self.change_stats = {}
+        self.region_updated = {}
+
+    def region_thumbnail(self, image):
+        """区域缩小后的灰度缩略图"""
+        height, width = image.shape[:2]
+        small = cv2.resize(image, (max(1, width // self.change_downsample), max(1, height // self.change_downsample)),
+                           interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def region_changed(self, thumbnail, region_name):
+        """与该区域上次重新识别时的缩略图比较，判断画面是否有变化"""
+        # 不和上一帧比：每帧都低于阈值的缓慢变化累积起来也要触发识别
+        previous = self.region_thumbnails.get(region_name)
+        if previous is None or previous.shape != thumbnail.shape:
+            return True
+        return int(cv2.absdiff(thumbnail, previous).max()) > self.change_threshold
+
+    def change_detection_stats(self):
+        """返回每个区域的识别次数、跳过次数和跳过率"""
+        stats = {}
+        for region_name, counts in self.change_stats.items():
+            total = counts["changed"] + counts["skipped"]
+            stats[region_name] = dict(counts, skip_rate=counts["skipped"] / total if total else 0.0)
+        return stats
+
+    def merge_change_stats(self, change_stats):
+        """累加其他引擎（流水线的识别进程）的变化检测统计"""
+        for region_name, counts in change_stats.items():
+            total = self.change_stats.setdefault(region_name, {"changed": 0, "skipped": 0})
+            for key, value in counts.items():
+                total[key] += value
+
+    def recognize_cards(self, image, region_name):
+        """识别图像中的卡牌"""
+        if not self.card_templates:
+            print("没有卡牌模板可用")
+            return []
+
+        # 区域画面没有变化时直接复用上次的识别结果
+        counts = self.change_stats.setdefault(region_name, {"changed": 0, "skipped": 0})
+        thumbnail = self.region_thumbnail(image)
+        if not self.region_changed(thumbnail, region_name) and region_name in self.region_results:
+            counts["skipped"] += 1
+            self.region_updated[region_name] = False
+            return self.region_results[region_name]
+        counts["changed"] += 1
+        self.region_updated[region_name] = True
+        self.region_thumbnails[region_name] = thumbnail
+
+        # 使用模板匹配方法
+        cards = self.recognize_cards_template(image, region_name)
+
+        # 区域第一次出现牌时单独校准：最高分落在沿用的比例范围内部时直接锁定该比例，
+        # 落在边缘时只用识别出的牌和得分最高的模板搜索全部比例，比完整校准快得多
+        if self.needs_own_calibration(region_name):
+            if not self.lock_peak_scale(region_name):
+                card_names = set(self.card_names(cards)) | {self.region_peak_levels[region_name][0]}
+                if self.calibrate_scale(image, region_name, card_names):
+                    cards = self.recognize_cards_template(image, region_name)
+        # 匹配置信度下降时在当前帧上重新校准
+        elif self.needs_recalibration(region_name) and self.calibrate_scale(image, region_name):
+            cards = self.recognize_cards_template(image, region_name)
+
+        self.region_results[region_name] = cards
+        return cards
+
+    def recognize_cards_template(self, image, region_name):
+        """使用模板匹配识别卡牌（不区分花色），返回带得分的检测结果"""
+        # 每帧只做一次灰度转换（通常直接取整帧灰度图中的视图），所有模板共用
+        region = self.prepare_region(image, region_name)
+
+        if self.match_engine == "slots":
+            glyph_size, joker_height = self.expected_glyph_size(region_name)
+            # 分类相似度与模板匹配得分不可比，不参与重新校准的判断
+            self.region_peak_scores[region_name] = 0.0
+            return self.slot_recognizer.recognize(region, self.card_templates, glyph_size, joker_height)
+
+        # 已校准的区域只在锁定的比例上匹配
+        lock = self.get_scale_lock(region_name)
+        scale_indices = lock["indices"] if lock else None
+        peak_score = 0.0
+        peak_level = (None, None)
+
+        # 列出需要匹配的 (模板, 比例) 组合
+        card_names = []
+        jobs = []
+        for card_name, levels in self.get_template_pyramid().items():
+            channel = self.template_channel(card_name)
+            img = region[channel]
+            card_index = len(card_names)
+            card_names.append(card_name)
+
+            for level in levels:
+                if scale_indices is not None and level["index"] not in scale_indices:
+                    continue
+
+                # 跳过比区域还大的模板
+                if level["height"] > img.shape[0] or level["width"] > img.shape[1]:
+                    continue
+                jobs.append((card_index, level, channel))
+
+        if self.prefilter_enabled:
+            with self.timer.stage("prefilter"):
+                jobs = self.prefilter.filter(region, jobs)
+
+        # 收集所有模板、所有比例下的候选框 (x, y, w, h, 得分, 模板)
+        candidates = []
+        with self.timer.stage("match"):
+            if self.match_engine == "fft":
+                match_results = self.fft_matcher.match(region, jobs)
+            elif self.match_engine == "pyramid":
+                match_results = self.coarse_matcher.match(region, jobs)
+            else:
+                match_results = self.match_templates(region, jobs)
+
+        for (card_index, level, _), result in zip(jobs, match_results):
+            score = float(result.max())
+            if score > peak_score:
+                peak_score, peak_level = score, (card_names[card_index], level["index"])
+
+            ys, xs = np.nonzero(result >= self.match_threshold)
+            if len(xs) == 0:
+                continue
+
+            count = len(xs)
+            candidates.append(np.column_stack([
+                xs, ys,
+                np.full(count, level["width"]), np.full(count, level["height"]),
+                result[ys, xs],
+                np.full(count, card_index)
+            ]))
+
+        self.region_peak_scores[region_name] = peak_score
+        self.region_peak_levels[region_name] = peak_level
+        if not candidates:
+            return []
+
+        # 跨模板的非极大值抑制：同一位置只保留得分最高的一张牌（不同的牌按包含程度抑制）
+        candidates = np.concatenate(candidates).astype(np.float64)
+        with self.timer.stage("nms"):
+            keep = self.non_max_suppression(candidates[:, :4], candidates[:, 4], self.nms_iou_threshold,
+                                            candidates[:, 5])
+
+        found_cards = [{
+            "name": card_names[int(candidates[i, 5])],
+            "position": (int(candidates[i, 0]), int(candidates[i, 1])),
+            "size": (int(candidates[i, 2]), int(candidates[i, 3])),
+            "score": float(candidates[i, 4])
+        } for i in keep]
+
+        # 按x坐标排序（从左到右）
+        found_cards.sort(key=lambda x: x["position"][0])
+        return found_cards
+
+    def expected_glyph_size(self, region_name):
+        """按区域锁定的比例估计点数字形的尺寸 (宽, 高) 和王牌字形的高度，未校准时按原始模板尺寸"""
+        lock = self.get_scale_lock(region_name)
+        scale = float(self.template_scales[min(lock["indices"])]) if lock else 1.0
+
+        ranks = [t for name, t in self.card_templates.items() if name not in ["BJoker", "RJoker"]]
+        jokers = [t for name, t in self.card_templates.items() if name in ["BJoker", "RJoker"]]
+        glyph_width = int(np.median([t.shape[1] for t in ranks]) * scale)
+        glyph_height = int(np.median([t.shape[0] for t in ranks]) * scale)
+        joker_height = int(max(t.shape[0] for t in jokers) * scale) if jokers else 3 * glyph_height
+        return (max(1, glyph_width), max(1, glyph_height)), joker_height
+
+    def template_channel(self, card_name):
+        """王牌模板在彩色图上匹配，其余在灰度图上匹配"""
+        return "image" if card_name in ["BJoker", "RJoker"] else "gray"
+
+    def prepare_region(self, image, region_name=None):
+        """每帧每个区域只做一次的预处理，供所有模板共用；缩小的金字塔层由匹配引擎按需填入 coarse。
+        image 是本帧 crop_regions 裁出的区域时直接使用整帧灰度图中的视图，否则单独转换"""
+        view = self.gray_views.get(region_name)
+        if view is not None and view[0] is image:
+            gray = view[1]
+        else:
+            with self.timer.stage("gray"):
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return {
+            "image": image,
+            "gray": gray,
+            "coarse": {}
+        }
+
+    def match_templates(self, region, jobs):
+        """对 (模板, 比例) 组合逐个执行模板匹配，结果与 jobs 顺序一致"""
+        def match(job):
+            _, level, channel = job
+            with self.timer.stage(f"match/{level['name']}@{level['scale']:.2f}"):
+                return cv2.matchTemplate(region[channel], level["template"], cv2.TM_CCOEFF_NORMED)
+
+        if self.parallel_templates and self.recognition_workers > 1:
+            # 单独的线程池，避免区域任务等待模板任务时占满线程导致死锁
+            if self.match_executor is None:
+                self.match_executor = ThreadPoolExecutor(max_workers=self.recognition_workers,
+                                                         thread_name_prefix="match")
+            return list(self.match_executor.map(match, jobs))
+        return [match(job) for job in jobs]
+
+    def recognize_regions(self, region_images):
+        """识别多个区域，region_images 为 [(区域名, 图像)]，结果按输入顺序返回"""
+        if self.recognition_workers <= 1:
+            return [self.recognize_cards(image, region_name) for region_name, image in region_images]
+
+        if self.region_executor is None:
+            self.region_executor = ThreadPoolExecutor(max_workers=self.recognition_workers,
+                                                      thread_name_prefix="recognize")
+        futures = [self.region_executor.submit(self.recognize_cards, image, region_name)
+                   for region_name, image in region_images]
+        return [future.result() for future in futures]
+
+    def shutdown_executors(self):
+        """关闭识别线程池"""
+        for executor in (self.region_executor, self.match_executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        self.region_executor = None
+        self.match_executor = None
+
+    def non_max_suppression(self, boxes, scores, iou_threshold, labels=None):
+        """按得分从高到低保留检测框，抑制与已保留框重叠过多的候选，返回保留的下标。
+        同一张牌的框按IoU比较；labels 不同的框按交集占较小框的比例比较，
+        小的点数框落在高大的王牌框里时IoU很小，但几乎整个被包含"""
+        x1, y1 = boxes[:, 0], boxes[:, 1]
+        x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+        areas = boxes[:, 2] * boxes[:, 3]
+
+        order = np.argsort(-scores, kind="stable")
+        keep = []
+        while order.size > 0:
+            best, rest = order[0], order[1:]
+            keep.append(int(best))
+
+            # 一次性计算最佳框与其余所有候选框的重叠度
+            inter_w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+            inter_h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+            inter = inter_w * inter_h
+            overlap = inter / (areas[best] + areas[rest] - inter)
+            if labels is not None:
+                other = labels[rest] != labels[best]
+                overlap[other] = inter[other] / np.minimum(areas[best], areas[rest][other])
+            order = rest[overlap <= iou_threshold]
+
+        return keep
+
+    def card_names(self, detections):
+        """从检测结果中提取卡牌名称列表"""
+        return [card["name"] for card in detections]
+
+    def new_tracking_state(self):
+        """创建一局记牌的状态：上次识别到的手牌、各家出牌和出牌历史"""
+        return {
+            "last_hand_cards": [],
+            "last_player_played": [[], [], []],
+            "history": [[], [], []],  # 每家每次新出的牌
+            "is_initial": False
+        }
+
+    def crop_regions(self, frame, origin, gray=None):
+        """从截图中裁剪出手牌区域和其他玩家区域（都是 frame 的视图，不复制），设置了 match_downscale 时同时缩小；
+        gray 为整帧灰度图时登记各区域对应的灰度视图，识别时不再单独转换"""
+        hand_img = self.crop_area(frame, self.hand_area, origin)
+        player_imgs = [self.crop_area(frame, area, origin) for area in self.player_areas]
+        if self.match_downscale != 1.0:
+            hand_img = self.downscale(hand_img)
+            player_imgs = [self.downscale(img) for img in player_imgs]
+            gray = None
+
+        gray_views = {}
+        if gray is not None:
+            areas = [("手牌", self.hand_area, hand_img)] + [
+                (f"玩家{i + 1}", area, img) for i, (area, img) in enumerate(zip(self.player_areas, player_imgs))]
+            for region_name, area, img in areas:
+                gray_views[region_name] = (img, self.crop_area(gray, area, origin))
+        # 整体替换，识别线程看到的要么是上一帧的登记，要么是本帧的
+        self.gray_views = gray_views
+        return hand_img, player_imgs
+
+    def downscale(self, image):
+        height, width = image.shape[:2]
+        size = (max(1, int(width * self.match_downscale)), max(1, int(height * self.match_downscale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def configure_fast_matching(self, downscale=0.75, scales=11, threshold=0.8, window=5, min_frames=3):
+        """低分辨率、少比例、低阈值的快速匹配，由多帧投票过滤单帧误检。
+        缩小到0.5时字形只有十几像素高，王牌和小比例的牌会漏检；比例取奇数个（步长0.1），保证包含原尺寸"""
+        self.match_downscale = downscale
+        self.set_template_scales(np.linspace(0.5 * downscale, 1.5 * downscale, scales))
+        self.match_threshold = threshold
+        self.configure_voting(window, min_frames)
+
+    def configure_estimation(self, samples=20000, budget_ms=15.0, workers=0):
+        """开启对手手牌分布估计：samples 为累积的样本数，budget_ms 为每帧的时间预算，workers 为后台采样进程数"""
+        if self.estimator is not None:
+            self.estimator.close()
+        self.estimator = HandEstimator(samples, budget_ms=budget_ms, workers=workers)
+
+    def disable_estimation(self):
+        """关闭对手手牌分布估计"""
+        if self.estimator is not None:
+            self.estimator.close()
+        self.estimator = None
+        self.hand_estimates = None
+
+    def configure_voting(self, window, min_frames):
+        """开启多帧投票：window 为投票窗口帧数，min_frames 为提交所需的帧数（即提交延迟）"""
+        self.temporal_voting = True
+        self.voter = TemporalVoter(window, min_frames)
+
+    def ensure_calibration(self, hand_img):
+        """尺度校准：开局后或游戏区域尺寸变化时在手牌区重新校准"""
+        game_size = (self.game_area[1][0] - self.game_area[0][0], self.game_area[1][1] - self.game_area[0][1])
+        if game_size != self.calibration_size:
+            self.reset_scale_calibration(game_size)
+        if self.calibration_region not in self.region_scales:
+            self.calibrate_scale(hand_img, self.calibration_region)
+
+    def recognize_frame(self, hand_img, player_imgs, scan=None):
+        """并行识别手牌和其他玩家区域，结果按区域顺序返回；
+        scan 为本帧要识别的座位集合（0 为手牌），其余区域沿用上次的识别结果"""
+        region_images = [("手牌", hand_img)] + [
+            (f"玩家{i + 1}", player_img) for i, player_img in enumerate(player_imgs)]
+        if scan is None:
+            return self.recognize_regions(region_images)
+
+        scanned = self.recognize_regions([region_images[seat] for seat in sorted(scan)])
+        results = []
+        for seat, (region_name, _) in enumerate(region_images):
+            if seat in scan:
+                results.append(scanned.pop(0))
+            else:
+                self.region_updated[region_name] = False
+                results.append(self.region_results.get(region_name, []))
+        return results
+
+    def plan_regions(self, frame, origin, state):
+        """本帧需要识别的座位集合，关闭按出牌顺序识别时返回None（全部识别）"""
+        if not self.turn_scheduling:
+            return None
+        turn_images = [self.crop_area(frame, area, origin) for area in self.turn_areas] if self.turn_areas else None
+        # 投票还没有定论的区域每帧识别，推迟识别的帧不计票
+        urgent = set()
+        if self.temporal_voting:
+            names = ["手牌"] + [f"玩家{i + 1}" for i in range(len(self.player_areas))]
+            urgent = {seat for seat, name in enumerate(names) if self.voter.undecided(name)}
+        return self.region_scheduler.plan(state, turn_images, urgent)
+
+    def region_schedule_stats(self):
+        """每个区域被识别和推迟的次数，键与变化检测统计一致"""
+        names = ["手牌"] + [f"玩家{i + 1}" for i in range(len(self.player_areas))]
+        return {names[seat]: stats for seat, stats in self.region_scheduler.stats().items()}
+
+    def apply_recognition(self, state, results, verbose=True):
+        """根据一帧的识别结果更新卡牌计数，返回是否检测到新出的牌"""
+        last_player_played = state["last_player_played"]
+        played = False
+
+        # 识别手牌
+        current_hand = self.card_names(results[0])
+        if verbose:
+            print(f"手牌: {current_hand}")
+        # 检测手牌变化
+        # if current_hand != last_hand_cards:
+        #     removed_cards = [card for card in last_hand_cards if card not in current_hand or
+        #                      last_hand_cards.count(card) > current_hand.count(card)]
+        #     for card in removed_cards:
+        #         if self.card_count.get(card, 0) > 0:
+        #             self.card_count[card] -= 1
+        #
+        #     last_hand_cards = current_hand.copy()
+
+        if not state["is_initial"]:
+            for card in current_hand:
+                if self.card_count.get(card, 0) > 0:
+                    self.card_count[card] -= 1
+            state["is_initial"] = True
+
+        # 识别其他玩家出的牌
+        for i, detections in enumerate(results[1:]):
+            current_played = self.card_names(detections)
+            if verbose:
+                print(f"玩家{i + 1} 出牌: {current_played}")
+
+            # 检测其他玩家出牌变化
+            if current_played != last_player_played[i]:
+                new_cards = [card for card in current_played if card not in last_player_played[i] or
+                             current_played.count(card) > last_player_played[i].count(card)]
+
+                for card in new_cards:
+                    if self.card_count.get(card, 0) > 0:
+                        self.card_count[card] -= 1
+                if new_cards:
+                    state["history"][i].append(new_cards)
+                    played = True
+
+                last_player_played[i] = current_played.copy()
+
+        return played
+
+    def process_frame(self, frame, origin, state, verbose=True, timestamp=None):
+        """处理一帧截图：灰度转换 → 裁剪 → 识别 → 更新计数，返回是否检测到新出的牌"""
+        gray = self.frame_gray(frame)
+        with self.timer.stage("crop"):
+            hand_img, player_imgs = self.crop_regions(frame, origin, gray)
+        with self.timer.stage("calibrate"):
+            self.ensure_calibration(hand_img)
+        with self.timer.stage("turn"):
+            scan = self.plan_regions(frame, origin, state)
+        with self.timer.stage("recognize"):
+            results = self.recognize_frame(hand_img, player_imgs, scan)
+        with self.timer.stage("count"):
+            return self.count_frame(state, results, scan, verbose, timestamp)
+
+    def vote_results(self, results, scan, timestamp):
+        """把本帧识别过的区域加入多帧投票，返回各区域已提交的结果"""
+        names = ["手牌"] + [f"玩家{i + 1}" for i in range(len(results) - 1)]
+        return [self.voter.update(name, detections, timestamp) if scan is None or seat in scan
+                else self.voter.get(name)
+                for seat, (name, detections) in enumerate(zip(names, results))]
+
+    def count_frame(self, state, results, scan=None, verbose=True, timestamp=None):
+        """（多帧投票后）按一帧的识别结果更新计数和出牌顺序，返回是否检测到新出的牌"""
+        if self.temporal_voting:
+            results = self.vote_results(results, scan, time.time() if timestamp is None else timestamp)
+            # 手牌投票结果出来之前不做开局计数
+            if not self.voter.ready("手牌"):
+                return False
+        played = self.apply_recognition(state, results, verbose)
+        self.region_scheduler.observe(state)
+        self.combination_result = self.combinations.update(self.card_count)
+        if self.estimator is not None:
+            with self.timer.stage("estimate"):
+                self.hand_estimates = self.estimator.update(self.card_count, state["history"])
+        return played
+
+    def tracking_tick(self, state):
+        """记牌循环的一帧，返回下一帧前需要等待的秒数"""
+        self.scheduler.start_tick()
+        self.allocations.begin_tick()
+
+        # 只截取游戏区域范围内的屏幕，写入预先分配的缓冲区
+        bbox = self.capture_bbox()
+        with self.timer.stage("capture"):
+            frame = self.capture_frame(bbox)
+        if frame is None:
+            # 截屏失败也要结束本帧的统计，一秒后重试
+            self.timer.end_tick()
+            self.allocations.end_tick()
+            self.scheduler.end_tick(False, False)
+            return 1
+
+        # 确认游戏窗口没有移动，移动后本帧画面作废，按新位置重新截屏
+        if self.auto_locate and self.locator.has_anchor():
+            with self.timer.stage("locate"):
+                window_ok = self.check_window(frame, bbox[0])
+            if not window_ok:
+                self.timer.end_tick()
+                self.allocations.end_tick()
+                return self.scheduler.end_tick(False, True)
+
+        # 录制模式下保存原始画面，便于离线回放
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.add(frame, time.time())
+
+        played = self.process_frame(frame, bbox[0], state)
+
+        # 更新界面显示
+        with self.timer.stage("ui"):
+            self.update_display()
+        self.timer.end_tick()
+        self.allocations.end_tick()
+
+        # 按本帧是否出牌、画面是否变化决定下一帧的等待时间（已扣除处理耗时）
+        changed = any(self.region_updated.values())
+        return self.scheduler.end_tick(played, changed)
+
+    def start_profiling(self):
+        """开始用cProfile分析记牌循环；cProfile只记录当前线程，分析期间识别改为单线程"""
+        self.profile_saved_workers = self.recognition_workers
+        self.recognition_workers = 1
+        print(f"开始性能分析，共 {self.profile_ticks} 帧")
+        import cProfile
+        return cProfile.Profile()
+
+    def finish_profiling(self, profiler):
+        """保存性能分析结果并打印耗时最多的函数"""
+        self.recognition_workers = self.profile_saved_workers
+        profiler.dump_stats(self.profile_output)
+        print(f"性能分析结果已保存至: {self.profile_output}")
+        import pstats
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+    def tracking_loop(self, max_ticks=None):
+        """记牌主循环，max_ticks 不为None时跑完指定帧数后结束（命令行模式）"""
+        if self.pipeline_workers > 0:
+            from pipeline import FramePipeline
+            FramePipeline(self, self.pipeline_workers, self.pipeline_slots,
+                          self.pipeline_drop_policy).run(max_ticks)
+            return
+
+        state = self.new_tracking_state()
+        self.scheduler.reset()
+        profiler = self.start_profiling() if self.profile_ticks > 0 else None
+        profiled_ticks = 0
+        ticks = 0
+
+        while self.is_running and (max_ticks is None or ticks < max_ticks):
+            ticks += 1
+            try:
+                if profiler is not None:
+                    delay = profiler.runcall(self.tracking_tick, state)
+                    profiled_ticks += 1
+                    if profiled_ticks >= self.profile_ticks:
+                        self.finish_profiling(profiler)
+                        profiler = None
+                else:
+                    delay = self.tracking_tick(state)
+
+                time.sleep(delay)
+
+            except Exception as e:
+                print(f"记牌循环错误: {e}")
+                time.sleep(1)
+
+        if profiler is not None:
+            self.finish_profiling(profiler)
+
+    def update_display(self):
+        """记牌线程每帧调用一次，无界面时不做任何事，界面子类负责刷新显示"""
+        pass
+
+
+def print_detections(region_name, detections):
+    print(f"{region_name}: 识别到 {len(detections)} 张牌")
+    for d in detections:
+        print(f"  {d['name']:<7} 位置 {d['position']}  大小 {d['size']}  得分 {d['score']:.3f}")
+
+
+def measure_startup(runs):
+    """在全新的子进程中测量冷启动耗时：导入模块并创建对象，取中位数（毫秒）"""
+    snippets = {
+        "engine": "import engine; engine.GuandanEngine()",
+        "engine(import)": "import engine",
+        "main(import)": "import main"
+    }
+    results = {}
+    for name, snippet in snippets.items():
+        code = ("import time; start = time.perf_counter(); " + snippet +
+                "; print((time.perf_counter() - start) * 1000)")
+        samples = []
+        for _ in range(runs):
+            proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+            if proc.returncode != 0:
+                print(f"{name} 启动失败: {proc.stderr.strip().splitlines()[-1:]}")
+                break
+            samples.append(float(proc.stdout.strip().splitlines()[-1]))
+        if samples:
+            results[name] = float(np.median(samples))
+    return results
+
+
+def configure_engine(engine, args):
+    """按命令行参数设置匹配引擎、线程数、快速匹配和多帧投票"""
+    if args.engine:
+        engine.match_engine = args.engine
+    if args.workers is not None:
+        engine.recognition_workers = args.workers
+    if args.fast:
+        engine.configure_fast_matching()
+    if args.vote:
+        engine.configure_voting(*args.vote)
+    if args.estimate:
+        engine.configure_estimation(args.estimate, args.estimate_budget, args.estimate_workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="掼蛋记牌引擎（无界面）")
+    parser.add_argument("--config", default="guandan_regions.json", help="区域配置文件")
+    parser.add_argument("--engine", choices=["spatial", "fft", "pyramid", "slots"], help="匹配引擎")
+    parser.add_argument("--workers", type=int, help="识别线程数")
+    parser.add_argument("--vote", type=int, nargs=2, metavar=("WINDOW", "FRAMES"),
+                        help="开启多帧投票：窗口帧数和提交所需帧数")
+    parser.add_argument("--fast", action="store_true", help="低分辨率、少比例的快速匹配（同时开启多帧投票）")
+    parser.add_argument("--estimate", type=int, metavar="SAMPLES", help="开启对手手牌分布估计，累积的样本数")
+    parser.add_argument("--estimate-budget", type=float, default=15.0, help="手牌估计每帧的时间预算（毫秒）")
+    parser.add_argument("--estimate-workers", type=int, default=0, help="手牌估计的后台采样进程数")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    recognize_parser = subparsers.add_parser("recognize", help="识别一张图片中的牌")
+    recognize_parser.add_argument("image", help="图片文件（游戏区域截图，或 --region whole 时的任意牌区截图）")
+    recognize_parser.add_argument("--region", choices=["all", "whole"], default="all",
+                                  help="all 按区域配置裁剪后逐区域识别，whole 把整张图当作一个区域")
+
+    track_parser = subparsers.add_parser("track", help="无界面实时记牌")
+    track_parser.add_argument("--backend", help="截屏后端（auto/mss/pyautogui/replay）")
+    track_parser.add_argument("--source", help="replay 后端的回放源")
+    track_parser.add_argument("--ticks", type=int, help="记牌帧数，默认一直运行直到 Ctrl+C")
+    track_parser.add_argument("--pipeline", type=int, default=0, help="多进程流水线的识别进程数，0为单进程")
+    track_parser.add_argument("--slots", type=int, default=8, help="流水线共享内存槽位数")
+    track_parser.add_argument("--allocations", action="store_true", help="统计每帧的内存分配（会变慢）")
+    track_parser.add_argument("--drop-policy", choices=["block", "drop_newest", "drop_oldest"],
+                              default="drop_oldest", help="识别跟不上时的丢帧策略")
+    track_parser.add_argument("--profile", type=int, default=0, metavar="N",
+                              help="用cProfile分析记牌循环的前N帧（单进程模式）")
+    track_parser.add_argument("--profile-output", default="tracking_profile.prof", help="性能分析结果文件")
+    track_parser.add_argument("--timings-jsonl", help="把每帧各阶段耗时以JSON行写入该文件")
+
+    multi_parser = subparsers.add_parser("multi", help="同一进程内同时跟踪多桌")
+    multi_parser.add_argument("configs", nargs="+", help="每桌一个区域配置文件")
+    multi_parser.add_argument("--ticks", type=int, help="记牌帧数，默认一直运行直到 Ctrl+C")
+
+    subparsers.add_parser("compile", help="编译模板包（配合 --fast 编译快速匹配的比例）")
+
+    startup_parser = subparsers.add_parser("startup", help="测量冷启动耗时")
+    startup_parser.add_argument("--runs", type=int, default=5, help="每项测量的次数")
+
+    args = parser.parse_args()
+
+    if args.command == "startup":
+        for name, ms in measure_startup(args.runs).items():
+            print(f"{name}: {ms:.1f}ms")
+        return
+
+    if args.command == "multi":
+        from tables import MultiTableTracker
+        tracker = MultiTableTracker(args.configs, args.workers)
+        for table in tracker.tables:
+            configure_engine(table, args)
+            table.recognition_workers = 1
+        tracker.start()
+        try:
+            tracker.run(args.ticks)
+        except KeyboardInterrupt:
+            pass
+        tracker.stop()
+        tracker.print_stats()
+        tracker.close()
+        return
+
+    start = time.perf_counter()
+    engine = GuandanEngine(args.config)
+    print(f"引擎初始化 {(time.perf_counter() - start) * 1000:.1f}ms，模板 {len(engine.card_templates)} 个")
+    configure_engine(engine, args)
+
+    try:
+        if args.command == "compile":
+            start = time.perf_counter()
+            if engine.compile_templates() is None:
+                sys.exit(1)
+            print(f"编译用时 {(time.perf_counter() - start) * 1000:.1f}ms")
+            return
+
+        if args.command == "recognize":
+            image = cv2.imread(args.image)
+            if image is None:
+                parser.error(f"无法读取图片: {args.image}")
+
+            if args.region == "whole":
+                print_detections("整张图片", engine.recognize_cards(image, "整张图片"))
+                return
+
+            if not engine.regions_loaded:
+                parser.error(f"无法加载区域配置: {args.config}")
+            engine.reset_scale_calibration()
+            hand_img, player_imgs = engine.crop_regions(image, engine.game_area[0])
+            engine.ensure_calibration(hand_img)
+            region_names = ["手牌"] + [f"玩家{i + 1}" for i in range(len(player_imgs))]
+            for region_name, detections in zip(region_names, engine.recognize_frame(hand_img, player_imgs)):
+                print_detections(region_name, detections)
+            return
+
+        # track
+        if not engine.regions_loaded:
+            parser.error(f"无法加载区域配置: {args.config}")
+        if args.backend:
+            engine.set_capture_settings({"backend": args.backend, "source": args.source})
+        engine.pipeline_workers = args.pipeline
+        engine.pipeline_slots = args.slots
+        engine.pipeline_drop_policy = args.drop_policy
+        engine.track_allocations = args.allocations
+        engine.profile_ticks = args.profile
+        engine.profile_output = args.profile_output
+        engine.timings_jsonl = args.timings_jsonl
+        if args.profile and args.pipeline:
+            print("流水线模式下识别在子进程中，--profile 只在单进程模式下生效")
+        engine.start_tracking()
+        try:
+            engine.tracking_loop(args.ticks)
+        except KeyboardInterrupt:
+            pass
+        engine.stop_tracking()
+        print(f"剩余牌数: {engine.card_count}")
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import time
+import math
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+CARD_NAMES = ["3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A", "2", "BJoker", "RJoker"]
+RANKS = 13  # 前13项是普通点数，后两项是小王、大王
+HAND_SIZE = 27  # 双副牌四人，每人27张
+SEATS = 3  # 其他三家
+
+
+def sample_deals(pool, sizes, count, seed):
+    """把未出现的牌（pool 为点数下标数组）随机分给三家，sizes 为三家的手牌数；
+    一次生成 count 个发牌结果，返回 (count, 3, 15) 的各家各点数张数"""
+    rng = np.random.default_rng(seed)
+    ranks = rng.permuted(np.broadcast_to(pool, (count, len(pool))), axis=1)
+    seats = np.repeat(np.arange(SEATS), sizes)
+    index = (np.arange(count)[:, None] * SEATS + seats) * len(CARD_NAMES) + ranks
+    counts = np.bincount(index.ravel(), minlength=count * SEATS * len(CARD_NAMES))
+    return counts.reshape(count, SEATS, len(CARD_NAMES)).astype(np.int8)
+
+
+# COMBINATIONS[a, c] = C(a, c)，每个点数最多8张
+COMBINATIONS = np.array([[math.comb(a, c) for c in range(9)] for a in range(9)], np.float64)
+FEATURES = ["bomb", "big_bomb", "both_jokers", "four_jokers"]
+
+
+def sample_totals(samples):
+    """一批样本中每家满足各项特征的样本数 (4, 3) 和各点数张数之和 (3, 15)"""
+    largest = samples[:, :, :RANKS].max(axis=2)
+    black, red = samples[:, :, RANKS], samples[:, :, RANKS + 1]
+    features = np.stack([largest >= 4, largest >= 6, (black > 0) & (red > 0), (black == 2) & (red == 2)])
+    return features.sum(axis=1), samples.sum(axis=0, dtype=np.int64)
+
+
+class HandEstimator:
+    """其他三家手牌分布的蒙特卡洛估计：每家有炸弹、大炸弹、大小王、四王的概率和各点数的期望张数"""
+
+    def __init__(self, target_samples=20000, batch_size=2000, budget_ms=15.0, workers=0, pool_threshold=50000,
+                 seed=0):
+        self.target_samples = target_samples  # 每个牌局状态累积的样本数上限
+        self.batch_size = batch_size  # 每批采样数
+        self.budget_ms = budget_ms  # 每次 update 的时间预算
+        self.workers = workers  # 后台采样进程数，0为只在当前进程内采样
+        self.pool_threshold = pool_threshold  # 样本数不少于此值且 workers 大于0时由进程池在后台采样
+        self.seeds = np.random.SeedSequence(seed)
+        self.executor = None
+        self.reset()
+
+    def reset(self):
+        """新的一局：清空样本和统计"""
+        self.pool_counts = None  # 当前未出现的各点数张数
+        self.sizes = None  # 当前三家的手牌数
+        self.seen_plays = [0] * SEATS  # 已处理的各家出牌次数
+        self.samples = np.zeros((0, SEATS, len(CARD_NAMES)), np.int8)
+        self.clear_totals()
+        self.version = 0  # 牌局状态变化（无法按条件保留样本）时加一，旧状态的后台采样结果作废
+        self.pending = []  # 后台采样 [(version, future)]
+        self.estimates = None
+        self.sample_seconds = None  # 每个样本的采样耗时估计
+        self.updates = 0
+        self.conditioned = 0  # 出牌后按条件保留样本的次数
+        self.resets = 0  # 状态对不上、只能重新采样的次数
+        self.latencies = []
+
+    def clear_totals(self):
+        # 样本特征的累计值，补充样本时只统计新的一批
+        self.feature_totals = np.zeros((len(FEATURES), SEATS), np.int64)
+        self.count_totals = np.zeros((SEATS, len(CARD_NAMES)), np.int64)
+
+    def use_pool(self):
+        return self.workers > 0 and self.target_samples >= self.pool_threshold
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def hand_sizes(self, history, total):
+        """三家的剩余手牌数：27减去各自出过的牌数；与未出现的总张数对不上时（识别误差）按比例调整"""
+        sizes = np.array([max(0, HAND_SIZE - sum(len(cards) for cards in plays)) for plays in history[:SEATS]])
+        if sizes.sum() == total:
+            return sizes
+        if sizes.sum() == 0:
+            sizes = np.ones(SEATS, int)
+        scaled = sizes * total / sizes.sum()
+        sizes = np.floor(scaled).astype(int)
+        for i in np.argsort(sizes - scaled)[:total - sizes.sum()]:
+            sizes[i] += 1
+        return sizes
+
+    def update(self, card_count, history):
+        """按当前剩余牌数和各家出牌历史更新估计，返回最新的估计结果"""
+        start = time.perf_counter()
+        # 留出一成预算给汇总和最后一批的估计误差
+        deadline = start + self.budget_ms * 0.9 / 1000
+        self.updates += 1
+
+        pool_counts = np.array([card_count.get(name, 0) for name in CARD_NAMES])
+        sizes = self.hand_sizes(history, int(pool_counts.sum()))
+        new_plays = [(seat, Counter(cards)) for seat in range(SEATS) for cards in history[seat][self.seen_plays[seat]:]]
+        self.seen_plays = [len(plays) for plays in history[:SEATS]]
+
+        if self.pool_counts is None or not self.advance(new_plays, pool_counts, sizes):
+            if self.pool_counts is not None:
+                self.resets += 1
+            self.pool_counts, self.sizes = pool_counts, sizes
+            self.samples = self.samples[:0]
+            self.clear_totals()
+            self.version += 1
+            self.estimates = None
+
+        self.collect()
+        if self.use_pool():
+            self.submit()
+        else:
+            self.sample_until(deadline)
+        if self.estimates is None or self.estimates["samples"] != len(self.samples):
+            self.estimates = self.summarize()
+
+        self.latencies.append(time.perf_counter() - start)
+        return self.estimates
+
+    def advance(self, new_plays, pool_counts, sizes):
+        """按新出的牌推进到新状态并按条件保留样本；新状态与出牌对不上时返回False"""
+        expected_counts = self.pool_counts.copy()
+        expected_sizes = self.sizes.copy()
+        for seat, played in new_plays:
+            for name, count in played.items():
+                expected_counts[CARD_NAMES.index(name)] -= count
+            expected_sizes[seat] -= sum(played.values())
+        if not np.array_equal(expected_counts, pool_counts) or not np.array_equal(expected_sizes, sizes):
+            return False
+
+        # 样本在一局内持续累积，出牌后按拒绝采样保留，不必从头采样：某点数有 a 张时恰好包含出的 c 张的概率
+        # 正比于 C(a, c)，按 ΠC(a, c) 与其上界之比接受，保留下来的正好是出牌后的条件分布（与重新采样一致）
+        counts, sizes_before = self.pool_counts.copy(), self.sizes.copy()
+        rng = np.random.default_rng(self.seeds.spawn(1)[0])
+        for seat, played in new_plays:
+            cards = np.zeros(len(CARD_NAMES), np.int8)
+            for name, count in played.items():
+                cards[CARD_NAMES.index(name)] = count
+            # 手里没有这些牌的样本接受概率为0
+            upper = np.minimum(counts, sizes_before[seat])
+            weights = COMBINATIONS[self.samples[:, seat], cards].prod(axis=1)
+            keep = rng.random(len(self.samples)) * COMBINATIONS[upper, cards].prod() < weights
+            self.samples = self.samples[keep]
+            self.samples[:, seat] -= cards
+            counts -= cards
+            sizes_before[seat] -= int(cards.sum())
+            self.conditioned += 1
+        if new_plays:
+            self.feature_totals, self.count_totals = sample_totals(self.samples)
+            self.version += 1
+            self.estimates = None
+        self.pool_counts, self.sizes = pool_counts, sizes
+        return True
+
+    def pool(self):
+        return np.repeat(np.arange(len(CARD_NAMES)), self.pool_counts)
+
+    def add_samples(self, samples):
+        room = self.target_samples - len(self.samples)
+        if room > 0:
+            samples = samples[:room]
+            self.samples = np.concatenate([self.samples, samples])
+            features, counts = sample_totals(samples)
+            self.feature_totals += features
+            self.count_totals += counts
+
+    def sample_until(self, deadline):
+        """在当前进程内按批采样，直到样本足够或时间预算用完；批大小按实测的采样速度缩小，避免超出预算"""
+        pool = self.pool()
+        while len(self.samples) < self.target_samples:
+            remaining = deadline - time.perf_counter()
+            count = min(self.batch_size, self.target_samples - len(self.samples))
+            if self.sample_seconds is None:
+                count = min(count, 100)  # 先用一小批测出采样速度
+            else:
+                count = min(count, int(remaining / self.sample_seconds))
+            if count < 1 or remaining <= 0:
+                break
+            start = time.perf_counter()
+            self.add_samples(sample_deals(pool, self.sizes, count, self.seeds.spawn(1)[0]))
+            self.sample_seconds = (time.perf_counter() - start) / count
+
+    def submit(self):
+        """后台进程池保持每个进程一批的采样任务"""
+        needed = self.target_samples - len(self.samples) - self.batch_size * len(self.pending)
+        executor = self.get_executor()
+        pool = self.pool()
+        while needed > 0 and len(self.pending) < self.workers:
+            future = executor.submit(sample_deals, pool, self.sizes, self.batch_size, self.seeds.spawn(1)[0])
+            self.pending.append((self.version, future))
+            needed -= self.batch_size
+
+    def collect(self):
+        """取回已完成的后台采样，丢弃旧状态的结果"""
+        pending = []
+        for version, future in self.pending:
+            if not future.done():
+                pending.append((version, future))
+            elif version == self.version and future.exception() is None:
+                self.add_samples(future.result())
+        self.pending = pending
+
+    def summarize(self):
+        """由累计值计算每家的概率和各点数的期望张数"""
+        total = len(self.samples)
+        if not total:
+            return {"samples": 0, "players": []}
+        players = []
+        for seat in range(SEATS):
+            player = {name: float(self.feature_totals[i, seat] / total) for i, name in enumerate(FEATURES)}
+            player["hand_size"] = int(self.sizes[seat])
+            player["expected"] = {name: float(self.count_totals[seat, i] / total) for i, name in enumerate(CARD_NAMES)}
+            players.append(player)
+        return {"samples": total, "players": players}
+
+    def stats(self):
+        """每次 update 的耗时（毫秒）、样本数和按条件保留/重新采样的次数"""
+        times = np.asarray(self.latencies) * 1000
+        return {
+            "updates": self.updates,
+            "samples": len(self.samples),
+            "conditioned": self.conditioned,
+            "resets": self.resets,
+            "mean_ms": float(times.mean()) if len(times) else 0.0,
+            "p95_ms": float(np.percentile(times, 95)) if len(times) else 0.0,
+            "max_ms": float(times.max()) if len(times) else 0.0
+        }
+
+    def close(self):
+        if self.executor is not None:
+            for _, future in self.pending:
+                future.cancel()
+            self.pending = []
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+def format_estimates(estimates):
+    """每家一行的估计结果文字"""
+    if not estimates or not estimates["players"]:
+        return []
+    return [f"玩家{seat + 1}({player['hand_size']}张) 炸弹 {player['bomb']:.0%} 六张以上 {player['big_bomb']:.0%} "
+            f"大小王 {player['both_jokers']:.0%} 四王 {player['four_jokers']:.0%}"
+            for seat, player in enumerate(estimates["players"])]
@@ -0,0 +1,132 @@
+import time
+import json
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+
+class StageTimer:
+    """热路径各阶段的耗时统计：每个阶段保留最近 window 个样本，计算 p50/p95/p99，
+    可选把每帧各阶段耗时以JSON行的形式写入文件"""
+
+    def __init__(self, window=200, enabled=True):
+        self.window = window
+        self.enabled = enabled
+        self.samples = {}  # 阶段名 -> 最近的耗时样本（秒）
+        self.tick_timings = {}  # 当前帧内各阶段累计耗时
+        self.jsonl_file = None
+        self.lock = threading.Lock()  # 识别线程池中的阶段也会记录
+
+    @contextmanager
+    def stage(self, name):
+        """计时一个阶段：with timer.stage("capture"): ..."""
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(seconds)
+            self.tick_timings[name] = self.tick_timings.get(name, 0.0) + seconds
+
+    def end_tick(self):
+        """一帧结束：写出本帧的各阶段耗时（毫秒）并清空"""
+        with self.lock:
+            timings, self.tick_timings = self.tick_timings, {}
+            if self.jsonl_file is not None and timings:
+                record = {"time": time.time(), "stages": {k: v * 1000 for k, v in timings.items()}}
+                self.jsonl_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self.jsonl_file.flush()
+
+    def percentiles(self, prefix=None):
+        """各阶段的 p50/p95/p99（毫秒），prefix 用于只取某一类阶段（如 "match/"）"""
+        with self.lock:
+            snapshot = {k: list(v) for k, v in self.samples.items() if prefix is None or k.startswith(prefix)}
+
+        stats = {}
+        for name, values in snapshot.items():
+            p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+            stats[name] = {"count": len(values), "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+        return stats
+
+    def open_jsonl(self, path):
+        """开始把每帧耗时以JSON行写入文件"""
+        self.close()
+        self.jsonl_file = open(path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self.lock:
+            if self.jsonl_file is not None:
+                self.jsonl_file.close()
+                self.jsonl_file = None
+
+    def reset(self):
+        with self.lock:
+            self.samples = {}
+            self.tick_timings = {}
+
+
+class AllocationTracker:
+    """用 tracemalloc 统计热路径每帧的内存分配：每帧开始时清空记录，结束时取本帧内的分配峰值（字节）。
+    numpy/OpenCV 的数组分配都会被记录；开启后会明显变慢，只用于发现分配回归，不与耗时统计同时看"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self.samples = deque(maxlen=window)  # 最近每帧的分配峰值（字节）
+        self.started = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started = True
+
+    def stop(self):
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
+
+    def begin_tick(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.clear_traces()
+
+    def end_tick(self):
+        """记录并返回本帧的分配峰值"""
+        if not tracemalloc.is_tracing():
+            return 0
+        _, peak = tracemalloc.get_traced_memory()
+        self.samples.append(peak)
+        return peak
+
+    @contextmanager
+    def measure(self):
+        """统计一段代码的分配峰值：with tracker.measure(): ..."""
+        self.begin_tick()
+        try:
+            yield
+        finally:
+            self.end_tick()
+
+    def reset(self):
+        self.samples.clear()
+
+    def stats(self):
+        """每帧分配峰值的均值、p95 和最大值（KB）"""
+        if not self.samples:
+            return {"ticks": 0, "mean_kb": 0.0, "p95_kb": 0.0, "max_kb": 0.0}
+        values = np.asarray(self.samples) / 1024
+        return {
+            "ticks": len(values),
+            "mean_kb": float(values.mean()),
+            "p95_kb": float(np.percentile(values, 95)),
+            "max_kb": float(values.max())
+        }
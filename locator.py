@@ -0,0 +1,153 @@
+import os
+import cv2
+import numpy as np
+
+
+class WindowLocator:
+    """游戏窗口定位：在游戏区域内选一小块纹理丰富、不在牌区内的锚点图像。
+
+    每帧只在锚点的预期位置附近（±search_margin 像素）做一次小模板匹配确认窗口没有移动，
+    小幅偏移直接修正；确认失败时才在缩小的全屏截图上重新定位（粗定位后在原尺寸上精修）"""
+
+    def __init__(self, anchor_size=(96, 48), downsample=4, locate_threshold=0.8, verify_threshold=0.9,
+                 search_margin=3, min_std=5, auto_min_std=20):
+        self.anchor_size = anchor_size  # 锚点尺寸 (宽, 高)
+        self.downsample = downsample  # 全屏重新定位时的缩小倍数
+        self.locate_threshold = locate_threshold  # 重新定位的最低得分
+        self.verify_threshold = verify_threshold  # 每帧确认的最低得分
+        self.search_margin = search_margin  # 每帧确认时允许的位置抖动
+        self.min_std = min_std  # 锚点灰度标准差的下限，纯色块无法可靠定位
+        self.auto_min_std = auto_min_std  # 自动选取时（没有人工框选确认窗口位置）要求更高的对比度
+        self.anchor = None  # 锚点灰度图
+        self.anchor_area = None  # 锚点在屏幕上的位置 ((x1, y1), (x2, y2))
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.checks = 0
+        self.failures = 0
+        self.nudges = 0  # 小幅偏移直接修正的次数
+        self.reacquisitions = []  # 每次重新定位的耗时（秒）
+        self.lost = 0  # 重新定位失败的次数
+
+    def has_anchor(self):
+        return self.anchor is not None
+
+    def choose_anchor(self, image, origin, exclude_areas, min_std=None):
+        """在以origin为左上角的画面中选取锚点：避开牌区，取灰度标准差最大的一块"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        width, height = self.anchor_size
+        step_x, step_y = max(1, width // 2), max(1, height // 2)
+
+        best = None
+        for y in range(0, gray.shape[0] - height + 1, step_y):
+            for x in range(0, gray.shape[1] - width + 1, step_x):
+                area = ((x + origin[0], y + origin[1]), (x + origin[0] + width, y + origin[1] + height))
+                if any(self.overlaps(area, other) for other in exclude_areas if other):
+                    continue
+                std = float(gray[y:y + height, x:x + width].std())
+                if best is None or std > best[0]:
+                    best = (std, area, gray[y:y + height, x:x + width].copy())
+
+        if best is None or best[0] < (self.min_std if min_std is None else min_std):
+            self.anchor = self.anchor_area = None
+            return False
+        _, self.anchor_area, self.anchor = best
+        return True
+
+    def overlaps(self, a, b):
+        return a[0][0] < b[1][0] and b[0][0] < a[1][0] and a[0][1] < b[1][1] and b[0][1] < a[1][1]
+
+    def verify(self, frame, origin):
+        """确认锚点仍在原位，返回 (是否找到, (dx, dy))；frame 是以origin为左上角的截图"""
+        self.checks += 1
+        margin = self.search_margin
+        (x1, y1), (x2, y2) = self.anchor_area
+        left, top = max(0, x1 - origin[0] - margin), max(0, y1 - origin[1] - margin)
+        right = min(frame.shape[1], x2 - origin[0] + margin)
+        bottom = min(frame.shape[0], y2 - origin[1] + margin)
+        if right - left < x2 - x1 or bottom - top < y2 - y1:
+            self.failures += 1
+            return False, (0, 0)
+
+        # 只转换锚点附近的小块
+        patch = cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_BGR2GRAY)
+        result = cv2.matchTemplate(patch, self.anchor, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score < self.verify_threshold:
+            self.failures += 1
+            return False, (0, 0)
+
+        delta = (left + x - (x1 - origin[0]), top + y - (y1 - origin[1]))
+        if delta != (0, 0):
+            self.nudges += 1
+        return True, delta
+
+    def locate(self, screen, origin=(0, 0)):
+        """在截图中重新寻找锚点，返回锚点左上角的屏幕坐标，找不到返回None"""
+        gray = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+        factor = self.downsample
+        height, width = self.anchor.shape
+
+        # 缩小后粗定位
+        small = cv2.resize(gray, (gray.shape[1] // factor, gray.shape[0] // factor), interpolation=cv2.INTER_AREA)
+        small_anchor = cv2.resize(self.anchor, (max(1, width // factor), max(1, height // factor)),
+                                  interpolation=cv2.INTER_AREA)
+        if small.shape[0] < small_anchor.shape[0] or small.shape[1] < small_anchor.shape[1]:
+            return None
+        result = cv2.matchTemplate(small, small_anchor, cv2.TM_CCOEFF_NORMED)
+        _, _, _, (x, y) = cv2.minMaxLoc(result)
+
+        # 在原尺寸上精修
+        margin = 2 * factor
+        left, top = max(0, x * factor - margin), max(0, y * factor - margin)
+        right = min(gray.shape[1], x * factor + width + margin)
+        bottom = min(gray.shape[0], y * factor + height + margin)
+        if right - left < width or bottom - top < height:
+            return None
+        result = cv2.matchTemplate(gray[top:bottom, left:right], self.anchor, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score < self.locate_threshold:
+            return None
+        return left + x + origin[0], top + y + origin[1]
+
+    def move_anchor(self, dx, dy):
+        (x1, y1), (x2, y2) = self.anchor_area
+        self.anchor_area = ((x1 + dx, y1 + dy), (x2 + dx, y2 + dy))
+
+    def record_reacquisition(self, seconds, found):
+        if found:
+            self.reacquisitions.append(seconds)
+        else:
+            self.lost += 1
+
+    def save(self, path):
+        """保存锚点图像，返回写入配置文件的锚点设置"""
+        cv2.imwrite(path, self.anchor)
+        return {"area": self.anchor_area, "image": os.path.basename(path)}
+
+    def load(self, settings, base_dir):
+        """从配置文件中的锚点设置加载，图像路径相对配置文件所在目录"""
+        self.anchor = self.anchor_area = None
+        if not settings:
+            return False
+        anchor = cv2.imread(os.path.join(base_dir, settings["image"]), cv2.IMREAD_GRAYSCALE)
+        if anchor is None:
+            print(f"无法加载锚点图像: {settings['image']}")
+            return False
+        self.anchor = anchor
+        self.anchor_area = tuple(tuple(p) for p in settings["area"])
+        return True
+
+    def stats(self):
+        """每帧确认的次数和失败次数，以及重新定位的耗时（毫秒）"""
+        times = np.asarray(self.reacquisitions) * 1000
+        return {
+            "checks": self.checks,
+            "failures": self.failures,
+            "nudges": self.nudges,
+            "reacquisitions": len(self.reacquisitions),
+            "lost": self.lost,
+            "reacquire_mean_ms": float(times.mean()) if len(times) else 0.0,
+            "reacquire_max_ms": float(times.max()) if len(times) else 0.0
+        }
+
@@ -1,89 +1,38 @@
 import cv2
-import numpy as np
-import time
-import threading
-import pygame
 import os
 import json
-from PIL import Image
-import pytesseract
+import time
+import threading
+import queue
 import tkinter as tk
 from tkinter import messagebox, filedialog
-from collections import Counter
+from engine import GuandanEngine
+from estimator import format_estimates
+from combos import format_combinations, bomb_note
 
 
-class GuandanCardTracker:
-    def __init__(self):
-        # 初始化游戏状态
-        self.is_running = False
-        self.game_area = None  # 游戏界面区域
-        self.hand_area = None  # 自己手牌区域
-        self.player_areas = [None, None, None]  # 其他三家出牌区域
+class GuandanCardTracker(GuandanEngine):
+    """带 Tk 界面的记牌器，识别和计数由 GuandanEngine 完成"""
 
-        # 区域配置文件
-        self.config_file = "guandan_regions.json"
+    def __init__(self):
+        # 记牌引擎（模板、识别、计数），同时加载已保存的区域数据
+        super().__init__()
 
-        # 卡牌识别相关
-        self.card_templates = self.load_card_templates()
-        self.card_count = self.initialize_card_count()
+        # 界面刷新队列（Tk 只能在界面线程中操作）
+        self.display_queue = queue.Queue()
+        self.display_interval_ms = 100  # 界面线程检查队列的间隔
 
         # 界面初始化
         self.init_ui()
+        if self.regions_loaded:
+            self.status_var.set(f"已加载区域数据")
 
-        # 音效初始化
-        pygame.mixer.init()
-        self.alert_sound = pygame.mixer.Sound('alert.wav') if os.path.exists('alert.wav') else None
-
-        # 尝试加载已保存的区域数据
-        self.load_regions()
-
-    def load_card_templates(self):
-        """加载卡牌模板图像，用于模板匹配"""
-        templates = {}
-
-        # 加载模板图像的路径（假设已有标准模板）
-        template_dir = "card_templates/"
-
-        # 检查模板目录是否存在
-        if not os.path.exists(template_dir):
-            os.makedirs(template_dir)
-            print(f"模板目录不存在，已创建: {template_dir}")
-            print("请将卡牌模板图像放入此目录")
-            return templates
-
-        # 卡牌值
-        values = ["3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A", "2"]
-        jokers = ["BJoker", "RJoker"]
-
-        # 加载普通牌（不区分花色，每种点数只需一个模板）
-        for value in values:
-            template_path = f"{template_dir}{value}.png"
-            if os.path.exists(template_path):
-                templates[value] = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-
-        # 加载王牌
-        for joker in jokers:
-            template_path = f"{template_dir}{joker}.png"
-            if os.path.exists(template_path):
-                templates[joker] = cv2.imread(template_path)
-
-        print(f"已加载 {len(templates)} 个卡牌模板")
-        return templates
-
-    def initialize_card_count(self):
-        """初始化卡牌计数器（掼蛋是双副牌）"""
-        card_count = {}
-
-        # 普通牌 (不区分花色，每种点数有8张)
-        values = ["3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A", "2"]
-        for value in values:
-            card_count[value] = 8
-
-        # 王牌
-        card_count["BJoker"] = 2
-        card_count["RJoker"] = 2
-
-        return card_count
+        # 音效初始化（只有提示音文件存在时才加载 pygame）
+        self.alert_sound = None
+        if os.path.exists('alert.wav'):
+            import pygame
+            pygame.mixer.init()
+            self.alert_sound = pygame.mixer.Sound('alert.wav')
 
     def init_ui(self):
         """初始化用户界面"""
@@ -120,12 +69,36 @@ class GuandanCardTracker:
         self.load_button = tk.Button(area_frame, text="加载区域", command=self.load_regions_dialog, width=15, height=2)
         self.load_button.pack(side=tk.LEFT, padx=5)
 
+        # 对手手牌估计每帧要占用采样的时间预算，默认关闭
+        self.estimate_enabled = tk.BooleanVar(value=False)
+        self.estimate_check = tk.Checkbutton(self.root, text="估计其他三家的炸弹、大小王概率",
+                                             variable=self.estimate_enabled, command=self.toggle_estimation)
+        self.estimate_check.pack()
+
         # 创建卡牌统计显示区
         self.card_stats_frame = tk.Frame(self.root)
         self.card_stats_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
         self.card_stats_text = tk.Text(self.card_stats_frame, height=10, width=50)
         self.card_stats_text.pack(fill=tk.BOTH, expand=True)
+        self.displayed_counts = {}  # 显示区中每个点数当前显示的数量
+
+        # 剩余牌还能组成的牌型
+        self.combination_var = tk.StringVar()
+        self.combination_label = tk.Label(self.root, textvariable=self.combination_var, justify=tk.LEFT, anchor=tk.W,
+                                          wraplength=380)
+        self.combination_label.pack(fill=tk.X, padx=10)
+
+        # 其他三家手牌估计
+        self.estimate_var = tk.StringVar()
+        self.estimate_label = tk.Label(self.root, textvariable=self.estimate_var, justify=tk.LEFT, anchor=tk.W)
+        self.estimate_label.pack(fill=tk.X, padx=10)
+
+        # 各阶段耗时统计面板
+        self.timing_var = tk.StringVar()
+        self.timing_label = tk.Label(self.root, textvariable=self.timing_var, justify=tk.LEFT, anchor=tk.W,
+                                     font=("Courier", 9))
+        self.timing_label.pack(fill=tk.X, padx=10)
 
         # 状态栏
         self.status_var = tk.StringVar()
@@ -135,6 +108,9 @@ class GuandanCardTracker:
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
+        # 记牌线程只往队列里放快照，由界面线程定时取出绘制
+        self.root.after(self.display_interval_ms, self.drain_display_queue)
+
         # 更新界面状态
         self.update_ui_state()
 
@@ -148,18 +124,29 @@ class GuandanCardTracker:
         else:
             self.save_button.config(state=tk.DISABLED)
 
-        # 如果游戏正在运行，禁用设置和加载按钮
+        # 如果游戏正在运行，禁用设置和加载按钮（手牌估计也只在开局前切换，记牌线程正在使用估计器）
         if self.is_running:
             self.setup_button.config(state=tk.DISABLED)
             self.load_button.config(state=tk.DISABLED)
+            self.estimate_check.config(state=tk.DISABLED)
         else:
             self.setup_button.config(state=tk.NORMAL)
             self.load_button.config(state=tk.NORMAL)
+            self.estimate_check.config(state=tk.NORMAL)
+
+    def toggle_estimation(self):
+        """勾选时开启对手手牌估计，取消时关闭"""
+        if self.estimate_enabled.get():
+            self.configure_estimation()
+        else:
+            self.disable_estimation()
+            self.estimate_var.set("")
 
     def on_close(self):
         """关闭窗口时的处理"""
         if self.is_running:
             self.stop_game()
+        self.close()
         self.root.destroy()
 
     # def setup_areas(self):
@@ -193,6 +180,7 @@ class GuandanCardTracker:
 
         # 显示屏幕截图并让用户选择区域
         if self.select_game_area(screen):
+            self.choose_anchor(screen)
             self.status_var.set("游戏区域设置完成")
             self.update_ui_state()
         else:
@@ -257,47 +245,6 @@ class GuandanCardTracker:
             messagebox.showwarning("警告", f"需要选择1个区域，但选择了{len(regions)}个")
             return False
 
-    def calculate_regions(self):
-        """根据游戏区域和比例计算其他区域"""
-        if not self.game_area:
-            return
-
-        # 提取游戏区域坐标
-        x1, y1 = self.game_area[0]
-        x2, y2 = self.game_area[1]
-        width = x2 - x1
-        height = y2 - y1
-
-        # 计算手牌区域（已存在）
-        self.hand_area = (
-            (int(x1 + 0.0097 * width), int(y1 + 0.5286 * height)),
-            (int(x1 + 0.9893 * width), int(y1 + 0.9337 * height))
-        )
-
-        # 计算三个玩家区域（新增）
-        self.player_areas = [
-            # Player 1（左下玩家）
-            (
-                (int(x1 + 0.0754 * width), int(y1 + 0.3001 * height)),  # 左上角
-                (int(x1 + 0.3757 * width), int(y1 + 0.4883 * height))  # 右下角
-            ),
-            # Player 2（上方玩家）
-            (
-                (int(x1 + 0.2668 * width), int(y1 + 0.1239 * height)),  # 左上角
-                (int(x1 + 0.6880 * width), int(y1 + 0.2932 * height))  # 右下角
-            ),
-            # Player 3（右下玩家）
-            (
-                (int(x1 + 0.6030 * width), int(y1 + 0.2773 * height)),  # 左上角
-                (int(x1 + 0.9329 * width), int(y1 + 0.4642 * height))  # 右下角
-            )
-        ]
-
-        # 验证坐标有效性（可选）
-        for area in [self.hand_area] + self.player_areas:
-            assert area[0][0] < area[1][0], "水平坐标无效"
-            assert area[0][1] < area[1][1], "垂直坐标无效"
-
     def select_regions(self, screen):
         """让用户在屏幕截图上选择游戏区域"""
         # 缩放图像以适应屏幕
@@ -379,11 +326,7 @@ class GuandanCardTracker:
             return
 
         # 准备保存的数据结构
-        regions_data = {
-            "game_area": self.game_area,
-            "hand_area": self.hand_area,
-            "player_areas": self.player_areas
-        }
+        regions_data = dict(self.region_profile(), capture=self.capture_settings)
 
         # 打开文件对话框选择保存位置
         file_path = filedialog.asksaveasfilename(
@@ -396,6 +339,9 @@ class GuandanCardTracker:
             return  # 用户取消了保存操作
 
         try:
+            anchor = self.anchor_settings(file_path)
+            if anchor is not None:
+                regions_data["anchor"] = anchor
             with open(file_path, 'w', encoding='utf-8') as f:
                 json.dump(regions_data, f)
 
@@ -405,25 +351,6 @@ class GuandanCardTracker:
         except Exception as e:
             messagebox.showerror("保存失败", f"保存区域数据失败: {e}")
 
-    def load_regions(self):
-        """从默认配置文件加载区域数据"""
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    regions_data = json.load(f)
-
-                self.game_area = tuple(tuple(p) for p in regions_data["game_area"])
-                self.hand_area = tuple(tuple(p) for p in regions_data["hand_area"])
-                self.player_areas = [tuple(tuple(p) for p in area) for area in regions_data["player_areas"]]
-
-                self.status_var.set(f"已加载区域数据")
-                self.update_ui_state()
-                return True
-            except Exception as e:
-                print(f"加载区域数据失败: {e}")
-                return False
-        return False
-
     def load_regions_dialog(self):
         """打开文件对话框选择要加载的区域数据文件"""
         file_path = filedialog.askopenfilename(
@@ -438,9 +365,7 @@ class GuandanCardTracker:
             with open(file_path, 'r', encoding='utf-8') as f:
                 regions_data = json.load(f)
 
-            self.game_area = tuple(tuple(p) for p in regions_data["game_area"])
-            self.hand_area = tuple(tuple(p) for p in regions_data["hand_area"])
-            self.player_areas = [tuple(tuple(p) for p in area) for area in regions_data["player_areas"]]
+            self.apply_regions_data(regions_data, file_path)
 
             self.config_file = file_path
             self.status_var.set(f"已加载区域数据: {file_path}")
@@ -449,26 +374,18 @@ class GuandanCardTracker:
         except Exception as e:
             messagebox.showerror("加载失败", f"加载区域数据失败: {e}")
 
-    def scale_region(self, region, factor):
-        """按比例缩放区域坐标"""
-        return (
-            (int(region[0][0] * factor), int(region[0][1] * factor)),
-            (int(region[1][0] * factor), int(region[1][1] * factor))
-        )
-
     def start_game(self):
         """开始游戏记牌"""
-        if not all([self.game_area, self.hand_area] + self.player_areas):
+        if not self.has_regions():
             messagebox.showwarning("警告", "请先设置游戏区域")
             return
 
-        self.is_running = True
+        # 重置计数、校准和统计
+        self.start_tracking()
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
         self.update_ui_state()
-
-        # 重置卡牌计数
-        self.card_count = self.initialize_card_count()
+        self.reset_display()
 
         # 开始记牌线程
         self.tracking_thread = threading.Thread(target=self.tracking_loop)
@@ -479,233 +396,95 @@ class GuandanCardTracker:
 
     def stop_game(self):
         """停止游戏记牌"""
-        self.is_running = False
+        self.stop_tracking()
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.update_ui_state()
         self.status_var.set("已停止记牌")
 
-    def capture_screen(self):
-        """捕获屏幕"""
-        try:
-            # 使用PIL截取屏幕
-            import pyautogui
-            screenshot = pyautogui.screenshot()
-            screenshot = np.array(screenshot)
-            return cv2.cvtColor(screenshot, cv2.COLOR_RGB2BGR)
-        except Exception as e:
-            print(f"截屏错误: {e}")
-            return None
-
-    def recognize_cards(self, image, region_name):
-        """识别图像中的卡牌"""
-        if not self.card_templates:
-            print("没有卡牌模板可用")
-            return []
-        # 使用模板匹配方法
-        return self.recognize_cards_template(image, region_name)
-
-    def recognize_cards_template(self, image, region_name):
-        """使用模板匹配识别卡牌（不区分花色）"""
-        # 转换为灰度图
-
-        found_cards = []
-        img = image
-
-        # 对每个卡牌模板进行匹配
-        for card_name, template in self.card_templates.items():
-            if card_name in ["BJoker", "RJoker"]:
-
-                #获取模板的原始尺寸
-                template_height, template_width = template.shape[:2]
-
-                # 定义缩放比例范围
-                scales = np.linspace(0.5, 1.5, 20)
-
-                for scale in scales:
-                    # 缩放模板
-                    resized_template = cv2.resize(template, (int(template_width * scale), int(template_height * scale)))
-                    resized_height, resized_width = resized_template.shape[:2]
-
-                    # 跳过过小的模板
-                    if resized_height > img.shape[0] or resized_width > img.shape[1]:
-                        continue
-
-                    # 模板匹配
-                    result = cv2.matchTemplate(img, resized_template, cv2.TM_CCOEFF_NORMED)
-
-                    # 设定阈值
-                    threshold = 0.9
-                    locations = np.where(result >= threshold)
-
-                    # 找到匹配位置
-                    for pt in zip(*locations[::-1]):
-                        # 避免重复检测（临近位置视为同一张牌）
-                        duplicate = False
-                        for found_card in found_cards:
-                            if found_card["name"] == card_name and (abs(pt[1] - found_card["position"][1]) < 10 and abs(
-                                    pt[0] - found_card["position"][0]) < 10):
-                                duplicate = True
-                                break
-
-                        if not duplicate:
-                            found_cards.append({
-                                "name": card_name,
-                                "position": pt
-                            })
-
-
-            else:
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                # 获取模板的原始尺寸
-                template_height, template_width = template.shape[:2]
-
-                # 定义缩放比例范围
-                scales = np.linspace(0.5, 1.5, 20)
-
-                for scale in scales:
-                    # 缩放模板
-                    resized_template = cv2.resize(template, (int(template_width * scale), int(template_height * scale)))
-                    resized_height, resized_width = resized_template.shape[:2]
-
-                    # 跳过过小的模板
-                    if resized_height > gray.shape[0] or resized_width > gray.shape[1]:
-                        continue
-
-                    # 模板匹配
-                    result = cv2.matchTemplate(gray, resized_template, cv2.TM_CCOEFF_NORMED)
-
-                    # 设定阈值
-                    threshold = 0.9
-                    locations = np.where(result >= threshold)
-
-                    # 找到匹配位置
-                    for pt in zip(*locations[::-1]):
-                        # 避免重复检测（临近位置视为同一张牌）
-                        duplicate = False
-                        for found_card in found_cards:
-                            if found_card["name"] == card_name and (abs(pt[1] - found_card["position"][1]) < 10 and abs(pt[0] - found_card["position"][0]) < 10):
-                                duplicate = True
-                                break
-
-                        if not duplicate:
-                            found_cards.append({
-                                "name": card_name,
-                                "position": pt
-                            })
-
-        # 按x坐标排序（从左到右）
-        found_cards.sort(key=lambda x: x["position"][0])
-
-        # 返回卡牌名称列表
-        return [card["name"] for card in found_cards]
-
-    def tracking_loop(self):
-        """记牌主循环"""
-        last_hand_cards = []
-        last_player_played = [[], [], []]
-        is_initial = False
-        while self.is_running:
-            try:
-                # 捕获屏幕
-                screen = self.capture_screen()
-                if screen is None:
-                    time.sleep(1)
-                    continue
-
-                # 获取游戏区域
-                game_img = screen[
-                           self.game_area[0][1]:self.game_area[1][1],
-                           self.game_area[0][0]:self.game_area[1][0]
-                           ]
-
-                # 获取手牌区域
-                hand_img = screen[
-                           self.hand_area[0][1]:self.hand_area[1][1],
-                           self.hand_area[0][0]:self.hand_area[1][0]
-                           ]
-
-                # 获取其他玩家区域
-                player_imgs = []
-                for area in self.player_areas:
-                    player_img = screen[
-                                 area[0][1]:area[1][1],
-                                 area[0][0]:area[1][0]
-                                 ]
-                    player_imgs.append(player_img)
-
-                # 识别手牌
-                current_hand = self.recognize_cards(hand_img, "手牌")
-                print(f"手牌: {current_hand}")
-                # 检测手牌变化
-                # if current_hand != last_hand_cards:
-                #     removed_cards = [card for card in last_hand_cards if card not in current_hand or
-                #                      last_hand_cards.count(card) > current_hand.count(card)]
-                #     for card in removed_cards:
-                #         if self.card_count.get(card, 0) > 0:
-                #             self.card_count[card] -= 1
-                #
-                #     last_hand_cards = current_hand.copy()
-
-                if not is_initial:
-                    for card in current_hand:
-                        if self.card_count.get(card, 0) > 0:
-                            self.card_count[card] -= 1
-                    is_initial = True
-
-                # 识别其他玩家出的牌
-                for i, player_img in enumerate(player_imgs):
-                    current_played = self.recognize_cards(player_img, f"玩家{i + 1}")
-                    print(f"玩家{i + 1} 出牌: {current_played}")
-
-                    # 检测其他玩家出牌变化
-                    if current_played != last_player_played[i]:
-                        new_cards = [card for card in current_played if card not in last_player_played[i] or
-                                     current_played.count(card) > last_player_played[i].count(card)]
-
-                        for card in new_cards:
-                            if self.card_count.get(card, 0) > 0:
-                                self.card_count[card] -= 1
-
-                        last_player_played[i] = current_played.copy()
-
-                # 更新界面显示
-                self.update_display()
-
-                # 轻微延迟，减少CPU使用
-                time.sleep(0.5)
-
-            except Exception as e:
-                print(f"记牌循环错误: {e}")
-                time.sleep(1)
-
     def update_display(self):
-        """更新界面显示"""
+        """记牌线程调用：把当前计数和状态的快照放入队列，由界面线程绘制"""
         if not self.is_running:
             return
 
+        status = None
+        if self.capture_backend is not None:
+            # 状态栏显示截屏延迟
+            stats = self.capture_backend.latency_stats()
+            timing = self.scheduler.stats()
+            status = (f"记牌中... 截屏({stats['backend']}) {stats['last_ms']:.1f}ms，"
+                      f"平均 {stats['average_ms']:.1f}ms | {timing['effective_fps']:.1f}帧/秒，"
+                      f"间隔 {timing['interval_ms']:.0f}ms，超时 {timing['deadline_misses']} 次")
+
+        self.display_queue.put({
+            "card_count": dict(self.card_count),
+            "combinations": self.combination_result,
+            "status": status,
+            "timings": self.format_timings(),
+            "estimates": "\n".join(format_estimates(self.hand_estimates))
+        })
+
+    def format_timings(self):
+        """主要阶段耗时的 p50/p95/p99，用于统计面板"""
+        stats = self.timer.percentiles()
+        lines = []
+        for stage in ["capture", "crop", "calibrate", "gray", "match", "nms", "count", "estimate", "ui", "render"]:
+            if stage in stats:
+                s = stats[stage]
+                lines.append(f"{stage:<10} p50 {s['p50_ms']:6.1f}  p95 {s['p95_ms']:6.1f}  p99 {s['p99_ms']:6.1f} ms")
+        return "\n".join(lines)
+
+    def drain_display_queue(self):
+        """界面线程定时调用：取出队列中积压的快照，只绘制最新的一个"""
+        snapshot = None
+        try:
+            while True:
+                snapshot = self.display_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        if snapshot is not None:
+            with self.timer.stage("render"):
+                self.render_card_count(snapshot["card_count"], snapshot["combinations"])
+                self.combination_var.set(format_combinations(snapshot["combinations"]))
+            if snapshot["status"]:
+                self.status_var.set(snapshot["status"])
+            self.timing_var.set(snapshot["timings"])
+            self.estimate_var.set(snapshot["estimates"])
+
+        self.root.after(self.display_interval_ms, self.drain_display_queue)
+
+    def reset_display(self):
+        """清空卡牌统计显示区，只保留标题"""
         self.card_stats_text.delete(1.0, tk.END)
-
-        # 按点数排序显示
+        self.card_stats_text.insert(tk.END, "剩余牌数统计:\n\n")
+        self.displayed_counts = {}
+        self.estimate_var.set("")
+        self.combination_var.set("")
+
+    def render_card_count(self, card_count, combinations=None):
+        """只更新数量有变化的点数所在的行，数量后面附上该点数还能组成的炸弹"""
+        # 按点数排序显示，先显示普通牌，再显示王牌
         values = ["2", "A", "K", "Q", "J", "10", "9", "8", "7", "6", "5", "4", "3"]
         jokers = ["RJoker", "BJoker"]
 
-        # 生成显示文本
-        display_text = "剩余牌数统计:\n\n"
+        line = 3  # 前两行是标题和空行
+        for card in values + jokers:
+            shown = self.displayed_counts.get(card, 0)
+            count = card_count.get(card, 0)
+
+            if count != shown:
+                if shown > 0 and count > 0:
+                    self.card_stats_text.delete(f"{line}.0", f"{line}.end")
+                    self.card_stats_text.insert(f"{line}.0", f"{card}: {count}张{bomb_note(combinations, card)}")
+                elif shown > 0:
+                    self.card_stats_text.delete(f"{line}.0", f"{line + 1}.0")
+                else:
+                    self.card_stats_text.insert(f"{line}.0", f"{card}: {count}张{bomb_note(combinations, card)}\n")
+                self.displayed_counts[card] = count
 
-        # 先显示普通牌
-        for value in values:
-            count = self.card_count.get(value, 0)
             if count > 0:
-                display_text += f"{value}: {count}张\n"
-
-        # 再显示王牌
-        for joker in jokers:
-            count = self.card_count.get(joker, 0)
-            if count > 0:
-                display_text += f"{joker}: {count}张\n"
-
-        self.card_stats_text.insert(tk.END, display_text)
+                line += 1
 
     def run(self):
         """运行程序"""
@@ -715,4 +494,4 @@ class GuandanCardTracker:
 # 创建并运行程序
 if __name__ == "__main__":
     app = GuandanCardTracker()
-    app.run()
\ No newline at end of file
+    app.run()
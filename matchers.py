@@ -0,0 +1,479 @@
+from collections import OrderedDict
+import threading
+import cv2
+import numpy as np
+
+
+def card_face_mask(gray, card_threshold, glyph_size):
+    """牌面范围：亮像素按字形大小做闭运算，填上牌面上的字形"""
+    width, height = max(1, glyph_size[0]), max(1, glyph_size[1])
+    # 四周先补上与核同宽的背景：OpenCV 腐蚀时把图像外视为亮像素，不补的话牌面会延伸到区域边缘，把桌面也算进来
+    bright = cv2.copyMakeBorder((gray >= card_threshold).astype(np.uint8), height, height, width, width,
+                                cv2.BORDER_CONSTANT, value=0)
+    face = cv2.morphologyEx(bright, cv2.MORPH_CLOSE, np.ones((height, width), np.uint8))
+    return face[height:-height, width:-width]
+
+
+class FFTMatcher:
+    """频域批量模板匹配：每帧只对区域做一次FFT，再与预先变换好的模板批量相关，
+    结果与 cv2.matchTemplate(TM_CCOEFF_NORMED) 一致（在浮点误差范围内）。
+
+    只在出牌区这样的中小区域上比逐个匹配快；手牌区这样的大区域上频谱和逆变换的临时数组很大，反而更慢，
+    像素数超过 max_pixels 的区域退回 cv2.matchTemplate。频谱缓存由多个识别线程共用，用锁保护"""
+
+    def __init__(self, batch_size=16, cache_bytes=256 * 1024 * 1024, max_pixels=100000):
+        self.batch_size = batch_size  # 每批一起做逆变换的模板数，限制峰值内存
+        self.cache_bytes = cache_bytes  # 模板频谱缓存的上限
+        self.max_pixels = max_pixels  # 区域像素数超过此值时不用频域匹配
+        self.spectrum_cache = OrderedDict()  # (模板缓存项id, 填充尺寸) -> (模板缓存项, 频谱)
+        self.cached_bytes = 0
+        self.lock = threading.Lock()  # 保护频谱缓存和 cached_bytes
+
+    def padded_shape(self, image_shape):
+        """FFT填充尺寸：不小于区域尺寸即可保证有效位置不发生循环卷绕"""
+        return cv2.getOptimalDFTSize(image_shape[0]), cv2.getOptimalDFTSize(image_shape[1])
+
+    def template_spectrum(self, level, shape):
+        """获取去均值后的模板在指定填充尺寸下的共轭频谱（按通道），带缓存"""
+        key = (id(level), shape)
+        with self.lock:
+            cached = self.spectrum_cache.get(key)
+            if cached is not None and cached[0] is level:
+                self.spectrum_cache.move_to_end(key)
+                return cached[1]
+
+        template = level["template"].astype(np.float32)
+        if template.ndim == 2:
+            template = template[:, :, None]
+        template -= level["mean"].astype(np.float32)
+        channels = np.moveaxis(template, 2, 0)
+        spectrum = np.conj(np.fft.rfft2(channels, s=shape)).astype(np.complex64)
+
+        # 模板缓存重建后旧的缓存项失效（其他线程可能已经替换过）；超过上限时淘汰最久未用的频谱
+        with self.lock:
+            previous = self.spectrum_cache.pop(key, None)
+            if previous is not None:
+                self.cached_bytes -= previous[1].nbytes
+            self.spectrum_cache[key] = (level, spectrum)
+            self.cached_bytes += spectrum.nbytes
+            while self.cached_bytes > self.cache_bytes and len(self.spectrum_cache) > 1:
+                _, (_, old) = self.spectrum_cache.popitem(last=False)
+                self.cached_bytes -= old.nbytes
+        return spectrum
+
+    def window_variance(self, sums, squares, height, width):
+        """用积分图计算每个 height×width 窗口的 Σ(I-均值)²，多通道时按通道求和"""
+        def window(integral):
+            return (integral[height:, width:] - integral[:-height, width:]
+                    - integral[height:, :-width] + integral[:-height, :-width])
+
+        count = float(height * width)
+        variance = window(squares) - window(sums) ** 2 / count
+        if variance.ndim == 3:
+            variance = variance.sum(axis=2)
+        return variance
+
+    def match(self, region, jobs):
+        """对 jobs 中的 (卡牌下标, 模板缓存项, 通道) 批量匹配，结果与 jobs 顺序一致"""
+        results = [None] * len(jobs)
+
+        # 灰度模板和彩色模板分两组，每组的区域只变换一次
+        groups = {}
+        for i, (_, _, channel) in enumerate(jobs):
+            groups.setdefault(channel, []).append(i)
+
+        for channel, indices in groups.items():
+            img = region[channel]
+            height, width = img.shape[:2]
+            if height * width > self.max_pixels:
+                for i in indices:
+                    results[i] = cv2.matchTemplate(img, jobs[i][1]["template"], cv2.TM_CCOEFF_NORMED)
+                continue
+            shape = self.padded_shape(img.shape)
+
+            # 去掉整体均值不影响去均值模板的相关结果，但能减小浮点误差
+            pixels = img.astype(np.float32)
+            if pixels.ndim == 2:
+                pixels = pixels[:, :, None]
+            pixels -= pixels.mean(axis=(0, 1))
+            image_spectrum = np.fft.rfft2(np.moveaxis(pixels, 2, 0), s=shape).astype(np.complex64)
+
+            # 积分图用于计算每个窗口的方差
+            sums, squares = cv2.integral2(img, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+            variances = {}
+
+            for start in range(0, len(indices), self.batch_size):
+                batch = indices[start:start + self.batch_size]
+                spectra = np.stack([self.template_spectrum(jobs[i][1], shape) for i in batch])
+                correlations = np.fft.irfft2((spectra * image_spectrum[None]).sum(axis=1), s=shape)
+
+                for correlation, i in zip(correlations, batch):
+                    level = jobs[i][1]
+                    h, w = level["height"], level["width"]
+                    numerator = correlation[:height - h + 1, :width - w + 1]
+                    if (h, w) not in variances:
+                        variances[(h, w)] = self.window_variance(sums, squares, h, w)
+                    variance = variances[(h, w)]
+
+                    # 纯色窗口没有可比较的结构，得分记为0
+                    score = np.zeros(numerator.shape, dtype=np.float32)
+                    valid = variance > 1.0
+                    score[valid] = numerator[valid] / (np.sqrt(variance[valid]) * level["norm"])
+                    results[i] = np.clip(score, -1.0, 1.0)
+
+        return results
+
+
+class CoarseToFineMatcher:
+    """两级匹配：先在缩小的区域上用缩小的模板找候选位置，再只在候选附近的小窗口内做全分辨率匹配"""
+
+    def __init__(self, factor=2, coarse_threshold=0.7, max_candidates=32):
+        self.factor = factor  # 缩小倍数，需在模板缓存的 coarse_factors 中
+        self.coarse_threshold = coarse_threshold  # 粗匹配得分阈值（缩小后得分会下降，需低于最终阈值）
+        self.max_candidates = max_candidates  # 每个模板最多精修的候选数
+
+    def coarse_image(self, region, channel):
+        """获取区域缩小后的图像，同一帧内所有模板共用"""
+        key = (self.factor, channel)
+        if key not in region["coarse"]:
+            img = region[channel]
+            size = (max(1, img.shape[1] // self.factor), max(1, img.shape[0] // self.factor))
+            region["coarse"][key] = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        return region["coarse"][key]
+
+    def coarse_candidates(self, scores, template_shape):
+        """粗匹配结果中超过阈值的局部极大值位置，按得分取前 max_candidates 个"""
+        mask = scores >= self.coarse_threshold
+        if not mask.any():
+            return []
+
+        # 局部极大值：等于邻域最大值的位置，邻域约为半个模板大小
+        kernel_size = (max(1, template_shape[1] // 2) | 1, max(1, template_shape[0] // 2) | 1)
+        peaks = mask & (scores >= cv2.dilate(scores, np.ones(kernel_size[::-1], np.uint8)))
+        ys, xs = np.nonzero(peaks)
+        if len(xs) > self.max_candidates:
+            top = np.argsort(-scores[ys, xs])[:self.max_candidates]
+            ys, xs = ys[top], xs[top]
+        return list(zip(xs, ys))
+
+    def match(self, region, jobs):
+        """对 jobs 中的 (卡牌下标, 模板缓存项, 通道) 逐个两级匹配，返回与全图匹配同尺寸的得分图
+        （只有候选附近有得分，其余位置为0），结果与 jobs 顺序一致"""
+        results = []
+        margin = 2 * self.factor  # 缩小造成的位置误差
+        for _, level, channel in jobs:
+            img = region[channel]
+            template = level["template"]
+            coarse_template = level["coarse"].get(self.factor)
+            coarse_img = self.coarse_image(region, channel)
+
+            # 模板太小无法缩小时，退回全分辨率匹配
+            if (coarse_template is None or coarse_template.shape[0] > coarse_img.shape[0]
+                    or coarse_template.shape[1] > coarse_img.shape[1]):
+                results.append(cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED))
+                continue
+
+            coarse_scores = cv2.matchTemplate(coarse_img, coarse_template, cv2.TM_CCOEFF_NORMED)
+            height, width = img.shape[:2]
+            h, w = level["height"], level["width"]
+            result = np.zeros((height - h + 1, width - w + 1), dtype=np.float32)
+
+            # 只在候选附近的小窗口内做全分辨率匹配
+            for coarse_x, coarse_y in self.coarse_candidates(coarse_scores, coarse_template.shape):
+                x, y = int(coarse_x) * self.factor, int(coarse_y) * self.factor
+                x1, y1 = max(0, x - margin), max(0, y - margin)
+                x2, y2 = min(width, x + w + margin), min(height, y + h + margin)
+                if x2 - x1 < w or y2 - y1 < h:
+                    continue
+
+                fine = cv2.matchTemplate(img[y1:y2, x1:x2], template, cv2.TM_CCOEFF_NORMED)
+                target = result[y1:y1 + fine.shape[0], x1:x1 + fine.shape[1]]
+                np.maximum(target, fine, out=target)
+
+            results.append(result)
+        return results
+
+
+class SlotRecognizer:
+    """按牌位识别：先从区域中分割出每张牌角上的字形，再对每个小图分类。
+    计算量随牌数增长，而不是随 区域面积×模板数×比例数 增长"""
+
+    feature_size = (16, 24)  # 特征向量对应的小图尺寸 (宽, 高)
+
+    def __init__(self, classifier="knn", min_similarity=0.8, ink_threshold=140, card_threshold=190,
+                 dnn_model=None, dnn_labels=None, dnn_input_size=(32, 32)):
+        self.classifier = classifier  # knn: 模板特征最近邻；dnn: OpenCV dnn 模型
+        self.min_similarity = min_similarity  # 最近邻相似度（或dnn置信度）低于此值的字形丢弃
+        self.ink_threshold = ink_threshold  # 灰度低于此值视为字迹
+        self.card_threshold = card_threshold  # 灰度高于此值视为牌面
+        self.dnn_model = dnn_model  # dnn 模型文件（onnx 等 cv2.dnn.readNet 支持的格式）
+        self.dnn_labels = dnn_labels  # dnn 输出对应的卡牌名称列表
+        self.dnn_input_size = dnn_input_size
+        self.net = None
+        self.features = None
+        self.feature_source = None
+        self.check_classifier()
+
+    def check_classifier(self):
+        """分类器设置不完整时抛出 ValueError（dnn 需要模型文件和输出名称列表）"""
+        if self.classifier not in ("knn", "dnn"):
+            raise ValueError(f"未知的牌位分类器: {self.classifier}")
+        if self.classifier == "dnn" and (not self.dnn_model or not self.dnn_labels):
+            raise ValueError("dnn 分类器需要设置 dnn_model 和 dnn_labels")
+
+    def feature(self, gray_crop):
+        """把字形小图缩放到固定尺寸，去均值并归一化，作为特征向量"""
+        small = cv2.resize(gray_crop, self.feature_size, interpolation=cv2.INTER_AREA).astype(np.float32)
+        small -= small.mean()
+        norm = np.linalg.norm(small)
+        return (small / norm).ravel() if norm > 0 else small.ravel()
+
+    def ink_box(self, gray, box=None):
+        """box 范围内字迹像素的紧外接框 (x, y, w, h)；模板和分割结果都按字迹裁剪，特征才可比"""
+        x, y, w, h = box if box is not None else (0, 0, gray.shape[1], gray.shape[0])
+        ys, xs = np.nonzero(gray[y:y + h, x:x + w] < self.ink_threshold)
+        if len(xs) == 0:
+            return x, y, w, h
+        return x + int(xs.min()), y + int(ys.min()), int(xs.max() - xs.min()) + 1, int(ys.max() - ys.min()) + 1
+
+    def red_ratio(self, bgr_crop, ink):
+        """字迹像素中偏红的比例，用于区分大小王"""
+        if bgr_crop.ndim != 3 or not ink.any():
+            return 0.0
+        pixels = bgr_crop[ink].astype(np.int16)
+        red = (pixels[:, 2] - np.maximum(pixels[:, 0], pixels[:, 1])) > 60
+        return float(red.mean())
+
+    def build_features(self, templates):
+        """由卡牌模板生成特征库，模板变化时重建"""
+        if self.feature_source is templates and self.features is not None:
+            return self.features
+
+        names, vectors, aspects = [], [], []
+        for card_name, template in templates.items():
+            gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY) if template.ndim == 3 else template
+            x, y, w, h = self.ink_box(gray)
+            glyph = gray[y:y + h, x:x + w]
+            names.append(card_name)
+            vectors.append(self.feature(glyph))
+            aspects.append(w / h)
+
+        self.features = {
+            "names": names,
+            "vectors": np.stack(vectors),
+            "aspects": np.asarray(aspects)
+        }
+        self.feature_source = templates
+        return self.features
+
+    def segment(self, region, glyph_size, joker_height):
+        """在牌面范围内找出字迹连通块，返回可能是点数或王牌字形的外接框 (x, y, w, h)"""
+        gray = region["gray"]
+        glyph_width, glyph_height = glyph_size
+
+        # 闭运算填上牌面上的字形，得到牌面范围；只保留牌面内的字迹，排除桌面。
+        # 字形超出牌面的部分（牌面被区域边缘截断等）不计入，分类时按截断后的字形比较
+        card = card_face_mask(gray, self.card_threshold, glyph_size)
+        ink = ((gray < self.ink_threshold) & (card > 0)).astype(np.uint8)
+
+        # 轻微膨胀，把 "10" 的两个数字、JOKER 的各个字母连成一块
+        joined = cv2.dilate(ink, np.ones((max(1, glyph_height // 6), max(1, glyph_width // 6)), np.uint8))
+        _, _, stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+
+        boxes = []
+        max_height = max(1.4 * joker_height, 1.6 * glyph_height)
+        for x, y, w, h, _ in stats[1:]:
+            if h < 0.5 * glyph_height or h > max_height or w > 1.8 * glyph_width:
+                continue
+            boxes.append((int(x), int(y), int(w), int(h)))
+        return boxes
+
+    def classify_knn(self, region, box, features):
+        """与模板特征做最近邻匹配（余弦相似度），返回 (名称, 相似度)"""
+        x, y, w, h = self.ink_box(region["gray"], box)
+        crop = region["gray"][y:y + h, x:x + w]
+        vector = self.feature(crop)
+
+        # 宽高比相差太大的模板不参与比较
+        aspect = w / h
+        allowed = np.abs(np.log(features["aspects"] / aspect)) < np.log(1.5)
+        if not allowed.any():
+            return None, 0.0
+
+        similarity = np.where(allowed, features["vectors"] @ vector, -1.0)
+        best = int(np.argmax(similarity))
+        name = features["names"][best]
+
+        # 大小王字形相同，按字迹颜色区分
+        if name in ("BJoker", "RJoker"):
+            red = self.red_ratio(region["image"][y:y + h, x:x + w], crop < self.ink_threshold)
+            name = "RJoker" if red > 0.5 else "BJoker"
+        return name, float(similarity[best])
+
+    def classify_dnn(self, region, box):
+        """用 OpenCV dnn 模型（CPU）分类，返回 (名称, 置信度)"""
+        if self.net is None:
+            self.net = cv2.dnn.readNet(self.dnn_model)
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+        x, y, w, h = box
+        blob = cv2.dnn.blobFromImage(region["image"][y:y + h, x:x + w], 1 / 255.0, self.dnn_input_size, swapRB=True)
+        self.net.setInput(blob)
+        logits = self.net.forward().ravel()
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+        best = int(np.argmax(probabilities))
+        return self.dnn_labels[best], float(probabilities[best])
+
+    def recognize(self, region, templates, glyph_size, joker_height):
+        """分割并分类区域内的所有字形，返回与模板匹配相同格式的检测结果"""
+        self.check_classifier()
+        features = self.build_features(templates) if self.classifier == "knn" else None
+        found_cards = []
+        for box in self.segment(region, glyph_size, joker_height):
+            candidates = [box]
+
+            # 点数下方连着花色时，取上半部分再试一次
+            x, y, w, h = box
+            if h > 1.3 * glyph_size[1]:
+                candidates.append((x, y, w, int(1.1 * glyph_size[1])))
+
+            for candidate in candidates:
+                if self.classifier == "dnn":
+                    name, score = self.classify_dnn(region, candidate)
+                else:
+                    name, score = self.classify_knn(region, candidate, features)
+                if name is not None and score >= self.min_similarity:
+                    found_cards.append({
+                        "name": name,
+                        "position": candidate[:2],
+                        "size": candidate[2:],
+                        "score": score
+                    })
+                    break
+
+        found_cards.sort(key=lambda x: x["position"][0])
+        return found_cards
+
+
+class TemplatePrefilter:
+    """匹配前的廉价预筛：按墨迹（深色像素）和红色像素的数量排除不可能匹配的 (模板, 比例)"""
+
+    def __init__(self, ink_threshold=140, red_threshold=120, red_margin=50, min_ratio=0.5, card_threshold=190):
+        self.ink_threshold = ink_threshold  # 灰度低于此值视为墨迹
+        self.card_threshold = card_threshold  # 灰度高于此值视为牌面
+        self.red_threshold = red_threshold  # R通道高于此值且明显高于G、B时视为红色
+        self.red_margin = red_margin
+        self.min_ratio = min_ratio  # 窗口内像素数不低于模板的此比例才匹配，留足噪声和抗锯齿的余量
+        self.level_cache = {}  # 模板缓存项id -> (模板缓存项, 墨迹像素数, 红色像素数)
+        self.lock = threading.Lock()  # 多个识别线程共用统计
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.counts = {}  # 类别 -> 检查/排除的匹配数和对应的计算量
+
+    def ink_mask(self, gray):
+        return (gray < self.ink_threshold).astype(np.uint8)
+
+    def face_ink_mask(self, gray, glyph_size):
+        """牌面范围内的墨迹：与 SlotRecognizer 相同的牌面范围，再与深色像素相与"""
+        # 绿色桌面灰度约80，也低于墨迹阈值，只统计牌面上的深色像素
+        return self.ink_mask(gray) & card_face_mask(gray, self.card_threshold, glyph_size)
+
+    def red_mask(self, image):
+        b, g, r = [image[:, :, i].astype(np.int16) for i in range(3)]
+        return ((r > self.red_threshold) & (r - g > self.red_margin) & (r - b > self.red_margin)).astype(np.uint8)
+
+    def level_stats(self, level):
+        """模板的墨迹和红色像素数，带缓存"""
+        key = id(level)
+        cached = self.level_cache.get(key)
+        if cached is not None and cached[0] is level:
+            return cached[1], cached[2]
+
+        template = level["template"]
+        if template.ndim == 3:
+            ink = int(self.ink_mask(cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)).sum())
+            red = int(self.red_mask(template).sum())
+        else:
+            ink = int(self.ink_mask(template).sum())
+            red = 0
+        self.level_cache[key] = (level, ink, red)
+        return ink, red
+
+    def window_max(self, region, kind, height, width):
+        """区域内 height×width 窗口中墨迹（或红色）像素数的最大值，积分图和结果都缓存在 region 中"""
+        cache = region.setdefault("prefilter", {})
+        key = (kind, height, width)
+        if key in cache:
+            return cache[key]
+
+        integral = cache.get(kind)
+        if integral is None:
+            if kind == "ink":
+                mask = self.face_ink_mask(region["gray"], cache["glyph_size"])
+            else:
+                mask = self.red_mask(region["image"])
+            integral = cv2.integral(mask)
+            cache[kind] = integral
+
+        window = (integral[height:, width:] - integral[:-height, width:]
+                  - integral[height:, :-width] + integral[:-height, :-width])
+        cache[key] = int(window.max()) if window.size else 0
+        return cache[key]
+
+    def accepts(self, region, level):
+        # 模板得分达到阈值的位置，窗口内的墨迹/红色像素数必然接近模板本身：
+        # 空的出牌区整体排除，没有红色的区域排除红王，没有足够大块墨迹的区域排除王牌
+        ink, red = self.level_stats(level)
+        height, width = level["height"], level["width"]
+        if ink and self.window_max(region, "ink", height, width) < ink * self.min_ratio:
+            return False
+        if red and self.window_max(region, "red", height, width) < red * self.min_ratio:
+            return False
+        return True
+
+    def filter(self, region, jobs):
+        """过滤 (卡牌下标, 模板缓存项, 通道) 列表，返回需要真正匹配的部分，并按王牌/点数分别统计"""
+        # 牌面闭运算的核取本次最大的点数模板（未校准时为最大比例），保证字形都能被填上
+        cache = region.setdefault("prefilter", {})
+        if "glyph_size" not in cache:
+            sizes = [(level["width"], level["height"]) for _, level, channel in jobs if channel == "gray"]
+            sizes = sizes or [(level["width"], level["height"]) for _, level, _ in jobs] or [(1, 1)]
+            cache["glyph_size"] = (max(w for w, _ in sizes), max(h for _, h in sizes))
+
+        kept = []
+        counts = {}
+        for job in jobs:
+            _, level, channel = job
+            img = region[channel]
+            work = ((img.shape[0] - level["height"] + 1) * (img.shape[1] - level["width"] + 1)
+                    * level["height"] * level["width"])
+            category = "joker" if channel == "image" else "rank"
+            c = counts.setdefault(category, {"checked": 0, "rejected": 0, "work": 0, "saved_work": 0})
+            c["checked"] += 1
+            c["work"] += work
+            if self.accepts(region, level):
+                kept.append(job)
+            else:
+                c["rejected"] += 1
+                c["saved_work"] += work
+
+        self.add_counts(counts)
+        return kept
+
+    def add_counts(self, counts):
+        """累加各类别的统计（也用于合并流水线识别进程的统计）"""
+        with self.lock:
+            for category, c in counts.items():
+                total = self.counts.setdefault(category, {"checked": 0, "rejected": 0, "work": 0, "saved_work": 0})
+                for key, value in c.items():
+                    total[key] += value
+
+    def stats(self):
+        """各类别被排除的匹配比例，以及按 窗口数×模板像素数 估计省下的匹配计算量比例"""
+        with self.lock:
+            return {category: dict(c, rejection_rate=c["rejected"] / c["checked"] if c["checked"] else 0.0,
+                                   saved_ratio=c["saved_work"] / c["work"] if c["work"] else 0.0)
+                    for category, c in self.counts.items()}
@@ -0,0 +1,316 @@
+import time
+import queue
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+
+# 识别进程跟不上截屏时的处理方式
+DROP_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+
+class FrameRing:
+    """共享内存中的画面环形缓冲区：slots 个固定大小的槽位，每个槽位存一帧BGR画面。
+    截屏进程直接写入槽位，识别进程按名字挂载同一块内存，用NumPy视图读取，不经过管道复制"""
+
+    def __init__(self, frame_shape, slots, name=None):
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        self.frame_bytes = int(np.prod(self.frame_shape))
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.frame_bytes * slots)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buffer = np.ndarray((slots, self.frame_bytes), dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def view(self, slot, shape=None):
+        """槽位的画面视图（不复制）；shape 小于槽位时只使用前面一部分"""
+        shape = tuple(shape) if shape is not None else self.frame_shape
+        size = int(np.prod(shape))
+        return self.buffer[slot, :size].reshape(shape)
+
+    def close(self):
+        # 先释放所有视图，否则共享内存无法关闭
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def capture_process(settings, ring_name, frame_shape, slots, free_slots, jobs, results, stop_event, ready,
+                    interval, drop_policy):
+    """截屏进程：取一个空闲槽位，把画面直接写入共享内存，再把槽位号交给识别进程"""
+    from capture import create_capture_backend
+
+    ring = FrameRing(frame_shape, slots, ring_name)
+    backend = create_capture_backend(settings["capture"]["backend"], settings["capture"]["source"])
+    bbox = settings["bbox"]
+    seq = 0
+
+    # 等识别进程加载完模板再开始截屏，避免启动期间的画面全部被丢弃
+    try:
+        ready.wait(timeout=60)
+    except threading.BrokenBarrierError:
+        print("等待识别进程启动超时，直接开始截屏")
+
+    try:
+        while not stop_event.is_set():
+            start = time.perf_counter()
+
+            slot = None
+            if drop_policy == "block":
+                # 背压：没有空闲槽位时等待识别进程释放，不再截新的画面
+                while slot is None and not stop_event.is_set():
+                    try:
+                        slot = free_slots.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+            else:
+                try:
+                    slot = free_slots.get_nowait()
+                except queue.Empty:
+                    if drop_policy == "drop_oldest":
+                        # 丢弃最早的待识别画面，复用它的槽位
+                        try:
+                            old_seq, slot, _, _ = jobs.get_nowait()
+                            results.put(("dropped", old_seq, None, None))
+                        except queue.Empty:
+                            # 没有待识别的画面，所有槽位都在识别中（槽位数不多于识别进程数），等识别进程释放
+                            try:
+                                slot = free_slots.get(timeout=interval)
+                            except queue.Empty:
+                                pass
+            if slot is None:
+                if drop_policy == "drop_newest" and not stop_event.is_set():
+                    # 本帧不截屏，通知汇总端这一帧被丢弃
+                    results.put(("dropped", seq, None, None))
+                    seq += 1
+                    time.sleep(interval)
+                continue
+
+            try:
+                frame = backend.grab_into(bbox, ring.view(slot))
+            except Exception as e:
+                print(f"截屏错误: {e}")
+                frame = None
+            if frame is None:
+                free_slots.put(slot)
+                time.sleep(1)
+                continue
+
+            jobs.put((seq, slot, frame.shape, time.time()))
+            seq += 1
+            time.sleep(max(0.0, interval - (time.perf_counter() - start)))
+    finally:
+        backend.close()
+        ring.close()
+
+
+def recognition_process(settings, ring_name, frame_shape, slots, free_slots, jobs, results, stop_event, ready):
+    """识别进程：从共享内存中取出画面视图，裁剪各区域（仍是视图）并识别，识别完立即释放槽位"""
+    from engine import GuandanEngine
+
+    engine = GuandanEngine(settings["config_file"])
+    engine.apply_regions_data(settings["regions"])
+    engine.apply_match_settings(settings["match"])
+    engine.recognition_workers = 1  # 并行由多个进程提供
+    origin = settings["bbox"][0]
+    ring = FrameRing(frame_shape, slots, ring_name)
+    try:
+        ready.wait(timeout=60)
+    except threading.BrokenBarrierError:
+        pass
+
+    try:
+        while not stop_event.is_set():
+            try:
+                seq, slot, shape, timestamp = jobs.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            try:
+                frame = ring.view(slot, shape)
+                hand_img, player_imgs = engine.crop_regions(frame, origin, engine.frame_gray(frame))
+                engine.ensure_calibration(hand_img)
+                detections = engine.recognize_frame(hand_img, player_imgs)
+                results.put(("result", seq, detections, timestamp))
+            except Exception as e:
+                results.put(("error", seq, str(e), timestamp))
+            finally:
+                frame = hand_img = player_imgs = None
+                engine.gray_views = {}  # 登记的区域视图引用共享内存，槽位归还前释放
+                free_slots.put(slot)
+    finally:
+        # 预筛和变化检测的统计在识别进程里，退出前交给主进程汇总
+        results.put(("stats", None, {"prefilter": engine.prefilter.counts, "change": engine.change_stats}, None))
+        engine.close()
+        ring.close()
+
+
+class FramePipeline:
+    """多进程记牌流水线：截屏进程 → 共享内存环形缓冲区 → 多个识别进程 → 汇总线程按帧序更新计数。
+
+    槽位数即最多积压的画面数；槽位用完说明识别跟不上，此时按 drop_policy 处理：
+    block 截屏进程等待（背压），drop_newest 跳过新画面，drop_oldest 丢弃最早的待识别画面"""
+
+    def __init__(self, engine, workers=2, slots=8, drop_policy="drop_oldest", interval=None, seq_timeout=5.0):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"未知的丢帧策略: {drop_policy}")
+
+        self.engine = engine
+        self.workers = workers
+        self.slots = slots
+        self.drop_policy = drop_policy
+        self.interval = engine.scheduler.fast_interval if interval is None else interval
+        self.seq_timeout = seq_timeout  # 后面的帧已到、仍等不到某一帧的最长时间（识别进程可能已退出）
+        self.processes = []
+        self.stats_reported = 0  # 已发回统计的识别进程数
+        self.stats = {"captured": 0, "applied": 0, "dropped": 0, "lost": 0, "errors": 0, "max_pending": 0}
+
+    def settings(self):
+        """传给子进程的配置（子进程各自加载模板并创建截屏后端）"""
+        engine = self.engine
+        return {
+            "config_file": engine.config_file,
+            "capture": engine.capture_settings,
+            "regions": engine.region_profile(),
+            "bbox": engine.capture_bbox(),
+            "match": engine.match_settings()
+        }
+
+    def run(self, max_frames=None, verbose=True):
+        """运行流水线直到 engine.is_running 为False或处理完 max_frames 帧，返回统计"""
+        engine = self.engine
+        settings = self.settings()
+        (x1, y1), (x2, y2) = settings["bbox"]
+        frame_shape = (y2 - y1, x2 - x1, 3)
+
+        # spawn 启动的子进程不继承记牌线程和界面，各自重新导入模块
+        context = mp.get_context("spawn")
+        ring = FrameRing(frame_shape, self.slots)
+        free_slots = context.Queue()
+        for slot in range(self.slots):
+            free_slots.put(slot)
+        jobs = context.Queue()
+        results = context.Queue()
+        stop_event = context.Event()
+        ready = context.Barrier(self.workers + 1)  # 截屏进程和所有识别进程都就绪后才开始
+
+        common = (ring.name, frame_shape, self.slots, free_slots, jobs, results, stop_event, ready)
+        processes = [context.Process(target=capture_process, name="capture", daemon=True,
+                                     args=(settings,) + common + (self.interval, self.drop_policy))]
+        processes += [context.Process(target=recognition_process, name=f"recognize-{i}", daemon=True,
+                                      args=(settings,) + common)
+                      for i in range(self.workers)]
+        self.processes = processes
+        for process in processes:
+            process.start()
+        print(f"流水线已启动：{self.workers} 个识别进程，{self.slots} 个槽位，丢帧策略 {self.drop_policy}")
+
+        state = engine.new_tracking_state()
+        pending = {}  # 乱序到达的结果，按帧序号暂存
+        next_seq = 0
+        waiting_since = None  # 开始等待 next_seq 的时间（后面的帧已经到了）
+        last_result = time.perf_counter()
+
+        try:
+            while engine.is_running and (max_frames is None or next_seq < max_frames):
+                try:
+                    kind, seq, payload, timestamp = results.get(timeout=0.2)
+                    last_result = time.perf_counter()
+                except queue.Empty:
+                    dead = [p.name for p in processes[1:] if not p.is_alive()]
+                    if len(dead) == self.workers:
+                        print("识别进程已全部退出")
+                        break
+                    # 识别进程在取任务时被杀掉会一直占着任务队列的锁，其余进程也取不到任务
+                    if dead and time.perf_counter() - last_result > self.seq_timeout:
+                        print(f"识别进程 {'、'.join(dead)} 异常退出，流水线停止")
+                        break
+                    kind = None
+
+                if kind == "stats":
+                    # 识别进程出错退出时提前发回的统计
+                    self.add_worker_stats(payload)
+                elif kind is not None and seq >= next_seq:  # 已跳过的帧迟到时直接丢掉
+                    pending[seq] = (kind, payload, timestamp)
+                    self.stats["max_pending"] = max(self.stats["max_pending"], len(pending))
+
+                # 持有 next_seq 的识别进程可能已退出，超时后按丢帧跳过，避免后面的结果无限积压
+                if pending and next_seq not in pending:
+                    if waiting_since is None:
+                        waiting_since = time.perf_counter()
+                    elif time.perf_counter() - waiting_since > self.seq_timeout:
+                        print(f"等待第 {next_seq} 帧超时，跳过")
+                        pending[next_seq] = ("lost", None, None)
+                waiting_since = None if next_seq in pending else waiting_since
+
+                # 按帧序号依次应用，保证计数与画面顺序一致
+                while next_seq in pending and (max_frames is None or next_seq < max_frames):
+                    kind, payload, timestamp = pending.pop(next_seq)
+                    next_seq += 1
+                    if kind in ("dropped", "lost"):
+                        self.stats["dropped"] += 1
+                        self.stats["lost"] += kind == "lost"
+                        continue
+                    self.stats["captured"] += 1
+                    if kind == "error":
+                        self.stats["errors"] += 1
+                        print(f"识别错误: {payload}")
+                        continue
+
+                    with engine.timer.stage("count"):
+                        engine.count_frame(state, payload, None, verbose, timestamp)
+                    engine.timer.record("pipeline/latency", time.time() - timestamp)
+                    with engine.timer.stage("ui"):
+                        engine.update_display()
+                    engine.timer.end_tick()
+                    self.stats["applied"] += 1
+        finally:
+            stop_event.set()
+            self.collect_worker_stats(results, processes[1:])
+            for process in processes:
+                process.join(timeout=2)
+                if process.is_alive():
+                    process.terminate()
+            for q in (free_slots, jobs, results):
+                q.cancel_join_thread()
+                q.close()
+            ring.close()
+
+        self.print_stats()
+        return self.stats
+
+    def collect_worker_stats(self, results, workers, timeout=5.0):
+        """收集各识别进程退出前发回的预筛和变化检测统计，合并到主进程的引擎上"""
+        deadline = time.perf_counter() + timeout
+        while self.stats_reported < len(workers) and time.perf_counter() < deadline:
+            try:
+                kind, _, payload, _ = results.get(timeout=0.1)
+            except queue.Empty:
+                if not any(p.is_alive() for p in workers):
+                    break
+                continue
+            if kind == "stats":
+                self.add_worker_stats(payload)
+
+    def add_worker_stats(self, payload):
+        self.stats_reported += 1
+        self.engine.prefilter.add_counts(payload["prefilter"])
+        self.engine.merge_change_stats(payload["change"])
+
+    def print_stats(self):
+        stats = self.stats
+        total = stats["captured"] + stats["dropped"]
+        drop_rate = stats["dropped"] / total if total else 0.0
+        latency = self.engine.timer.percentiles("pipeline/").get("pipeline/latency")
+        print(f"流水线：识别 {stats['applied']} 帧，丢弃 {stats['dropped']} 帧 (丢帧率 {drop_rate:.0%}，"
+              f"其中超时 {stats['lost']} 帧)，错误 {stats['errors']} 次，最多积压 {stats['max_pending']} 帧")
+        if latency:
+            print(f"截屏到计数延迟: p50 {latency['p50_ms']:.1f}ms，p95 {latency['p95_ms']:.1f}ms")
@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import glob
+import queue
+import argparse
+import threading
+import numpy as np
+from estimator import format_estimates
+from combos import format_combinations
+
+
+class FrameRecorder:
+    """把截取的画面按块压缩保存到目录：meta.json + chunk_00000.npz ...
+
+    压缩和写盘（一块几十MB）在后台写入线程中进行，记牌线程只复制画面；待写的块数有上限，
+    写盘跟不上时 add 等待写入线程腾出位置，而不是无限占用内存"""
+
+    def __init__(self, path, bbox, regions, chunk_size=50, max_pending=2):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.frames = []
+        self.timestamps = []
+        self.chunk_index = 0
+        self.frame_count = 0
+        self.closed = False
+        self.lock = threading.Lock()
+        self.pending = queue.Queue(maxsize=max_pending)  # 待写入的 (块路径, 画面列表, 时间戳列表)，None 表示结束
+        self.write_errors = 0
+        self.writer = threading.Thread(target=self.write_chunks, name="recorder", daemon=True)
+        self.writer.start()
+
+        os.makedirs(path, exist_ok=True)
+        meta = {
+            "version": 1,
+            "bbox": bbox,
+            "regions": regions,
+            "chunk_size": chunk_size,
+            "created": time.time()
+        }
+        with open(os.path.join(path, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    def add(self, frame, timestamp):
+        """添加一帧，攒够一块后写入磁盘"""
+        with self.lock:
+            if self.closed:
+                return
+
+            # 同一块内的画面尺寸必须一致
+            if self.frames and self.frames[0].shape != frame.shape:
+                self.flush()
+
+            self.frames.append(frame.copy())
+            self.timestamps.append(timestamp)
+            self.frame_count += 1
+            if len(self.frames) >= self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """把缓存的画面交给写入线程，写成一个块文件"""
+        if not self.frames:
+            return
+
+        chunk_path = os.path.join(self.path, f"chunk_{self.chunk_index:05d}.npz")
+        self.pending.put((chunk_path, self.frames, self.timestamps))
+        self.chunk_index += 1
+        self.frames = []
+        self.timestamps = []
+
+    def write_chunks(self):
+        """写入线程：依次压缩保存待写的块，直到收到结束标记"""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            chunk_path, frames, timestamps = item
+            try:
+                np.savez_compressed(chunk_path, frames=np.stack(frames),
+                                    timestamps=np.asarray(timestamps, dtype=np.float64))
+            except Exception as e:
+                self.write_errors += 1
+                print(f"录制写入失败: {chunk_path}: {e}")
+
+    def close(self):
+        """写完所有缓存的画面后返回"""
+        with self.lock:
+            if self.closed:
+                return
+            self.flush()
+            self.closed = True
+            self.pending.put(None)
+        self.writer.join()
+
+
+def load_recording_meta(path):
+    """读取录制目录的元数据"""
+    with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_recording(path):
+    """按时间顺序逐帧读取录制内容，返回 (时间戳, 画面)"""
+    for chunk_path in sorted(glob.glob(os.path.join(path, "chunk_*.npz"))):
+        with np.load(chunk_path) as chunk:
+            frames = chunk["frames"]
+            timestamps = chunk["timestamps"]
+        for timestamp, frame in zip(timestamps, frames):
+            yield float(timestamp), frame
+
+
+def load_ground_truth(path):
+    """读取标注的最终剩余牌数，支持 {"card_count": {...}} 或直接的 {点数: 张数}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get("card_count", data)
+
+
+def compare_card_count(card_count, truth):
+    """逐个点数比较识别结果与标注，返回不一致的点数和总误差"""
+    mismatches = {}
+    for card, expected in truth.items():
+        actual = card_count.get(card, 0)
+        if actual != expected:
+            mismatches[card] = {"expected": expected, "actual": actual}
+    return {
+        "mismatches": mismatches,
+        "total_error": sum(abs(m["expected"] - m["actual"]) for m in mismatches.values())
+    }
+
+
+def latency_summary(samples):
+    """把一组耗时（秒）汇总为毫秒统计"""
+    if not samples:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    values = np.asarray(samples) * 1000
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "max_ms": float(values.max())
+    }
+
+
+def replay_recording(tracker, path, truth=None, verbose=False):
+    """把录制的画面按原流程（裁剪 → 识别 → 计数）尽可能快地跑一遍，返回性能和准确性报告"""
+    meta = load_recording_meta(path)
+    regions = meta["regions"]
+    tracker.game_area = tuple(tuple(p) for p in regions["game_area"])
+    tracker.hand_area = tuple(tuple(p) for p in regions["hand_area"])
+    tracker.player_areas = [tuple(tuple(p) for p in area) for area in regions["player_areas"]]
+    turn_areas = regions.get("turn_areas")
+    tracker.turn_areas = [tuple(tuple(p) for p in area) for area in turn_areas] if turn_areas else None
+    origin = tuple(meta["bbox"][0])
+
+    # 与 start_game 一样从新的一局开始
+    tracker.card_count = tracker.initialize_card_count()
+    tracker.reset_scale_calibration()
+    tracker.reset_change_detection()
+    tracker.prefilter.reset_stats()
+    tracker.region_scheduler.reset(order=tracker.seat_order())
+    tracker.voter.reset()
+    if tracker.estimator is not None:
+        tracker.estimator.reset()
+    tracker.combinations.reset()
+    tracker.timer.reset()
+    tracker.allocations.reset()
+    if tracker.track_allocations:
+        tracker.allocations.start()
+    state = tracker.new_tracking_state()
+
+    stage_times = {"crop": [], "calibrate": [], "recognize": [], "count": [], "total": []}
+    first_timestamp = last_timestamp = None
+    frame_count = 0
+    start = time.perf_counter()
+
+    for timestamp, frame in iter_recording(path):
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        last_timestamp = timestamp
+
+        tracker.allocations.begin_tick()
+        t0 = time.perf_counter()
+        hand_img, player_imgs = tracker.crop_regions(frame, origin, tracker.frame_gray(frame))
+        t1 = time.perf_counter()
+        tracker.ensure_calibration(hand_img)
+        t2 = time.perf_counter()
+        scan = tracker.plan_regions(frame, origin, state)
+        results = tracker.recognize_frame(hand_img, player_imgs, scan)
+        t3 = time.perf_counter()
+        tracker.count_frame(state, results, scan, verbose, timestamp)
+        t4 = time.perf_counter()
+        tracker.timer.end_tick()
+        tracker.allocations.end_tick()
+
+        stage_times["crop"].append(t1 - t0)
+        stage_times["calibrate"].append(t2 - t1)
+        stage_times["recognize"].append(t3 - t2)
+        stage_times["count"].append(t4 - t3)
+        stage_times["total"].append(t4 - t0)
+        frame_count += 1
+
+    elapsed = time.perf_counter() - start
+    tracker.allocations.stop()
+    report = {
+        "recording": path,
+        "frames": frame_count,
+        "elapsed_s": elapsed,
+        "fps": frame_count / elapsed if elapsed > 0 else 0.0,
+        "recorded_duration_s": (last_timestamp - first_timestamp) if frame_count else 0.0,
+        "stages": {stage: latency_summary(samples) for stage, samples in stage_times.items()},
+        "timings": tracker.timer.percentiles(),
+        "change_detection": tracker.change_detection_stats(),
+        "prefilter": tracker.prefilter.stats(),
+        "voting": tracker.voter.stats() if tracker.temporal_voting else {},
+        "region_schedule": tracker.region_schedule_stats() if tracker.turn_scheduling else {},
+        "allocations": tracker.allocations.stats() if tracker.track_allocations else {},
+        "estimator": tracker.estimator.stats() if tracker.estimator is not None else {},
+        "hand_estimates": tracker.hand_estimates,
+        "combinations": tracker.combinations.update(tracker.card_count),
+        "card_count": dict(tracker.card_count)
+    }
+    if truth is not None:
+        report["ground_truth"] = compare_card_count(tracker.card_count, truth)
+    return report
+
+
+def record(tracker, path, seconds, interval):
+    """用当前截屏后端录制游戏区域画面"""
+    bbox = tracker.capture_bbox()
+    recorder = FrameRecorder(path, bbox, tracker.region_profile())
+    end = time.time() + seconds
+    while time.time() < end:
+        frame = tracker.capture_screen(bbox)
+        if frame is not None:
+            recorder.add(frame, time.time())
+        time.sleep(interval)
+    recorder.close()
+    print(f"录制完成，共 {recorder.frame_count} 帧: {path}")
+
+
+def print_report(report):
+    print(f"回放 {report['frames']} 帧，用时 {report['elapsed_s']:.2f}s，{report['fps']:.1f} 帧/秒")
+    for stage, stats in report["stages"].items():
+        print(f"  {stage:<10} 平均 {stats['mean_ms']:.2f}ms  p50 {stats['p50_ms']:.2f}ms  "
+              f"p95 {stats['p95_ms']:.2f}ms  最大 {stats['max_ms']:.2f}ms")
+    if report["voting"]:
+        stats = report["voting"]
+        print(f"  多帧投票 ({stats['min_frames']}/{stats['window']} 帧) 平均提交延迟 {stats['mean_latency_frames']:.1f} 帧，"
+              f"过滤闪烁 {stats['suppressed']} 次")
+    for region_name, stats in report["region_schedule"].items():
+        print(f"  {region_name} 推迟识别 {stats['deferred']} 次 (推迟率 {stats['deferred_rate']:.0%})")
+    for category, stats in report["prefilter"].items():
+        print(f"  预筛({category}) 排除率 {stats['rejection_rate']:.0%}，省下约 {stats['saved_ratio']:.0%} 的匹配计算量")
+    if report["allocations"]:
+        stats = report["allocations"]
+        print(f"  每帧内存分配峰值 平均 {stats['mean_kb']:.1f}KB  p95 {stats['p95_kb']:.1f}KB  最大 {stats['max_kb']:.1f}KB")
+    if report["estimator"]:
+        stats = report["estimator"]
+        print(f"  手牌估计 {stats['samples']} 个样本，每帧 平均 {stats['mean_ms']:.1f}ms  p95 {stats['p95_ms']:.1f}ms  "
+              f"最大 {stats['max_ms']:.1f}ms，出牌后保留样本 {stats['conditioned']} 次，重新采样 {stats['resets']} 次")
+        for line in format_estimates(report["hand_estimates"]):
+            print(f"  {line}")
+    print(f"最终剩余牌数: {report['card_count']}")
+    print(f"剩余牌型: {format_combinations(report['combinations'])}")
+
+    if "ground_truth" in report:
+        result = report["ground_truth"]
+        if not result["mismatches"]:
+            print("与标注完全一致")
+        else:
+            print(f"与标注不一致（总误差 {result['total_error']} 张）:")
+            for card, m in result["mismatches"].items():
+                print(f"  {card}: 标注 {m['expected']}，识别 {m['actual']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="掼蛋记牌器画面录制与离线回放")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="录制游戏区域画面")
+    record_parser.add_argument("output", help="录制目录")
+    record_parser.add_argument("--config", default="guandan_regions.json", help="区域配置文件")
+    record_parser.add_argument("--seconds", type=float, default=60, help="录制时长（秒）")
+    record_parser.add_argument("--interval", type=float, default=0.5, help="截屏间隔（秒）")
+
+    replay_parser = subparsers.add_parser("replay", help="离线回放录制内容并统计性能")
+    replay_parser.add_argument("recording", help="录制目录")
+    replay_parser.add_argument("--truth", help="标注的最终剩余牌数（JSON）")
+    replay_parser.add_argument("--workers", type=int, help="识别线程数")
+    replay_parser.add_argument("--report", help="把报告保存为JSON文件")
+    replay_parser.add_argument("--timings-jsonl", help="把每帧各阶段耗时以JSON行写入文件")
+    replay_parser.add_argument("--vote", type=int, nargs=2, metavar=("WINDOW", "FRAMES"),
+                               help="开启多帧投票：窗口帧数和提交所需帧数")
+    replay_parser.add_argument("--fast", action="store_true", help="低分辨率、少比例的快速匹配（同时开启多帧投票）")
+    replay_parser.add_argument("--estimate", type=int, metavar="SAMPLES", help="开启对手手牌分布估计，累积的样本数")
+    replay_parser.add_argument("--allocations", action="store_true", help="统计每帧的内存分配（会变慢）")
+    replay_parser.add_argument("--verbose", action="store_true", help="打印每帧识别结果")
+
+    args = parser.parse_args()
+
+    from engine import GuandanEngine
+    tracker = GuandanEngine(args.config if args.command == "record" else "guandan_regions.json")
+
+    if args.command == "record":
+        if not tracker.regions_loaded:
+            parser.error(f"无法加载区域配置: {args.config}")
+        record(tracker, args.output, args.seconds, args.interval)
+        return
+
+    if args.workers is not None:
+        tracker.recognition_workers = args.workers
+    if args.fast:
+        tracker.configure_fast_matching()
+    if args.vote:
+        tracker.configure_voting(*args.vote)
+    tracker.track_allocations = args.allocations
+    if args.estimate:
+        tracker.configure_estimation(args.estimate)
+    if args.timings_jsonl:
+        tracker.timer.open_jsonl(args.timings_jsonl)
+    truth = load_ground_truth(args.truth) if args.truth else None
+    report = replay_recording(tracker, args.recording, truth, args.verbose)
+    tracker.close()
+    tracker.timer.close()
+
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import math
+import time
+import cv2
+import numpy as np
+
+
+def play_order(hand_area, player_areas):
+    """由区域位置推出出牌顺序，返回座位列表（座位 0 是自己，座位 i 是 player_areas[i - 1]）"""
+    # 掼蛋按逆时针出牌：从自己（屏幕下方的手牌区）开始，按各玩家区域相对手牌区的方位排列，通常依次是右侧、上方、左侧
+    def center(area):
+        return (area[0][0] + area[1][0]) / 2, (area[0][1] + area[1][1]) / 2
+
+    hand_x, hand_y = center(hand_area)
+
+    def angle(seat):
+        x, y = center(player_areas[seat - 1])
+        # 屏幕y轴向下，取反后按数学方向（逆时针）计算，自己的正下方为起点
+        return (math.degrees(math.atan2(hand_y - y, x - hand_x)) + 90) % 360
+
+    return [0] + sorted(range(1, len(player_areas) + 1), key=angle)
+
+
+class PollingScheduler:
+    """自适应轮询：检测到出牌后的几秒内加快轮询，画面静止时指数退避，
+    睡眠时间扣除本次处理耗时，并统计实际帧率和超时次数"""
+
+    def __init__(self, target_interval=0.5, fast_interval=0.15, max_interval=2.0,
+                 burst_seconds=3.0, backoff=1.5):
+        self.target_interval = target_interval  # 正常的帧间隔（秒）
+        self.fast_interval = fast_interval  # 出牌后的帧间隔
+        self.max_interval = max_interval  # 退避的上限
+        self.burst_seconds = burst_seconds  # 出牌后加快轮询的时长
+        self.backoff = backoff  # 静止时每帧间隔放大的倍数
+        self.reset()
+
+    def reset(self):
+        self.interval = self.target_interval
+        self.burst_until = 0.0
+        self.tick_start = None
+        self.started = time.perf_counter()
+        self.ticks = 0
+        self.deadline_misses = 0
+        self.last_elapsed = 0.0
+
+    def start_tick(self):
+        """一帧处理开始"""
+        self.tick_start = time.perf_counter()
+
+    def end_tick(self, played=False, changed=True):
+        """一帧处理结束，根据是否出牌、画面是否变化决定下一帧间隔，返回需要睡眠的秒数"""
+        now = time.perf_counter()
+        self.last_elapsed = now - self.tick_start if self.tick_start is not None else 0.0
+        self.ticks += 1
+
+        if played:
+            self.burst_until = now + self.burst_seconds
+
+        if now < self.burst_until:
+            self.interval = self.fast_interval
+        elif changed:
+            self.interval = self.target_interval
+        else:
+            self.interval = min(self.max_interval, max(self.interval, self.target_interval) * self.backoff)
+
+        # 处理耗时超过帧间隔即为超时，立即开始下一帧
+        if self.last_elapsed >= self.interval:
+            self.deadline_misses += 1
+            return 0.0
+        return self.interval - self.last_elapsed
+
+    def stats(self):
+        """实际帧率、当前间隔和超时次数"""
+        elapsed = time.perf_counter() - self.started
+        return {
+            "ticks": self.ticks,
+            "effective_fps": self.ticks / elapsed if elapsed > 0 else 0.0,
+            "interval_ms": self.interval * 1000,
+            "last_tick_ms": self.last_elapsed * 1000,
+            "deadline_misses": self.deadline_misses
+        }
+
+
+class RegionScheduler:
+    """按出牌顺序安排每帧要识别的区域：轮到的座位和刚出完牌的座位每帧识别，其余座位隔几帧复查"""
+
+    def __init__(self, idle_interval=4, settle_ticks=3, motion_threshold=6.0, downsample=4):
+        # 出的牌一直留在桌面上直到该家下一轮出牌，复查间隔远小于一轮，推迟识别不会漏计
+        self.idle_interval = idle_interval  # 非当前玩家的复查间隔（帧）
+        self.settle_ticks = settle_ticks  # 轮到某家或该家刚出完牌后连续识别的帧数
+        self.motion_threshold = motion_threshold  # 指示区缩略图平均像素差超过此值视为倒计时在走
+        self.downsample = downsample
+        self.reset()
+
+    def reset(self, seats=4, order=None):
+        self.seats = seats
+        # 按出牌顺序排列的座位（见 play_order），座位 0 是自己
+        self.order = list(order) if order is not None else list(range(seats))
+        self.tick = 0
+        self.active = None  # 当前轮到的座位，未知时为None
+        self.last_actor = None  # 最近一次检测到新出牌的座位
+        self.hot = {}  # 座位 -> 剩余的连续识别帧数
+        self.last_scan = {}  # 座位 -> 最近一次识别的帧号
+        self.history_sizes = None
+        self.thumbnails = {}
+        self.counts = {seat: {"scanned": 0, "deferred": 0} for seat in range(seats)}
+
+    def detect_turn(self, turn_images):
+        """比较每个座位指示区的缩略图，变化最大（倒计时在走）的座位即当前轮到的座位"""
+        motions = []
+        for seat, image in enumerate(turn_images):
+            height, width = image.shape[:2]
+            small = cv2.resize(image, (max(1, width // self.downsample), max(1, height // self.downsample)),
+                               interpolation=cv2.INTER_AREA)
+            previous = self.thumbnails.get(seat)
+            self.thumbnails[seat] = small
+            if previous is None or previous.shape != small.shape:
+                motions.append(0.0)
+            else:
+                motions.append(float(cv2.absdiff(small, previous).mean()))
+
+        seat = int(np.argmax(motions))
+        return seat if motions[seat] > self.motion_threshold else None
+
+    def set_active(self, seat):
+        """轮到的座位变化：新座位和刚出完牌的上一个座位都连续识别几帧"""
+        if seat is None or seat == self.active:
+            return
+        if self.active is not None:
+            self.hot[self.active] = self.settle_ticks
+        self.active = seat
+        self.hot[seat] = self.settle_ticks
+
+    def plan(self, state, turn_images=None, urgent=()):
+        """返回本帧需要识别的座位集合，urgent 为本帧必须识别的座位"""
+        self.tick += 1
+        # 有出牌指示区（turn_areas）时按画面变化判断轮到谁，否则由 observe 按上一个出牌的座位推断
+        if turn_images:
+            self.set_active(self.detect_turn(turn_images))
+
+        if self.active is None and self.last_actor is None:
+            # 还不知道轮到谁，全部识别
+            scan = set(range(self.seats))
+        else:
+            scan = set()
+            for seat in range(1, self.seats):
+                if (seat == self.active or self.hot.get(seat, 0) > 0
+                        or self.tick - self.last_scan.get(seat, 0) >= self.idle_interval):
+                    scan.add(seat)
+            # 手牌只在开局和轮到自己时识别
+            if self.active == 0 or self.hot.get(0, 0) > 0:
+                scan.add(0)
+            # 多帧投票只统计识别过的帧，还没有定论的座位每帧识别，避免凑不够票漏计
+            scan.update(urgent)
+        if not state["is_initial"]:
+            scan.add(0)
+
+        for seat in range(self.seats):
+            if seat in scan:
+                self.last_scan[seat] = self.tick
+                self.counts[seat]["scanned"] += 1
+            else:
+                self.counts[seat]["deferred"] += 1
+            if self.hot.get(seat, 0) > 0:
+                self.hot[seat] -= 1
+        return scan
+
+    def observe(self, state):
+        """根据出牌历史找出刚出牌的座位；没有指示区时由此推断下一个出牌的座位"""
+        sizes = [len(plays) for plays in state["history"]]
+        if self.history_sizes is not None:
+            for i, (before, after) in enumerate(zip(self.history_sizes, sizes)):
+                if after > before:
+                    self.last_actor = i + 1
+                    self.hot[i + 1] = self.settle_ticks
+                    if not self.thumbnails:
+                        self.set_active(self.next_seat(i + 1))
+        self.history_sizes = sizes
+
+    def next_seat(self, seat):
+        """按出牌顺序的下一个座位"""
+        return self.order[(self.order.index(seat) + 1) % len(self.order)]
+
+    def stats(self):
+        """每个座位的识别/推迟次数和推迟率"""
+        stats = {}
+        for seat, counts in self.counts.items():
+            total = counts["scanned"] + counts["deferred"]
+            stats[seat] = dict(counts, deferred_rate=counts["deferred"] / total if total else 0.0)
+        return stats
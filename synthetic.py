@@ -0,0 +1,184 @@
+import os
+import json
+import argparse
+import cv2
+import numpy as np
+from scheduler import play_order
+
+
+CARD_NAMES = ["3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A", "2", "BJoker", "RJoker"]
+
+
+class SyntheticFrameGenerator:
+    """用 card_templates/ 中的模板合成测试画面：在背景上按已知位置、比例摆放白色牌面，
+    左上角贴点数字形（带透明通道时按透明度混合），可加高斯噪声，同时返回真实标注"""
+
+    def __init__(self, template_dir="card_templates/", seed=0, background=(40, 110, 40)):
+        self.background = background  # 牌桌底色（BGR）
+        self.rng = np.random.default_rng(seed)
+        self.templates = {}
+        for name in CARD_NAMES:
+            path = os.path.join(template_dir, f"{name}.png")
+            if os.path.exists(path):
+                self.templates[name] = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if not self.templates:
+            raise FileNotFoundError(f"模板目录中没有卡牌模板: {template_dir}")
+
+    def random_cards(self, count, names=None):
+        """随机抽 count 张牌（可重复，双副牌），names 限定可选的牌"""
+        names = list(names or self.templates)
+        return [names[i] for i in self.rng.integers(0, len(names), count)]
+
+    def render_region(self, cards, size, scale=1.0, noise=0.0, spacing=70):
+        """合成一个牌区：cards 从左到右排成一行，相邻两张重叠只露出左上角；
+        返回 (BGR图像, [{"name", "position", "size"}])，位置和尺寸是字形在图像中的框"""
+        height, width = size
+        image = np.full((height, width, 3), self.background, np.uint8)
+        labels = []
+        x = int(20 * scale)
+        top = int(10 * scale)
+        card_height = min(int(150 * scale), height - top - 1)
+
+        for name in cards:
+            glyph = cv2.resize(self.templates[name], None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            glyph_h, glyph_w = glyph.shape[:2]
+            # 区域较矮时字形上移，放不下的牌不画（标注中也没有）
+            glyph_x, glyph_y = x, min(top + int(4 * scale), height - glyph_h - 1)
+            if glyph_x + glyph_w > width or glyph_y < 0:
+                break
+
+            # 牌面：白色矩形，后一张盖住前一张
+            card_top = min(top, glyph_y)
+            card_box = ((x - int(4 * scale), card_top), (x + int(60 * scale), card_top + card_height))
+            cv2.rectangle(image, card_box[0], card_box[1], (255, 255, 255), -1)
+            cv2.rectangle(image, card_box[0], card_box[1], (160, 160, 160), 1)
+
+            roi = image[glyph_y:glyph_y + glyph_h, glyph_x:glyph_x + glyph_w]
+            if glyph.ndim == 3 and glyph.shape[2] == 4:
+                alpha = glyph[:, :, 3:4] / 255.0
+                roi[:] = (glyph[:, :, :3] * alpha + roi * (1 - alpha)).astype(np.uint8)
+            elif glyph.ndim == 2:
+                roi[:] = glyph[:, :, None]
+            else:
+                roi[:] = glyph
+
+            labels.append({"name": name, "position": (glyph_x, glyph_y), "size": (glyph_w, glyph_h)})
+            x += int(spacing * scale)
+
+        return self.add_noise(image, noise), labels
+
+    def add_noise(self, image, noise):
+        """叠加标准差为 noise 的高斯噪声"""
+        if noise <= 0:
+            return image
+        noisy = image.astype(np.float32) + self.rng.normal(0, noise, image.shape)
+        return np.clip(noisy, 0, 255).astype(np.uint8)
+
+    def render_frame(self, regions, hand, played, scale=1.0, noise=0.0):
+        """按区域配置合成整个游戏区域画面：hand 为手牌，played 为三家桌面上的牌；
+        返回 (画面, {区域名: 标注})，画面左上角对应 game_area 左上角"""
+        (gx1, gy1), (gx2, gy2) = regions["game_area"]
+        frame = np.full((gy2 - gy1, gx2 - gx1, 3), self.background, np.uint8)
+        labels = {}
+        areas = [("手牌", regions["hand_area"], hand)] + [
+            (f"玩家{i + 1}", area, cards) for i, (area, cards) in enumerate(zip(regions["player_areas"], played))]
+
+        for region_name, ((x1, y1), (x2, y2)), cards in areas:
+            image, region_labels = self.render_region(cards, (y2 - y1, x2 - x1), scale)
+            frame[y1 - gy1:y2 - gy1, x1 - gx1:x2 - gx1] = image
+            labels[region_name] = region_labels
+        return self.add_noise(frame, noise), labels
+
+
+def record_game(path, regions, hand, plays, frames_per_step=3, interval=0.5, scale=1.0, noise=0.0, seed=0):
+    """合成一局录制：plays 为依次出现的 (座位1~3, [牌])，每个桌面状态持续 frames_per_step 帧；
+    录制格式与 replay.py 一致，同时写出最终剩余牌数标注 truth.json"""
+    from replay import FrameRecorder
+
+    generator = SyntheticFrameGenerator(seed=seed)
+    recorder = FrameRecorder(path, regions["game_area"], regions)
+    played = [[], [], []]
+    states = [[list(cards) for cards in played]]
+    for seat, cards in plays:
+        # 轮到该家时桌面上他上一轮的牌先被清掉
+        if played[seat - 1]:
+            played[seat - 1] = []
+            states.append([list(c) for c in played])
+        played[seat - 1] = list(cards)
+        states.append([list(c) for c in played])
+
+    timestamp = 0.0
+    for state in states:
+        for _ in range(frames_per_step):
+            frame, labels = generator.render_frame(regions, hand, state, scale, noise)
+            rendered = sum(len(region_labels) for region_labels in labels.values())
+            if rendered != len(hand) + sum(len(cards) for cards in state):
+                raise ValueError("区域太小，放不下所有的牌")
+            recorder.add(frame, timestamp)
+            timestamp += interval
+    recorder.close()
+
+    # 双副牌减去手牌和所有出过的牌
+    truth = {name: 2 if "Joker" in name else 8 for name in CARD_NAMES}
+    for name in list(hand) + [name for _, cards in plays for name in cards]:
+        truth[name] -= 1
+    with open(os.path.join(path, "truth.json"), 'w', encoding='utf-8') as f:
+        json.dump({"card_count": truth}, f, ensure_ascii=False)
+    return truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成测试画面和录制")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    region_parser = subparsers.add_parser("region", help="合成一个牌区图片和标注")
+    region_parser.add_argument("output", help="输出图片（标注写入同名 .json）")
+    region_parser.add_argument("--cards", type=int, default=6, help="牌数")
+    region_parser.add_argument("--size", type=int, nargs=2, default=[232, 1008], metavar=("H", "W"))
+    region_parser.add_argument("--scale", type=float, default=1.0)
+    region_parser.add_argument("--noise", type=float, default=0.0)
+    region_parser.add_argument("--seed", type=int, default=0)
+
+    game_parser = subparsers.add_parser("game", help="按区域配置合成一局录制（可用 replay.py replay 回放）")
+    game_parser.add_argument("output", help="录制目录")
+    game_parser.add_argument("--config", default="guandan_regions.json", help="区域配置文件")
+    game_parser.add_argument("--plays", type=int, default=6, help="出牌次数")
+    game_parser.add_argument("--frames-per-step", type=int, default=3)
+    game_parser.add_argument("--noise", type=float, default=0.0)
+    game_parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.command == "region":
+        generator = SyntheticFrameGenerator(seed=args.seed)
+        image, labels = generator.render_region(generator.random_cards(args.cards), tuple(args.size),
+                                                args.scale, args.noise)
+        cv2.imwrite(args.output, image)
+        with open(os.path.splitext(args.output)[0] + ".json", 'w', encoding='utf-8') as f:
+            json.dump(labels, f, ensure_ascii=False)
+        print(f"已生成 {len(labels)} 张牌: {[label['name'] for label in labels]}")
+        return
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        regions_data = json.load(f)
+    regions = {key: regions_data[key] for key in ("game_area", "hand_area", "player_areas")}
+
+    # 手牌与各家出牌从同一副随机牌中抽取，保证不超过双副牌的数量；各家按区域位置推出的出牌顺序轮流出牌
+    generator = SyntheticFrameGenerator(seed=args.seed)
+    deck = [name for name in CARD_NAMES for _ in range(2 if "Joker" in name else 8)]
+    order = generator.rng.permutation(len(deck))
+    hand = [deck[i] for i in order[:6]]
+    seats = play_order(regions["hand_area"], regions["player_areas"])[1:]
+    plays = []
+    position = 6
+    for step in range(args.plays):
+        count = int(generator.rng.integers(1, 4))
+        plays.append((seats[step % len(seats)], [deck[i] for i in order[position:position + count]]))
+        position += count
+
+    truth = record_game(args.output, regions, hand, plays, args.frames_per_step, noise=args.noise, seed=args.seed)
+    print(f"已生成录制 {args.output}，最终剩余牌数: {truth}")
+
+
+if __name__ == "__main__":
+    main()
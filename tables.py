@@ -0,0 +1,145 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from engine import GuandanEngine
+from scheduler import PollingScheduler
+
+
+class MultiTableTracker:
+    """同一进程内同时跟踪多桌：所有桌共用一份模板、多尺度缓存和一个识别线程池，
+    每桌有独立的区域、截屏后端、尺度校准、变化检测、card_count 和出牌历史"""
+
+    def __init__(self, config_files, workers=None):
+        if not config_files:
+            raise ValueError("至少需要一桌的区域配置")
+
+        # 第一桌加载模板，其余桌与它共用
+        owner = GuandanEngine(config_files[0])
+        self.tables = [owner] + [GuandanEngine(config_file, shared=owner) for config_file in config_files[1:]]
+        for table, config_file in zip(self.tables, config_files):
+            if not table.regions_loaded:
+                raise ValueError(f"无法加载区域配置: {config_file}")
+            # 并行由共用线程池按区域分发，各桌内部不再开线程
+            table.recognition_workers = 1
+
+        self.workers = workers or min(4 * len(self.tables), os.cpu_count() or 1)
+        self.executor = None
+        self.scheduler = PollingScheduler()
+        self.states = []
+        self.is_running = False
+        self.tick_count = 0
+        self.elapsed = 0.0
+
+    def start(self):
+        """所有桌开始新的一局"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="table")
+        # 先在当前线程建好共用的多尺度缓存，避免多个线程同时重建
+        self.tables[0].get_template_pyramid()
+        for table in self.tables:
+            table.start_tracking()
+        self.states = [table.new_tracking_state() for table in self.tables]
+        self.scheduler.reset()
+        self.tick_count = 0
+        self.elapsed = 0.0
+        self.is_running = True
+
+    def prepare_table(self, table, state):
+        """截取一桌画面、裁剪区域并确保已校准，返回 (本帧要识别的座位, [(座位, 区域名, 图像)])；
+        截屏失败或窗口移动时结束该桌本帧的统计并返回None"""
+        bbox = table.capture_bbox()
+        with table.timer.stage("capture"):
+            frame = table.capture_frame(bbox)
+        if frame is None:
+            table.timer.end_tick()
+            return None
+        if table.auto_locate and table.locator.has_anchor():
+            with table.timer.stage("locate"):
+                window_ok = table.check_window(frame, bbox[0])
+            if not window_ok:
+                table.timer.end_tick()
+                return None
+        gray = table.frame_gray(frame)
+        with table.timer.stage("crop"):
+            hand_img, player_imgs = table.crop_regions(frame, bbox[0], gray)
+        with table.timer.stage("calibrate"):
+            table.ensure_calibration(hand_img)
+        with table.timer.stage("turn"):
+            scan = table.plan_regions(frame, bbox[0], state)
+        region_images = [("手牌", hand_img)] + [(f"玩家{i + 1}", img) for i, img in enumerate(player_imgs)]
+        return scan, [(seat, region_name, image) for seat, (region_name, image) in enumerate(region_images)
+                      if scan is None or seat in scan]
+
+    def tick(self, verbose=False):
+        """所有桌各处理一帧：截屏按桌并行，识别把所有桌的所有区域一起分发到线程池，返回下一帧前的等待秒数"""
+        self.scheduler.start_tick()
+        start = time.perf_counter()
+
+        prepared = [future.result() for future in
+                    [self.executor.submit(self.prepare_table, table, state)
+                     for table, state in zip(self.tables, self.states)]]
+
+        futures = []
+        for table, prepared_table in zip(self.tables, prepared):
+            if prepared_table is None:
+                futures.append(None)
+                continue
+            futures.append({seat: self.executor.submit(table.recognize_cards, image, region_name)
+                            for seat, region_name, image in prepared_table[1]})
+
+        played = False
+        changed = False
+        for table, state, prepared_table, table_futures in zip(self.tables, self.states, prepared, futures):
+            if table_futures is None:
+                continue
+            # 本帧没有识别的区域沿用上次的结果
+            results = []
+            for seat, region_name in enumerate(["手牌"] + [f"玩家{i + 1}" for i in range(len(table.player_areas))]):
+                if seat in table_futures:
+                    results.append(table_futures[seat].result())
+                else:
+                    table.region_updated[region_name] = False
+                    results.append(table.region_results.get(region_name, []))
+            with table.timer.stage("count"):
+                played = table.count_frame(state, results, prepared_table[0], verbose) or played
+            changed = changed or any(table.region_updated.values())
+            table.timer.end_tick()
+
+        self.tick_count += 1
+        self.elapsed += time.perf_counter() - start
+        return self.scheduler.end_tick(played, changed)
+
+    def run(self, max_ticks=None, verbose=False):
+        """多桌记牌主循环"""
+        while self.is_running and (max_ticks is None or self.tick_count < max_ticks):
+            try:
+                time.sleep(self.tick(verbose))
+            except Exception as e:
+                print(f"多桌记牌循环错误: {e}")
+                time.sleep(1)
+
+    def stop(self):
+        self.is_running = False
+        for table in self.tables:
+            table.is_running = False
+            if table.recorder is not None:
+                table.recorder.close()
+                table.recorder = None
+            table.timer.close()
+
+    def throughput(self):
+        """处理吞吐：每秒处理的 桌×帧 数（只计处理耗时，不含轮询等待）"""
+        return self.tick_count * len(self.tables) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def print_stats(self):
+        print(f"{len(self.tables)} 桌，{self.workers} 个识别线程，共 {self.tick_count} 帧，"
+              f"处理吞吐 {self.throughput():.1f} 桌·帧/秒")
+        for i, table in enumerate(self.tables):
+            print(f"第{i + 1}桌 ({table.config_file}) 剩余牌数: {table.card_count}")
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        for table in self.tables:
+            table.close()
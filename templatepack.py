@@ -0,0 +1,150 @@
+import os
+import json
+import zlib
+import hashlib
+import numpy as np
+
+
+# 模板包格式：魔数 | 版本(uint32) | 保留(uint32) | 头部长度(uint64) | 头部JSON | 按64字节对齐的数据区。
+# 头部记录生成参数、源PNG的摘要、数据区的CRC32，以及每个数组在数据区中的偏移、类型和形状
+PACK_MAGIC = b"GDTPACK\0"
+PACK_VERSION = 2
+PACK_ALIGN = 64
+PREAMBLE_SIZE = len(PACK_MAGIC) + 16
+
+
+def pack_profile(scales, coarse_factors, coarse_min_size):
+    """模板包的生成参数：多尺度模板的比例和两级匹配的缩小设置，任何一项不同都要重新编译"""
+    return {
+        "scales": [round(float(s), 6) for s in scales],
+        "coarse_factors": [int(f) for f in coarse_factors],
+        "coarse_min_size": int(coarse_min_size)
+    }
+
+
+def pack_path(template_dir, profile, sources):
+    """模板包路径：按生成参数和源PNG内容的摘要命名，同样的模板和比例只编译一份（与游戏窗口大小无关）"""
+    key = json.dumps({"profile": profile, "sources": sources}, sort_keys=True).encode("utf-8")
+    return os.path.join(template_dir, "compiled", f"{hashlib.sha1(key).hexdigest()[:16]}.pack")
+
+
+def source_digests(template_dir, names):
+    """各模板PNG文件内容的摘要，用于判断模板包是否过期（只读文件，不解码）"""
+    digests = {}
+    for name in names:
+        path = os.path.join(template_dir, f"{name}.png")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digests[name] = hashlib.sha1(f.read()).hexdigest()
+    return digests
+
+
+def write_pack(path, profile, sources, templates, pyramid):
+    """把原始模板和多尺度缓存（各比例模板、两级匹配的缩小模板、均值、范数）写入模板包；
+    先写临时文件再替换，读取中的旧包不受影响"""
+    arrays = []
+    offset = 0
+
+    def add(array):
+        nonlocal offset
+        array = np.ascontiguousarray(array)
+        offset = -(-offset // PACK_ALIGN) * PACK_ALIGN
+        ref = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        arrays.append((offset, array))
+        offset += array.nbytes
+        return ref
+
+    header = {
+        "profile": profile,
+        "sources": sources,
+        "templates": {name: add(template) for name, template in templates.items()},
+        "pyramid": {
+            name: [{
+                "index": level["index"],
+                "scale": level["scale"],
+                "width": level["width"],
+                "height": level["height"],
+                "mean": [float(v) for v in level["mean"]],
+                "norm": level["norm"],
+                "template": add(level["template"]),
+                "coarse": {str(factor): add(image) for factor, image in level["coarse"].items()}
+            } for level in levels]
+            for name, levels in pyramid.items()
+        }
+    }
+
+    data = bytearray(offset)
+    for start, array in arrays:
+        data[start:start + array.nbytes] = array.tobytes()
+    header["data_size"] = len(data)
+    header["checksum"] = zlib.crc32(data)
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = -(-(PREAMBLE_SIZE + len(header_bytes)) // PACK_ALIGN) * PACK_ALIGN
+    header_bytes += b" " * (data_start - PREAMBLE_SIZE - len(header_bytes))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(PACK_MAGIC)
+        f.write(np.array([PACK_VERSION, 0], "<u4").tobytes())
+        f.write(np.array([len(header_bytes)], "<u8").tobytes())
+        f.write(header_bytes)
+        f.write(data)
+    os.replace(temp_path, path)
+    return data_start + len(data)
+
+
+def read_header(path):
+    """读取并校验包头，返回 (头部, 数据区起始偏移)；格式或版本不符时抛出 ValueError"""
+    with open(path, 'rb') as f:
+        preamble = f.read(PREAMBLE_SIZE)
+        if len(preamble) < PREAMBLE_SIZE or preamble[:len(PACK_MAGIC)] != PACK_MAGIC:
+            raise ValueError("不是模板包文件")
+        version = int(np.frombuffer(preamble, "<u4", 1, len(PACK_MAGIC))[0])
+        if version != PACK_VERSION:
+            raise ValueError(f"模板包版本 {version} 与当前版本 {PACK_VERSION} 不一致")
+        header_size = int(np.frombuffer(preamble, "<u8", 1, len(PACK_MAGIC) + 8)[0])
+        header = json.loads(f.read(header_size).decode("utf-8"))
+    return header, PREAMBLE_SIZE + header_size
+
+
+def load_pack(path, profile, sources):
+    """内存映射模板包，返回 (模板, 多尺度缓存)，所有图像都是映射内存上的只读视图；
+    文件不存在、生成参数或源PNG不一致、校验和不符时返回 (None, 原因)"""
+    if not os.path.exists(path):
+        return None, "模板包不存在"
+    try:
+        header, data_start = read_header(path)
+    except (ValueError, OSError) as e:
+        return None, str(e)
+    if header["profile"] != profile:
+        return None, "生成参数不一致"
+    if header["sources"] != sources:
+        return None, "模板PNG已更新"
+
+    data = np.memmap(path, dtype=np.uint8, mode='r', offset=data_start, shape=(header["data_size"],))
+    if zlib.crc32(data) != header["checksum"]:
+        return None, "校验和不符"
+
+    def view(ref):
+        dtype = np.dtype(ref["dtype"])
+        count = int(np.prod(ref["shape"]))
+        return np.frombuffer(data, dtype, count, ref["offset"]).reshape(ref["shape"])
+
+    templates = {name: view(ref) for name, ref in header["templates"].items()}
+    pyramid = {
+        name: [{
+            "name": name,
+            "index": level["index"],
+            "scale": level["scale"],
+            "template": view(level["template"]),
+            "width": level["width"],
+            "height": level["height"],
+            "mean": np.asarray(level["mean"]),
+            "norm": level["norm"],
+            "coarse": {int(factor): view(ref) for factor, ref in level["coarse"].items()}
+        } for level in levels]
+        for name, levels in header["pyramid"].items()
+    }
+    return (templates, pyramid), None
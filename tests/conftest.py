@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import GuandanEngine  # noqa: E402
+from synthetic import SyntheticFrameGenerator  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """引擎和合成器按相对路径读取 card_templates/，测试都在仓库根目录下运行"""
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def engine(repo_root):
+    return GuandanEngine()
+
+
+@pytest.fixture
+def generator(repo_root):
+    return SyntheticFrameGenerator(seed=0)
+
+
+def all_jobs(engine, region):
+    """区域上所有 (卡牌下标, 模板缓存项, 通道) 组合（未校准、全部比例）"""
+    jobs = []
+    for card_index, (card_name, levels) in enumerate(engine.get_template_pyramid().items()):
+        channel = engine.template_channel(card_name)
+        img = region[channel]
+        for level in levels:
+            if level["height"] <= img.shape[0] and level["width"] <= img.shape[1]:
+                jobs.append((card_index, level, channel))
+    return jobs
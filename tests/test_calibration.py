@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.mark.parametrize("scale", [0.85, 0.9, 1.1])
+def test_play_area_calibrates_its_own_scale(engine, generator, scale):
+    # 出牌区的牌比手牌小或大时，沿用手牌锁定的比例会漏检，第一次出现牌时单独校准
+    hand, _ = generator.render_region(["3", "5", "K", "A", "2", "RJoker"], (232, 1008), 1.0, noise=4)
+    assert engine.calibrate_scale(hand, "手牌")
+    image, labels = generator.render_region(["K", "5", "8"], (108, 309), scale, noise=4)
+    cards = engine.recognize_cards(image, "玩家1")
+    assert engine.card_names(cards) == [label["name"] for label in labels]
+    assert "玩家1" in engine.region_scales
+
+
+def test_empty_play_area_keeps_inherited_scale(engine, generator):
+    hand, _ = generator.render_region(["3", "5", "K"], (232, 1008), 1.0, noise=4)
+    assert engine.calibrate_scale(hand, "手牌")
+    image, _ = generator.render_region([], (108, 309), noise=4)
+    assert engine.recognize_cards(image, "玩家1") == []
+    assert "玩家1" not in engine.region_scales
+    assert len(engine.get_scale_lock("玩家1")["indices"]) == 3
@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+import pytest
+
+from capture import CAPTURE_BACKENDS, FrameBuffers, ReplayCapture, create_capture_backend
+
+
+def write_frames(directory, count=3):
+    frames = []
+    for i in range(count):
+        frame = np.full((40, 60, 3), 50 * i, np.uint8)
+        frame[10:20, 10 * i:10 * i + 10] = (0, 0, 255)
+        cv2.imwrite(str(directory / f"{i:03d}.png"), frame)
+        frames.append(frame)
+    return frames
+
+
+def test_create_capture_backend_dispatch(tmp_path, monkeypatch):
+    write_frames(tmp_path)
+    backend = create_capture_backend("replay", str(tmp_path))
+    assert isinstance(backend, ReplayCapture) and backend.name == "replay"
+    with pytest.raises(ValueError):
+        create_capture_backend("dxcam")
+    with pytest.raises(FileNotFoundError):
+        create_capture_backend("replay", str(tmp_path / "missing"))
+
+    # auto 依次尝试 mss 和 pyautogui，不可用的跳过
+    class Unavailable:
+        def __init__(self):
+            raise ImportError("没有安装")
+
+    class Available:
+        pass
+
+    monkeypatch.setitem(CAPTURE_BACKENDS, "mss", Unavailable)
+    monkeypatch.setitem(CAPTURE_BACKENDS, "pyautogui", Available)
+    assert isinstance(create_capture_backend("auto"), Available)
+    monkeypatch.setitem(CAPTURE_BACKENDS, "pyautogui", Unavailable)
+    with pytest.raises(RuntimeError):
+        create_capture_backend("auto")
+
+
+def test_replay_grab_into_writes_the_buffer(tmp_path):
+    frames = write_frames(tmp_path)
+    backend = ReplayCapture(str(tmp_path))
+    out = np.zeros((40, 60, 3), np.uint8)
+    bbox = ((5, 8), (45, 38))
+    for i in range(4):  # 回放到结尾后从头循环
+        view = backend.grab_into(bbox, out)
+        assert np.shares_memory(view, out)
+        assert np.array_equal(view, frames[i % 3][8:38, 5:45])
+    assert backend.latency_stats()["frames"] == 4
+
+    with pytest.raises(ValueError):
+        backend.grab_into(bbox, np.zeros((10, 10, 3), np.uint8))
+
+
+def test_frame_buffers_are_reused(tmp_path):
+    frames = write_frames(tmp_path)
+    backend = ReplayCapture(str(tmp_path))
+    buffers = FrameBuffers(count=2)
+    bbox = ((0, 0), (60, 40))
+    seen = []
+    for i in range(6):
+        frame = backend.grab_into(bbox, buffers.next_frame((40, 60, 3)))
+        gray = buffers.gray(frame)
+        assert np.array_equal(gray, cv2.cvtColor(frames[i % 3], cv2.COLOR_BGR2GRAY))
+        seen.append((frame.__array_interface__["data"][0], gray.__array_interface__["data"][0]))
+    # 两组缓冲区轮流使用，之后不再分配；上一帧在下一帧截屏后仍然有效
+    assert buffers.stats()["allocations"] == 4
+    assert len(set(seen)) == 2 and seen[0] == seen[2] != seen[1]
+
+    buffers.next_frame((20, 30, 3))  # 尺寸变化时才重新分配
+    assert buffers.stats()["allocations"] == 5
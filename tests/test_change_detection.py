@@ -0,0 +1,17 @@
+import cv2
+
+
+def test_slow_change_triggers_recognition(engine, generator):
+    # 每帧变化都低于阈值，累积超过阈值时要重新识别，不能一直沿用旧结果
+    image, _ = generator.render_region(["K", "5"], (108, 309), noise=4)
+    engine.recognize_cards(image, "玩家1")
+    for step in range(1, 5):
+        engine.recognize_cards(cv2.add(image, (5 * step,) * 3 + (0,)), "玩家1")
+    assert engine.change_stats["玩家1"] == {"changed": 2, "skipped": 3}
+
+
+def test_unchanged_region_reuses_result(engine, generator):
+    image, _ = generator.render_region(["K", "5"], (108, 309), noise=4)
+    cards = engine.recognize_cards(image, "玩家1")
+    assert engine.recognize_cards(image.copy(), "玩家1") is cards
+    assert not engine.region_updated["玩家1"]
@@ -0,0 +1,46 @@
+import json
+import sys
+
+import cv2
+
+import engine as engine_module
+from synthetic import record_game
+
+
+def run_cli(monkeypatch, capsys, *argv):
+    monkeypatch.setattr(sys, "argv", ["engine.py"] + list(argv))
+    engine_module.main()
+    return capsys.readouterr().out
+
+
+def test_track_profiles_and_writes_timings(monkeypatch, capsys, tmp_path):
+    with open("guandan_regions.json", 'r', encoding='utf-8') as f:
+        regions = {key: value for key, value in json.load(f).items()
+                   if key in ("game_area", "hand_area", "player_areas")}
+    record_game(str(tmp_path / "game"), regions, ["3", "A"], [(3, ["K", "K"])], frames_per_step=2)
+    out = run_cli(monkeypatch, capsys, "track", "--backend", "replay", "--source", str(tmp_path / "game"),
+                  "--ticks", "4", "--profile", "2", "--profile-output", str(tmp_path / "track.prof"),
+                  "--timings-jsonl", str(tmp_path / "timings.jsonl"))
+    assert "开始性能分析，共 2 帧" in out
+    assert (tmp_path / "track.prof").stat().st_size > 0
+    records = [json.loads(line) for line in (tmp_path / "timings.jsonl").read_text().splitlines()]
+    assert len(records) == 4 and all("capture" in record["stages"] for record in records)
+
+
+def test_recognize_prints_cards_per_region(monkeypatch, capsys, tmp_path, engine, generator):
+    regions = engine.region_profile()
+    frame, labels = generator.render_frame(regions, ["3", "A", "RJoker"], [["K", "K"], [], ["5"]], noise=4)
+    cv2.imwrite(str(tmp_path / "frame.png"), frame)
+
+    out = run_cli(monkeypatch, capsys, "recognize", str(tmp_path / "frame.png"))
+    for region_name, expected in [("手牌", 3), ("玩家1", 2), ("玩家2", 0), ("玩家3", 1)]:
+        assert f"{region_name}: 识别到 {expected} 张牌" in out
+    assert out.count("  K ") == 2 and "  RJoker " in out
+
+
+def test_recognize_whole_image(monkeypatch, capsys, tmp_path, generator):
+    image, _ = generator.render_region(["Q", "BJoker"], (108, 309), noise=4)
+    cv2.imwrite(str(tmp_path / "region.png"), image)
+    out = run_cli(monkeypatch, capsys, "recognize", str(tmp_path / "region.png"), "--region", "whole")
+    assert "整张图片: 识别到 2 张牌" in out
+    assert [line.split()[0] for line in out.splitlines() if line.startswith("  ")] == ["Q", "BJoker"]
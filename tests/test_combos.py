@@ -0,0 +1,34 @@
+import itertools
+
+import numpy as np
+
+from combos import CARD_NAMES, RANKS, STRAIGHTS, CombinationTable
+
+
+def brute_force(counts):
+    """逐一枚举：炸弹、三带二的 (三张, 对子) 点数组合、顺子和四王炸"""
+    full_houses = sum(1 for triple, pair in itertools.permutations(range(len(CARD_NAMES)), 2)
+                      if triple < RANKS and counts[triple] >= 3 and counts[pair] >= 2)
+    straights = [i for i, straight in enumerate(STRAIGHTS) if all(counts[r] >= 1 for r in straight)]
+    bombs = {CARD_NAMES[r]: counts[r] for r in range(RANKS) if counts[r] >= 4}
+    return full_houses, straights, bombs, counts[RANKS] >= 2 and counts[RANKS + 1] >= 2
+
+
+def test_counts_match_brute_force_while_cards_are_played():
+    # 从整副牌开始一张张出牌，增量更新和缓存的结果都要与逐一枚举一致
+    rng = np.random.default_rng(0)
+    table = CombinationTable(cache_size=64)
+    counts = [8] * RANKS + [2, 2]
+    deck = [r for r, count in enumerate(counts) for _ in range(count)]
+    rng.shuffle(deck)
+    for rank in [None] + deck:
+        if rank is not None:
+            counts[rank] -= 1
+        result = table.update(dict(zip(CARD_NAMES, counts)))
+        full_houses, straights, bombs, four_jokers = brute_force(counts)
+        assert result["full_houses"] == full_houses
+        assert result["straights"] == [f"{CARD_NAMES[STRAIGHTS[i][0]]}~{CARD_NAMES[STRAIGHTS[i][-1]]}"
+                                       for i in straights]
+        assert result["bombs"] == bombs
+        assert result["four_jokers"] == four_jokers
+    assert table.incremental == len(deck)
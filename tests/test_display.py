@@ -0,0 +1,51 @@
+import queue
+
+from engine import GuandanEngine
+from main import GuandanCardTracker
+
+
+class FakeVar:
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append((ms, callback))
+
+
+def headless_tracker():
+    """不创建 Tk 窗口的界面对象，只替换绘制用到的控件"""
+    tracker = GuandanCardTracker.__new__(GuandanCardTracker)
+    GuandanEngine.__init__(tracker)
+    tracker.display_queue = queue.Queue()
+    tracker.display_interval_ms = 100
+    tracker.root = FakeRoot()
+    tracker.status_var, tracker.timing_var = FakeVar(), FakeVar()
+    tracker.estimate_var, tracker.combination_var = FakeVar(), FakeVar()
+    tracker.rendered = []
+    tracker.render_card_count = lambda card_count, combinations=None: tracker.rendered.append(card_count)
+    return tracker
+
+
+def test_drain_display_queue_renders_only_the_latest_snapshot(repo_root):
+    tracker = headless_tracker()
+    tracker.is_running = True
+    for remaining in (8, 7, 6):
+        tracker.card_count["K"] = remaining
+        tracker.update_display()
+
+    tracker.drain_display_queue()
+    assert [card_count["K"] for card_count in tracker.rendered] == [6]
+    assert tracker.display_queue.empty()
+    assert tracker.root.scheduled == [(100, tracker.drain_display_queue)]
+
+    # 没有新快照时不重绘
+    tracker.drain_display_queue()
+    assert len(tracker.rendered) == 1
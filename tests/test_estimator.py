@@ -0,0 +1,59 @@
+import numpy as np
+
+from estimator import CARD_NAMES, FEATURES, HAND_SIZE, HandEstimator
+
+
+def unseen_counts(seed):
+    """双副牌去掉自己的27张手牌后，其他三家的各点数张数"""
+    deck = [name for name in CARD_NAMES for _ in range(2 if "Joker" in name else 8)]
+    rng = np.random.default_rng(seed)
+    unseen = rng.permutation(deck)[HAND_SIZE:]
+    return {name: int((unseen == name).sum()) for name in CARD_NAMES}
+
+
+def test_conditioning_matches_fresh_sampling():
+    # 出牌后按拒绝采样保留的样本应与按新状态重新采样的分布一致
+    card_count = unseen_counts(1)
+    played = ["K", "K"] if card_count["K"] >= 4 else ["A", "A"]
+    after = dict(card_count)
+    after[played[0]] -= 2
+    history = [[played], [], []]
+
+    conditioned = HandEstimator(target_samples=40000, batch_size=5000, budget_ms=60000, seed=1)
+    conditioned.update(card_count, [[], [], []])
+    conditioned.budget_ms = 0  # 不补充新样本，只看保留下来的样本
+    result = conditioned.update(after, history)
+    assert conditioned.conditioned == 1 and conditioned.resets == 0
+    assert result["samples"] > 2000
+
+    fresh = HandEstimator(target_samples=40000, batch_size=5000, budget_ms=60000, seed=2)
+    expected = fresh.update(after, history)
+    assert expected["samples"] == 40000
+
+    for got, want in zip(result["players"], expected["players"]):
+        assert got["hand_size"] == want["hand_size"]
+        for feature in FEATURES:
+            assert abs(got[feature] - want[feature]) < 0.05
+        for name in CARD_NAMES:
+            assert abs(got["expected"][name] - want["expected"][name]) < 0.15
+    # 出牌的一家手牌数扣掉出的张数
+    assert result["players"][0]["hand_size"] == HAND_SIZE - 2
+
+
+def test_inconsistent_state_resamples():
+    card_count = unseen_counts(2)
+    estimator = HandEstimator(target_samples=2000, budget_ms=60000, seed=0)
+    estimator.update(card_count, [[], [], []])
+    # 剩余牌数与出牌对不上（识别误差）时丢掉样本重新采样
+    changed = dict(card_count, **{"3": card_count["3"] - 1})
+    result = estimator.update(changed, [[["4"]], [], []])
+    assert estimator.resets == 1 and estimator.conditioned == 0
+    assert result["samples"] == 2000
+
+
+def test_estimation_is_opt_in(engine):
+    assert engine.estimator is None
+    engine.configure_estimation(samples=1000)
+    estimator = engine.estimator
+    engine.disable_estimation()
+    assert engine.estimator is None and estimator.executor is None
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from conftest import all_jobs
+from matchers import FFTMatcher
+
+
+def test_fft_scores_match_spatial(engine, generator):
+    image, _ = generator.render_region(["K", "5", "BJoker", "8"], (108, 309), noise=4)
+    region = engine.prepare_region(image)
+    jobs = all_jobs(engine, region)[::7]
+    for (_, level, channel), score in zip(jobs, FFTMatcher().match(region, jobs)):
+        expected = cv2.matchTemplate(region[channel], level["template"], cv2.TM_CCOEFF_NORMED)
+        assert score.shape == expected.shape
+        # 纯色窗口 matchTemplate 的结果不稳定，只比较有结构的位置
+        valid = np.abs(expected) < 1.0
+        assert np.abs(score - expected)[valid].max() < 1e-3
+
+
+def test_large_region_falls_back_to_spatial(engine, generator):
+    image, _ = generator.render_region(["K", "5"], (232, 1008), noise=4)
+    region = engine.prepare_region(image)
+    jobs = all_jobs(engine, region)[:5]
+    matcher = FFTMatcher(max_pixels=232 * 1008 - 1)
+    for (_, level, channel), score in zip(jobs, matcher.match(region, jobs)):
+        assert np.array_equal(score, cv2.matchTemplate(region[channel], level["template"], cv2.TM_CCOEFF_NORMED))
+    assert not matcher.spectrum_cache
+
+
+def test_spectrum_cache_is_thread_safe(engine, generator):
+    image, _ = generator.render_region(["K", "5", "8"], (108, 309), noise=4)
+    region = engine.prepare_region(image)
+    jobs = all_jobs(engine, region)
+    # 缓存很小，多个线程同时插入和淘汰
+    matcher = FFTMatcher(batch_size=4, cache_bytes=2 * 1024 * 1024)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda chunk: matcher.match(region, chunk), [jobs[i::4] for i in range(4)] * 3))
+    assert matcher.cached_bytes == sum(spectrum.nbytes for _, spectrum in matcher.spectrum_cache.values())
+    assert matcher.cached_bytes <= matcher.cache_bytes
@@ -0,0 +1,71 @@
+import json
+import shutil
+
+import numpy as np
+
+from engine import GuandanEngine
+
+
+def textured_screen(engine, amplitude=255):
+    rng = np.random.default_rng(0)
+    screen = np.full((1080, 1920, 3), 40, np.uint8)
+    (x1, y1), (x2, y2) = engine.game_area
+    screen[y1:y1 + 120, x1:x2] = 40 + rng.integers(0, amplitude, (120, x2 - x1, 3), dtype=np.uint8) // 2
+    return screen
+
+
+def temp_engine(tmp_path):
+    config_file = str(tmp_path / "regions.json")
+    shutil.copy("guandan_regions.json", config_file)
+    engine = GuandanEngine(config_file)
+    engine.recording_dir = None
+    return engine
+
+
+def test_first_start_acquires_anchor_and_follows_window(tmp_path, monkeypatch):
+    # 配置里没有锚点：第一次记牌时按当前区域自动选取，窗口移动后在全屏截图上重新定位
+    engine = temp_engine(tmp_path)
+    screen = textured_screen(engine)
+    monkeypatch.setattr(engine, "capture_screen", lambda bbox=None: screen)
+
+    engine.start_tracking()
+    assert engine.locator.has_anchor()
+    origin = engine.game_area[0]
+    found, delta = engine.locator.verify(engine.crop_area(screen, engine.game_area, (0, 0)), origin)
+    assert found and delta == (0, 0)
+
+    screen = np.roll(screen, (5, -9), axis=(0, 1))
+    assert engine.relocate_window()
+    assert engine.game_area[0] == (origin[0] - 9, origin[1] + 5)
+    assert engine.locator.stats()["reacquisitions"] == 1
+
+
+def test_acquired_anchor_is_saved_to_config(tmp_path, monkeypatch):
+    engine = temp_engine(tmp_path)
+    screen = textured_screen(engine)
+    monkeypatch.setattr(engine, "capture_screen", lambda bbox=None: screen)
+    assert engine.acquire_anchor()
+
+    with open(engine.config_file, 'r', encoding='utf-8') as f:
+        assert "anchor" in json.load(f)
+    reloaded = GuandanEngine(engine.config_file)
+    assert reloaded.locator.has_anchor()
+    assert np.array_equal(reloaded.locator.anchor, engine.locator.anchor)
+
+
+def test_low_contrast_window_is_not_locked(tmp_path, monkeypatch):
+    # 手动框选时够用的对比度，自动选取时不够
+    engine = temp_engine(tmp_path)
+    screen = textured_screen(engine, amplitude=80)
+    monkeypatch.setattr(engine, "capture_screen", lambda bbox=None: screen)
+    assert not engine.acquire_anchor()
+    assert not engine.locator.has_anchor()
+
+
+def test_replay_does_not_consume_a_frame_for_the_anchor(tmp_path, monkeypatch):
+    engine = temp_engine(tmp_path)
+    engine.set_capture_settings({"backend": "replay", "source": str(tmp_path)})
+    grabs = []
+    monkeypatch.setattr(engine, "capture_screen", lambda bbox=None: grabs.append(bbox))
+    engine.start_tracking()
+    assert grabs == [] and not engine.locator.has_anchor()
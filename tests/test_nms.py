@@ -0,0 +1,15 @@
+import numpy as np
+
+
+def test_rank_box_inside_joker_box_is_suppressed(engine):
+    # 王牌框 19x88，里面一个 16x24 的点数框：IoU 只有约0.23，但几乎整个被包含
+    boxes = np.array([[0, 0, 19, 88], [2, 30, 16, 24], [70, 0, 16, 24]], np.float64)
+    scores = np.array([0.95, 0.93, 0.92])
+    assert engine.non_max_suppression(boxes, scores, 0.3) == [0, 1, 2]
+    assert engine.non_max_suppression(boxes, scores, 0.3, np.array([13, 10, 10])) == [0, 2]
+
+
+def test_uncalibrated_joker_region(engine, generator):
+    cards = ["BJoker", "RJoker", "10", "3", "K"]
+    image, labels = generator.render_region(cards, (150, 434), noise=4)
+    assert engine.card_names(engine.recognize_cards_template(image, "玩家2")) == cards
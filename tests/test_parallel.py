@@ -0,0 +1,25 @@
+from engine import GuandanEngine
+
+
+def recognize(engine, frame):
+    hand_img, player_imgs = engine.crop_regions(frame, engine.game_area[0])
+    engine.ensure_calibration(hand_img)
+    return engine.recognize_frame(hand_img, player_imgs)
+
+
+def test_parallel_recognition_matches_serial(engine, generator):
+    regions = engine.region_profile()
+    frame, _ = generator.render_frame(regions, ["3", "A", "RJoker", "8"], [["K", "K"], ["BJoker"], ["5", "9"]],
+                                      noise=4)
+    engine.recognition_workers = 1
+    serial = recognize(engine, frame)
+    assert [len(cards) for cards in serial] == [4, 2, 1, 2]
+
+    for _ in range(2):
+        parallel = GuandanEngine()
+        parallel.recognition_workers = 4
+        parallel.parallel_templates = True
+        results = recognize(parallel, frame)
+        parallel.close()
+        # 区域和区域内的牌顺序都与单线程一致，得分逐位相同
+        assert results == serial
@@ -0,0 +1,35 @@
+import json
+import os
+import signal
+import threading
+import time
+
+from pipeline import FramePipeline
+from synthetic import record_game
+
+
+def test_pipeline_skips_frames_held_by_a_killed_worker(engine, tmp_path):
+    with open("guandan_regions.json", 'r', encoding='utf-8') as f:
+        regions = {key: value for key, value in json.load(f).items()
+                   if key in ("game_area", "hand_area", "player_areas")}
+    record_game(str(tmp_path), regions, ["3", "A"], [(3, ["K", "K"]), (1, ["5"])], frames_per_step=2)
+    engine.set_capture_settings({"backend": "replay", "source": str(tmp_path)})
+    engine.change_threshold = -1  # 每帧都识别，识别进程一直在处理画面
+    engine.is_running = True
+
+    # block 策略下不会丢帧，丢掉的只能是被杀掉的识别进程手里的那一帧
+    pipeline = FramePipeline(engine, workers=2, slots=4, drop_policy="block", interval=0.02, seq_timeout=3.0)
+
+    def kill_worker():
+        deadline = time.perf_counter() + 120
+        while pipeline.stats["applied"] < 3 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        os.kill(pipeline.processes[2].pid, signal.SIGKILL)
+
+    killer = threading.Thread(target=kill_worker, daemon=True)
+    killer.start()
+    stats = pipeline.run(max_frames=20, verbose=False)
+    killer.join()
+
+    assert stats["applied"] + stats["dropped"] == 20
+    assert stats["dropped"] == stats["lost"] >= 1
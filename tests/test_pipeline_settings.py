@@ -0,0 +1,31 @@
+from engine import GuandanEngine
+
+
+def test_match_settings_round_trip(engine):
+    engine.configure_fast_matching()
+    engine.match_engine = "pyramid"
+    engine.prefilter_enabled = False
+    engine.prefilter.min_ratio = 0.3
+    engine.coarse_matcher.coarse_threshold = 0.6
+    engine.slot_recognizer.min_similarity = 0.7
+
+    worker = GuandanEngine()
+    worker.apply_match_settings(engine.match_settings())
+    assert worker.match_settings() == engine.match_settings()
+    assert worker.match_downscale == 0.75
+    assert len(worker.template_scales) == 11
+    assert worker.prefilter.min_ratio == 0.3
+
+
+def test_worker_stats_merge(engine):
+    engine.prefilter.reset_stats()
+    engine.change_stats = {}
+    worker_stats = {
+        "prefilter": {"rank": {"checked": 10, "rejected": 4, "work": 100, "saved_work": 30}},
+        "change": {"player1": {"changed": 3, "skipped": 7}}
+    }
+    for _ in range(2):
+        engine.prefilter.add_counts(worker_stats["prefilter"])
+        engine.merge_change_stats(worker_stats["change"])
+    assert engine.prefilter.counts["rank"] == {"checked": 20, "rejected": 8, "work": 200, "saved_work": 60}
+    assert engine.change_stats["player1"] == {"changed": 6, "skipped": 14}
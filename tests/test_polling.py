@@ -0,0 +1,41 @@
+from scheduler import PollingScheduler
+
+
+def test_failed_capture_ends_the_tick(engine, monkeypatch):
+    monkeypatch.setattr(engine, "capture_frame", lambda bbox: None)
+    assert engine.tracking_tick(engine.new_tracking_state()) == 1
+    assert engine.scheduler.ticks == 1
+    assert engine.timer.tick_timings == {}
+    assert len(engine.timer.samples["capture"]) == 1
+
+
+def test_scheduler_backs_off_when_idle_and_bursts_on_play():
+    scheduler = PollingScheduler(target_interval=0.5, fast_interval=0.15, max_interval=2.0, backoff=1.5)
+    intervals = []
+    for _ in range(6):
+        scheduler.start_tick()
+        scheduler.end_tick(played=False, changed=False)
+        intervals.append(scheduler.interval)
+    # 画面静止时按倍数退避，直到上限
+    assert intervals[:3] == [0.75, 1.125, 1.6875]
+    assert intervals[-1] == 2.0
+
+    scheduler.start_tick()
+    delay = scheduler.end_tick(played=True)
+    assert scheduler.interval == 0.15 and 0.0 < delay <= 0.15
+    scheduler.start_tick()
+    scheduler.end_tick(played=False, changed=False)
+    assert scheduler.interval == 0.15  # 出牌后的 burst_seconds 内保持快速轮询
+
+    scheduler.burst_until = 0.0
+    scheduler.start_tick()
+    scheduler.end_tick(played=False, changed=True)
+    assert scheduler.interval == 0.5  # 画面有变化时回到正常间隔
+
+
+def test_slow_tick_counts_as_deadline_miss():
+    scheduler = PollingScheduler(target_interval=0.5)
+    scheduler.start_tick()
+    scheduler.tick_start -= 1.0  # 处理耗时超过帧间隔
+    assert scheduler.end_tick(changed=True) == 0.0
+    assert scheduler.stats()["deadline_misses"] == 1
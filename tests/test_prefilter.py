@@ -0,0 +1,24 @@
+from conftest import all_jobs
+
+
+def test_empty_table_rejects_every_job(engine, generator):
+    # 只有绿色牌桌（灰度约80）时整块区域都比墨迹阈值暗，不能算作字形
+    for size in [(97, 434), (108, 309), (232, 1008)]:
+        image, labels = generator.render_region([], size, noise=6)
+        assert labels == []
+        region = engine.prepare_region(image)
+        jobs = all_jobs(engine, region)
+        assert jobs
+        assert engine.prefilter.filter(region, jobs) == []
+
+
+def test_played_cards_keep_their_jobs(engine, generator):
+    cards = ["BJoker", "RJoker", "10", "3", "K"]
+    image, labels = generator.render_region(cards, (150, 434), noise=6)
+    region = engine.prepare_region(image)
+    jobs = all_jobs(engine, region)
+    kept = engine.prefilter.filter(region, jobs)
+    names = list(engine.get_template_pyramid())
+    kept_names = {names[card_index] for card_index, _, _ in kept}
+    assert {label["name"] for label in labels} <= kept_names
+    assert len(kept) < len(jobs)
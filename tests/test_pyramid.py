@@ -0,0 +1,26 @@
+import cv2
+import numpy as np
+
+
+def test_pyramid_follows_scale_changes(engine):
+    pyramid = engine.get_template_pyramid()
+    assert engine.get_template_pyramid() is pyramid  # 没有变化时直接复用
+
+    engine.set_template_scales(np.linspace(0.7, 1.3, 5))
+    levels = engine.get_template_pyramid()["K"]
+    assert [level["scale"] for level in levels] == [float(s) for s in np.linspace(0.7, 1.3, 5)]
+    template = engine.card_templates["K"]
+    assert levels[-1]["template"].shape[:2] == (int(template.shape[0] * 1.3), int(template.shape[1] * 1.3))
+
+
+def test_pyramid_follows_template_changes(engine):
+    pyramid = engine.get_template_pyramid()
+    templates = dict(engine.card_templates)
+    templates["K"] = np.ascontiguousarray(templates["K"][:, ::-1])  # 换一个模板（左右翻转）
+    engine.card_templates = templates
+
+    rebuilt = engine.get_template_pyramid()
+    assert rebuilt is not pyramid
+    for level in rebuilt["K"]:
+        expected = cv2.resize(templates["K"], (level["width"], level["height"]))
+        assert np.array_equal(level["template"], expected)
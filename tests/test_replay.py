@@ -0,0 +1,33 @@
+import json
+
+import numpy as np
+
+from replay import FrameRecorder, iter_recording, load_recording_meta
+from synthetic import record_game
+
+
+def test_recorder_writes_all_chunks_in_order(tmp_path):
+    recorder = FrameRecorder(str(tmp_path), [[0, 0], [8, 6]], {}, chunk_size=3, max_pending=1)
+    frames = [np.full((6, 8, 3), i, np.uint8) for i in range(10)]
+    for i, frame in enumerate(frames):
+        recorder.add(frame, float(i))
+    recorder.close()
+    recorder.add(frames[0], 99.0)  # 关闭后不再接收
+
+    assert recorder.write_errors == 0
+    assert load_recording_meta(str(tmp_path))["chunk_size"] == 3
+    replayed = list(iter_recording(str(tmp_path)))
+    assert [timestamp for timestamp, _ in replayed] == [float(i) for i in range(10)]
+    assert all(np.array_equal(frame, expected) for (_, frame), expected in zip(replayed, frames))
+
+
+def test_synthetic_game_replays_to_ground_truth(engine, tmp_path):
+    import replay
+
+    with open("guandan_regions.json", 'r', encoding='utf-8') as f:
+        regions = {key: value for key, value in json.load(f).items()
+                   if key in ("game_area", "hand_area", "player_areas")}
+    plays = [(3, ["K", "K"]), (2, ["BJoker"]), (1, ["5"]), (3, ["9", "9", "9"])]
+    truth = record_game(str(tmp_path), regions, ["3", "A", "RJoker"], plays, frames_per_step=4, noise=4)
+    report = replay.replay_recording(engine, str(tmp_path), truth)
+    assert report["ground_truth"]["mismatches"] == {}
@@ -0,0 +1,31 @@
+import json
+
+from scheduler import RegionScheduler, play_order
+
+
+def test_play_order_is_counter_clockwise():
+    # player_areas 依次是左侧、上方、右侧；逆时针出牌时自己的下家是右侧
+    with open("guandan_regions.json", 'r', encoding='utf-8') as f:
+        regions = json.load(f)
+    assert play_order(regions["hand_area"], regions["player_areas"]) == [0, 3, 2, 1]
+
+
+def test_play_order_follows_region_positions():
+    hand = ((100, 300), (300, 400))
+    left, top, right = ((0, 150), (80, 200)), ((120, 0), (280, 80)), ((320, 150), (400, 200))
+    assert play_order(hand, [right, top, left]) == [0, 1, 2, 3]
+    assert play_order(hand, [top, left, right]) == [0, 3, 1, 2]
+
+
+def test_next_active_seat_after_a_play():
+    scheduler = RegionScheduler()
+    scheduler.reset(order=[0, 3, 2, 1])
+    state = {"is_initial": True, "history": [[], [], []]}
+    scheduler.observe(state)
+    state["history"][2].append(["5"])
+    scheduler.observe(state)
+    assert scheduler.last_actor == 3
+    assert scheduler.active == 2
+    state["history"][0].append(["K"])
+    scheduler.observe(state)
+    assert scheduler.active == 0
@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.mark.parametrize("size", [(97, 434), (108, 309), (232, 1008)])
+def test_slots_find_jokers_in_short_regions(engine, generator, size):
+    # 97像素高的出牌区里王牌字形贴着牌面上下边缘
+    engine.match_engine = "slots"
+    cards = ["RJoker", "K", "BJoker", "5"]
+    image, labels = generator.render_region(cards, size, noise=4)
+    assert engine.card_names(engine.recognize_cards_template(image, "玩家2")) == cards
+
+
+@pytest.mark.parametrize("scale", [0.8, 0.9, 1.1])
+def test_slots_join_joker_letters_at_other_scales(engine, generator, scale):
+    cards = ["A", "RJoker", "3", "4", "BJoker"]
+    image, _ = generator.render_region(cards, (232, 1008), scale, noise=4)
+    assert engine.calibrate_scale(image, "手牌")
+    engine.match_engine = "slots"
+    assert engine.card_names(engine.recognize_cards_template(image, "手牌")) == cards
+
+
+def test_dnn_without_model_is_rejected(engine):
+    from matchers import SlotRecognizer
+
+    with pytest.raises(ValueError):
+        SlotRecognizer(classifier="dnn")
+    settings = engine.match_settings()
+    settings["slot_recognizer"]["classifier"] = "dnn"
+    with pytest.raises(ValueError):
+        engine.apply_match_settings(settings)
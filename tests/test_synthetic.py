@@ -0,0 +1,55 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from replay import iter_recording, load_recording_meta
+from synthetic import record_game
+
+
+def glyph_at(image, label):
+    x, y = label["position"]
+    w, h = label["size"]
+    return image[y:y + h, x:x + w]
+
+
+@pytest.mark.parametrize("scale", [0.8, 1.0, 1.2])
+def test_labels_box_the_rendered_glyphs(generator, scale):
+    cards = ["3", "10", "K", "BJoker", "RJoker"]
+    image, labels = generator.render_region(cards, (232, 1008), scale)
+    assert [label["name"] for label in labels] == cards
+    for label in labels:
+        # 标注框内正好是按比例缩放后的模板
+        template = generator.templates[label["name"]]
+        glyph = cv2.resize(template, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        assert tuple(label["size"]) == (glyph.shape[1], glyph.shape[0])
+        if glyph.ndim == 3 and glyph.shape[2] == 4:
+            glyph = glyph[:, :, :3]
+        elif glyph.ndim == 2:
+            glyph = cv2.cvtColor(glyph, cv2.COLOR_GRAY2BGR)
+        assert np.abs(glyph_at(image, label).astype(int) - glyph.astype(int)).mean() < 30
+
+
+def test_cards_that_do_not_fit_are_not_labelled(generator):
+    image, labels = generator.render_region(["3"] * 20, (108, 309))
+    assert 0 < len(labels) < 20
+    x, y = labels[-1]["position"]
+    assert x + labels[-1]["size"][0] <= image.shape[1]
+
+
+def test_recorded_game_truth(engine, tmp_path):
+    regions = {key: engine.region_profile()[key] for key in ("game_area", "hand_area", "player_areas")}
+    plays = [(1, ["K", "K"]), (2, ["BJoker"]), (1, ["5"])]
+    truth = record_game(str(tmp_path), regions, ["3", "A"], plays, frames_per_step=2)
+    with open(tmp_path / "truth.json", 'r', encoding='utf-8') as f:
+        assert json.load(f)["card_count"] == truth
+    assert truth["K"] == 6 and truth["BJoker"] == 1 and truth["5"] == 7 and truth["3"] == 7
+    assert sum(truth.values()) == 108 - 2 - 4
+
+    # 每个桌面状态 frames_per_step 帧：开局、玩家1出牌、玩家2出牌、玩家1清桌、玩家1再出牌
+    frames = list(iter_recording(str(tmp_path)))
+    assert len(frames) == 5 * 2
+    (x1, y1), (x2, y2) = regions["game_area"]
+    assert frames[0][1].shape == (y2 - y1, x2 - x1, 3)
+    assert load_recording_meta(str(tmp_path))["regions"]["hand_area"] == [list(p) for p in regions["hand_area"]]
@@ -0,0 +1,39 @@
+import numpy as np
+
+from tables import MultiTableTracker
+
+
+def make_tracker():
+    tracker = MultiTableTracker(["guandan_regions.json", "guandan_regions.json"], workers=2)
+    for table in tracker.tables:
+        table.auto_locate = False
+    return tracker
+
+
+def test_shared_tables_follow_owner_scales():
+    tracker = make_tracker()
+    owner, table = tracker.tables
+    owner.set_template_scales(np.linspace(0.6, 1.4, 9))
+    assert np.array_equal(table.template_scales, owner.template_scales)
+    assert len(table.get_template_pyramid()["3"]) == len(table.template_scales)
+    tracker.close()
+
+
+def test_starting_a_table_keeps_shared_prefilter_stats():
+    tracker = make_tracker()
+    tracker.start()
+    counts = {"rank": {"checked": 4, "rejected": 1, "work": 10, "saved_work": 2}}
+    tracker.tables[0].prefilter.add_counts(counts)
+    tracker.tables[1].start_tracking()
+    assert tracker.tables[0].prefilter.counts["rank"]["checked"] == 4
+    tracker.stop()
+    tracker.close()
+
+
+def test_failed_capture_ends_table_tick(monkeypatch):
+    tracker = make_tracker()
+    table = tracker.tables[1]
+    monkeypatch.setattr(table, "capture_frame", lambda bbox: None)
+    assert tracker.prepare_table(table, table.new_tracking_state()) is None
+    assert table.timer.tick_timings == {}
+    tracker.close()
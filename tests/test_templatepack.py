@@ -0,0 +1,22 @@
+import numpy as np
+
+from templatepack import pack_path
+
+
+def test_pack_key_ignores_window_size(engine):
+    path = pack_path(engine.template_dir, engine.template_profile(), engine.template_sources())
+    (x1, y1), (x2, y2) = engine.game_area
+    engine.game_area = ((x1, y1), (x2 + 200, y2 + 100))
+    assert pack_path(engine.template_dir, engine.template_profile(), engine.template_sources()) == path
+
+
+def test_scale_change_does_not_write_from_recognition(engine, monkeypatch):
+    writes = []
+    monkeypatch.setattr(engine, "save_template_pack", lambda: writes.append(1))
+    engine.template_scales = np.linspace(0.6, 1.4, 7)
+    levels = engine.get_template_pyramid()["3"]
+    assert len(levels) == 7
+    assert writes == []
+
+    engine.set_template_scales(np.linspace(0.6, 1.4, 9))
+    assert len(engine.get_template_pyramid()["3"]) == 9
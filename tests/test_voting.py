@@ -0,0 +1,51 @@
+from scheduler import RegionScheduler
+from voting import TemporalVoter
+
+
+def detections(*names):
+    return [{"name": name, "position": (i * 70, 0)} for i, name in enumerate(names)]
+
+
+def test_single_frame_flicker_is_suppressed():
+    voter = TemporalVoter(window=5, min_frames=3)
+    frames = [detections("9")] * 2 + [detections("9", "Q")] + [detections("9")] * 2
+    for tick, frame in enumerate(frames):
+        committed = voter.update("玩家1", frame, float(tick))
+    assert [d["name"] for d in committed] == ["9"]
+    assert voter.stats()["suppressed"] == 1
+    assert not voter.undecided("玩家1")
+
+
+def test_commit_needs_min_frames():
+    voter = TemporalVoter(window=5, min_frames=3)
+    assert voter.undecided("玩家1")
+    for tick in range(2):
+        assert voter.update("玩家1", detections("J", "J"), float(tick)) == []
+        assert voter.undecided("玩家1")
+    assert [d["name"] for d in voter.update("玩家1", detections("J", "J"), 2.0)] == ["J", "J"]
+    assert voter.stats()["mean_latency_frames"] == 3
+
+
+def test_short_play_on_idle_seat_is_committed():
+    # 出的牌只在桌面上停留 min_frames 帧，座位不在热区时也要每帧识别直到投票提交
+    scheduler = RegionScheduler(idle_interval=4, settle_ticks=1)
+    voter = TemporalVoter(window=5, min_frames=3)
+    names = ["手牌", "玩家1", "玩家2", "玩家3"]
+    state = {"is_initial": True, "history": [[], [], []]}
+    scheduler.last_actor = 1
+    table = {name: [] for name in names}
+
+    def tick():
+        urgent = {seat for seat, name in enumerate(names) if voter.undecided(name)}
+        scan = scheduler.plan(state, urgent=urgent)
+        for seat in scan:
+            voter.update(names[seat], table[names[seat]], float(scheduler.tick))
+        return scan
+
+    for _ in range(8):
+        tick()
+    table["玩家2"] = detections("K")
+    for _ in range(3):
+        assert 2 in tick()
+    table["玩家2"] = []
+    assert [d["name"] for d in voter.get("玩家2")] == ["K"]
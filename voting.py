@@ -0,0 +1,96 @@
+from collections import Counter, deque
+
+
+class TemporalVoter:
+    """多帧投票：每个区域保留最近 window 帧的识别结果，某张牌的数量在其中至少 min_frames 帧里
+    都达到时才提交。单帧的误检或漏检不会进入计数，代价是出牌最少延迟 min_frames 帧才被计入。
+
+    只有真正识别过的帧才参与投票（按出牌顺序推迟识别的区域不产生新的一票），
+    所以还没有定论的区域（undecided）由 RegionScheduler 每帧识别，直到投票结果与最近一帧一致"""
+
+    def __init__(self, window=5, min_frames=3):
+        if not 1 <= min_frames <= window:
+            raise ValueError("min_frames 必须在 1 到 window 之间")
+        self.window = window  # 投票窗口（帧）
+        self.min_frames = min_frames  # 提交所需的最少帧数，即最短提交延迟
+        self.reset()
+
+    def reset(self):
+        self.frames = {}  # 区域名 -> 最近 window 帧的 (时间戳, 各牌数量, 检测结果)
+        self.committed = {}  # 区域名 -> 已提交的检测结果
+        self.committed_counts = {}  # 区域名 -> 已提交的各牌数量
+        self.pending = {}  # (区域名, 牌) -> 数量首次超过已提交值的 (帧号, 时间戳)
+        self.observations = {}  # 区域名 -> 已投票的帧数
+        self.latencies = []  # 每次提交新增的牌时的延迟 (帧数, 秒)
+        self.suppressed = 0  # 出现过但始终没有达到提交条件的检测（被投票过滤掉的闪烁）
+
+    def ready(self, region_name):
+        """区域是否已积累足够的帧数，可以给出提交结果"""
+        return self.observations.get(region_name, 0) >= self.min_frames
+
+    def undecided(self, region_name):
+        """最近一帧的识别结果与已提交的结果不一致（有等待提交或等待撤下的牌），或还没有识别过"""
+        frames = self.frames.get(region_name)
+        if not frames:
+            return True
+        return frames[-1][1] != self.committed_counts.get(region_name, Counter())
+
+    def get(self, region_name):
+        """区域当前已提交的检测结果"""
+        return self.committed.get(region_name, [])
+
+    def update(self, region_name, detections, timestamp):
+        """加入一帧的识别结果，返回投票后已提交的检测结果（按x坐标排序）"""
+        frames = self.frames.setdefault(region_name, deque(maxlen=self.window))
+        counts = Counter(d["name"] for d in detections)
+        frames.append((timestamp, counts, detections))
+        tick = self.observations.get(region_name, 0) + 1
+        self.observations[region_name] = tick
+
+        # 每张牌取窗口内第 min_frames 大的数量：至少 min_frames 帧里都不少于这个数量
+        previous = self.committed_counts.get(region_name, Counter())
+        committed = Counter()
+        for name in set().union(*(c for _, c, _ in frames)):
+            values = sorted((c[name] for _, c, _ in frames), reverse=True)
+            if len(values) >= self.min_frames and values[self.min_frames - 1] > 0:
+                committed[name] = values[self.min_frames - 1]
+
+        # 统计提交延迟和被过滤的闪烁
+        waiting = {name for region, name in self.pending if region == region_name}
+        for name in set(counts) | set(previous) | set(committed) | waiting:
+            key = (region_name, name)
+            if committed[name] > previous[name]:
+                start = self.pending.pop(key, (tick, timestamp))
+                self.latencies.append((tick - start[0] + 1, timestamp - start[1]))
+            elif counts[name] > committed[name]:
+                self.pending.setdefault(key, (tick, timestamp))
+            elif key in self.pending:
+                del self.pending[key]
+                self.suppressed += 1
+
+        # 每张牌取最近一帧中数量足够的检测结果作为位置
+        found = []
+        for name, count in committed.items():
+            for _, c, frame_detections in reversed(frames):
+                if c[name] >= count:
+                    found.extend([d for d in frame_detections if d["name"] == name][:count])
+                    break
+        found.sort(key=lambda x: x["position"][0])
+
+        self.committed_counts[region_name] = committed
+        self.committed[region_name] = found
+        return found
+
+    def stats(self):
+        """提交延迟（帧数、毫秒）和被过滤的闪烁次数"""
+        frames = [f for f, _ in self.latencies]
+        seconds = [s for _, s in self.latencies]
+        return {
+            "window": self.window,
+            "min_frames": self.min_frames,
+            "commits": len(self.latencies),
+            "mean_latency_frames": sum(frames) / len(frames) if frames else 0.0,
+            "mean_latency_ms": sum(seconds) / len(seconds) * 1000 if seconds else 0.0,
+            "max_latency_ms": max(seconds) * 1000 if seconds else 0.0,
+            "suppressed": self.suppressed
+        }